@@ -4,6 +4,7 @@ ASGI config for backend project.
 
 import os
 import sys
+import time
 
 # MUST be first — before any Django imports
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
@@ -17,6 +18,8 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from channels.db import database_sync_to_async
 import livevc.routing
+from backend.token_cache import token_user_cache
+from livevc.instrumentation import ws_log
 
 
 @database_sync_to_async
@@ -32,6 +35,19 @@ def get_token_user(token_key):
         return AnonymousUser()
 
 
+async def get_cached_token_user(token_key):
+    """Cache first; only a miss pays the thread-pool hop and DB query."""
+    started = time.perf_counter()
+    user = token_user_cache.get(token_key)
+    hit = user is not None
+    if not hit:
+        user = await get_token_user(token_key)
+        if user.is_authenticated and user.is_active:
+            token_user_cache.set(token_key, user)
+    token_user_cache.record(hit, (time.perf_counter() - started) * 1000)
+    return user
+
+
 class TokenAuthMiddleware:
     def __init__(self, inner):
         self.inner = inner
@@ -46,9 +62,9 @@ class TokenAuthMiddleware:
 
         if token_key:
             try:
-                scope['user'] = await get_token_user(token_key)
+                scope['user'] = await get_cached_token_user(token_key)
             except Exception as e:
-                print(f"Token auth error: {e}")
+                ws_log.error('token_auth_error', error=repr(e))
                 scope['user'] = AnonymousUser()
         else:
             scope['user'] = AnonymousUser()
@@ -36,6 +36,10 @@ app.conf.beat_schedule = {
         'task': 'lms.tasks.send_feedback_form_requests',
         'schedule': crontab(hour=20, minute=0),
     },
+    'admin-dashboard-rollup': {
+        'task': 'lms.tasks.refresh_admin_dashboard',
+        'schedule': crontab(minute='*/10'),
+    },
 }
 
 
@@ -28,6 +28,17 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Voice panel presence is held by the socket worker and flushed to
+# PanelMember rows every N seconds (livevc/presence.py)
+VOICE_PRESENCE_SNAPSHOT_SECONDS = 30
+
+# WebSocket handshake token cache (backend/token_cache.py)
+WS_TOKEN_CACHE_TTL = 300
+WS_TOKEN_CACHE_MAX = 10000
+
+# Fraction of per-message socket events written to the log (livevc/instrumentation.py)
+WS_LOG_SAMPLE_RATE = 0.01
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -227,15 +238,66 @@ SERVER_EMAIL = os.environ.get('SERVER_EMAIL', 'noreply@seekhowithrua.com')
 EMAIL_SUBJECT_PREFIX = '[SeekhoWithRua] '
 EMAIL_USE_LOCALTIME = True
 
+# Bulk LMS emails (lms/mailer.py): messages per SMTP session, retries on
+# transient failures, first backoff in seconds (doubles each retry)
+LMS_EMAIL_BATCH_SIZE = 100
+LMS_EMAIL_MAX_RETRIES = 3
+LMS_EMAIL_RETRY_BACKOFF = 1.0
+LMS_EMAIL_LOG_CHUNK = 500  # EmailLog rows per bulk_create (lms/email_log.py)
+LMS_TASK_CHUNK_SIZE = 500  # Rows per Celery subtask when a job fans out (lms/tasks.py)
+
+# Feedback forms (lms/feedback_dispatch.py): emails per run, pause before the
+# next capped run, and age past which an unsent session is closed unsent
+LMS_FEEDBACK_MAX_PER_RUN = 2000
+LMS_FEEDBACK_RESUME_SECONDS = 600
+LMS_FEEDBACK_MAX_AGE_DAYS = 7
+
 # LMS Payment Settings - KEEP SECRET
 LMS_UPI_ID = os.environ.get('LMS_UPI_ID', '')
 LMS_MONTHLY_FEE = 1000  # Base fee in INR
 LMS_REFERRAL_CONCESSION = 200  # ₹200 per referral
 
+# Admin dashboard rollup lifetime (lms/dashboard.py); beat refreshes it every 10 min
+LMS_DASHBOARD_CACHE_SECONDS = 900
+
+# Test ranking ties: 'competition' (1,2,2,4) or 'dense' (1,2,2,3) — lms/ranking.py
+LMS_RANK_TIE_POLICY = 'competition'
+
+# Keyset pages on the students / payments / attendance / email-log lists (lms/pagination.py)
+LMS_PAGE_SIZE = 100
+LMS_MAX_PAGE_SIZE = 500
+
+# Rows fetched per round trip by the streaming CSV / NDJSON exports (lms/exports.py)
+LMS_EXPORT_CHUNK_SIZE = 2000
+
+# Cached quiz answer keys (lms/grading.py); question edits drop them immediately
+LMS_QUIZ_KEY_CACHE_SECONDS = 60 * 60 * 24
+
+# Absence alerts (lms/absence.py): K consecutive absent records within the last N days
+LMS_ABSENCE_STREAK = 3
+LMS_ABSENCE_WINDOW_DAYS = 14
+LMS_ABSENCE_CHUNK_SIZE = 500  # Students per send_absence_alerts batch
+
 # Media files (for payment screenshots)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache — shared Redis when available so the Celery-built dashboard rollup
+# is visible to the web workers; per-process memory otherwise
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Celery Configuration
 CELERY_BROKER_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
@@ -262,4 +324,8 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'lms.tasks.send_feedback_form_requests',
         'schedule': 'crontab(hour="20", minute="0")',
     },
+    'admin-dashboard-rollup': {
+        'task': 'lms.tasks.refresh_admin_dashboard',
+        'schedule': 'crontab(minute="*/10")',
+    },
 }
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+WebSocket handshake token cache and the staff debug endpoints
+"""
+
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend import token_cache
+from backend.token_cache import TokenUserCache, token_user_cache
+
+
+User = get_user_model()
+
+
+class FakeUser:
+    def __init__(self, pk):
+        self.pk = pk
+
+
+class TokenUserCacheTests(SimpleTestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TokenUserCache(ttl=60, max_entries=2)
+        cache.set('a', FakeUser(1))
+        cache.set('b', FakeUser(2))
+        cache.get('a')                   # b is now the least recently used
+        cache.set('c', FakeUser(3))
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a').pk, 1)
+        self.assertEqual(cache.get('c').pk, 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_entries_expire_after_ttl(self):
+        cache = TokenUserCache(ttl=30, max_entries=10)
+        with mock.patch.object(token_cache.time, 'monotonic', return_value=1000.0):
+            cache.set('a', FakeUser(1))
+        with mock.patch.object(token_cache.time, 'monotonic', return_value=1029.0):
+            self.assertEqual(cache.get('a').pk, 1)
+        with mock.patch.object(token_cache.time, 'monotonic', return_value=1030.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_invalidate_user_drops_all_their_tokens(self):
+        cache = TokenUserCache(ttl=60, max_entries=10)
+        cache.set('a1', FakeUser(1))
+        cache.set('a2', FakeUser(1))
+        cache.set('b', FakeUser(2))
+        cache.invalidate_user(1)
+
+        self.assertIsNone(cache.get('a1'))
+        self.assertIsNone(cache.get('a2'))
+        self.assertEqual(cache.get('b').pk, 2)
+
+
+class TokenUserCacheSignalTests(TestCase):
+
+    def setUp(self):
+        token_user_cache.clear()
+        self.addCleanup(token_user_cache.clear)
+        self.user = User.objects.create_user(username='sock', email='sock@example.com', password='x')
+        self.token = Token.objects.create(user=self.user)
+        token_user_cache.set(self.token.key, self.user)
+
+    def test_deleting_token_drops_it(self):
+        self.token.delete()
+        self.assertIsNone(token_user_cache.get(self.token.key))
+
+    def test_saving_user_drops_their_tokens(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(token_user_cache.get(self.token.key))
+
+    def test_last_login_bump_keeps_tokens(self):
+        self.user.save(update_fields=['last_login'])
+        self.assertIs(token_user_cache.get(self.token.key), self.user)
+
+
+class DebugEndpointTests(TestCase):
+
+    def client_with_token(self, is_staff):
+        user = User.objects.create_user(
+            username=f'staff_{is_staff}', email=f'staff_{is_staff}@example.com', password='x', is_staff=is_staff
+        )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        return client
+
+    def test_staff_token_is_accepted(self):
+        client = self.client_with_token(is_staff=True)
+        for url in ('/debug/ws-auth/', '/debug/ws-metrics/'):
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url).status_code, 200)
+
+    def test_non_staff_and_anonymous_are_refused(self):
+        for client in (self.client_with_token(is_staff=False), APIClient()):
+            for url in ('/debug/ws-auth/', '/debug/ws-metrics/'):
+                with self.subTest(url=url):
+                    self.assertIn(client.get(url).status_code, (401, 403))
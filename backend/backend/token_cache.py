@@ -0,0 +1,142 @@
+"""
+Token → user cache for WebSocket handshakes.
+
+TokenAuthMiddleware in asgi.py looks tokens up here first so a reconnect
+storm after a deploy doesn't put one thread-pool hop + one DB query on every
+handshake. Entries expire after WS_TOKEN_CACHE_TTL seconds, the cache holds
+at most WS_TOKEN_CACHE_MAX tokens (least recently used evicted first), and
+deleting a Token (logout) drops it immediately via post_delete. Saving a User
+(deactivation, password change) drops every token cached for that user, so
+the next handshake re-reads them from the database.
+
+The cache is per process — the same daphne process serves both the logout
+request and the sockets, so invalidation reaches the handshakes it affects.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+
+TTL_SECONDS = getattr(settings, 'WS_TOKEN_CACHE_TTL', 300)
+MAX_ENTRIES = getattr(settings, 'WS_TOKEN_CACHE_MAX', 10000)
+LATENCY_SAMPLES = 1000
+
+
+class TokenUserCache:
+    """Bounded LRU with per-entry expiry, plus hit/miss and latency metrics."""
+
+    def __init__(self, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.ttl         = ttl
+        self.max_entries = max_entries
+        self._entries    = OrderedDict()   # token key -> (expires_at, user)
+        self._user_keys  = {}              # user pk -> {token keys}
+        self._lock       = threading.Lock()
+        self.hits        = 0
+        self.misses      = 0
+        self.evictions   = 0
+        self._hit_ms     = deque(maxlen=LATENCY_SAMPLES)
+        self._miss_ms    = deque(maxlen=LATENCY_SAMPLES)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= now:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key, user):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(key)
+            self._user_keys.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def invalidate_user(self, user_pk):
+        with self._lock:
+            for key in list(self._user_keys.get(user_pk, ())):
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def _drop(self, key):
+        """Remove one entry and its user index slot (caller holds the lock)."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_pk = entry[1].pk
+        keys = self._user_keys.get(user_pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_pk]
+
+    # ── Metrics ──────────────────────────────────────────────────────────────
+
+    def record(self, hit, elapsed_ms):
+        if hit:
+            self.hits += 1
+            self._hit_ms.append(elapsed_ms)
+        else:
+            self.misses += 1
+            self._miss_ms.append(elapsed_ms)
+
+    @staticmethod
+    def _percentiles(samples):
+        if not samples:
+            return {'p50': None, 'p95': None, 'p99': None}
+        ordered = sorted(samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+        return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99)}
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size':         len(self._entries),
+            'max_entries':  self.max_entries,
+            'ttl_seconds':  self.ttl,
+            'hits':         self.hits,
+            'misses':       self.misses,
+            'evictions':    self.evictions,
+            'hit_rate':     round(self.hits / lookups, 4) if lookups else None,
+            'hit_latency_ms':  self._percentiles(list(self._hit_ms)),
+            'miss_latency_ms': self._percentiles(list(self._miss_ms)),
+        }
+
+
+token_user_cache = TokenUserCache()
+
+
+@receiver(post_delete, sender=Token)
+def drop_deleted_token(sender, instance, **kwargs):
+    """user_logout / logout_user delete the token — stop honouring it at once."""
+    token_user_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def drop_saved_users_tokens(sender, instance, update_fields=None, **kwargs):
+    """Deactivation or a password change must not ride out the TTL; a login's last_login bump can."""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    token_user_cache.invalidate_user(instance.pk)
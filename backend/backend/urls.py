@@ -17,6 +17,9 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
 
 def debug_urls(request):
     from django.urls import get_resolver
@@ -26,6 +29,20 @@ def debug_urls(request):
         urls.append(str(url.pattern))
     return JsonResponse({"loaded_urls": urls})
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def ws_auth_stats(request):
+    """Hit rate and latency of the WebSocket token cache (staff only, session or token auth)."""
+    from backend.token_cache import token_user_cache
+    return Response(token_user_cache.stats())
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def ws_metrics_view(request):
+    """Per-message-type counters and latency histograms of the socket consumers (staff only, session or token auth)."""
+    from livevc.instrumentation import ws_metrics
+    return Response(ws_metrics.snapshot())
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/employees/', include('users.urls_old')),  # Keep old employee URLs
@@ -35,4 +52,6 @@ urlpatterns = [
     path('api/lms/', include('lms.urls')),
     path('api/', include('livevc.urls')),
     path('debug/', debug_urls),
+    path('debug/ws-auth/', ws_auth_stats),
+    path('debug/ws-metrics/', ws_metrics_view),
 ]
\ No newline at end of file
@@ -1,21 +1,26 @@
 import json
+import time
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
+from .instrumentation import ws_log, ws_metrics
+from .presence import get_presence
+
 class VoicePanelConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.panel_id = self.scope['url_route']['kwargs']['panel_id']
         self.room_group_name = f'panel_{self.panel_id}'
         self.user = self.scope.get("user")
         
-        print(f"WebSocket connect attempt - User: {getattr(self.user, 'id', 'None')}, Auth: {getattr(self.user, 'is_authenticated', False)}")
-        
         # Check authentication
         if not self.user or not getattr(self.user, 'is_authenticated', False):
-            print("Authentication failed - closing connection")
+            ws_metrics.incr('panel_auth_failed')
+            ws_log.warning('panel_auth_failed', panel=self.panel_id)
             await self.close(code=4001)
             return
         
+        self.presence = get_presence(self.panel_id)
+        
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -23,7 +28,18 @@ class VoicePanelConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
-        print(f"WebSocket accepted for user {self.user.id} in panel {self.panel_id}")
+        ws_metrics.incr('panel_connect')
+        ws_log.info('panel_connect', panel=self.panel_id, user=self.user.id)
+        
+        # Presence: full member list to the joiner, delta to everyone else
+        await self.presence.ensure_loaded()
+        delta = await self.presence.connect(self.user)
+        await self.send(text_data=json.dumps({
+            'type': 'members_snapshot',
+            'members': self.presence.member_list(),
+        }))
+        if delta:
+            await self.broadcast_member_delta(delta)
         
         # Notify others (excluding self)
         await self.channel_layer.group_send(
@@ -52,18 +68,52 @@ class VoicePanelConsumer(AsyncWebsocketConsumer):
                     'username': self.user.username,
                 }
             )
-            print(f"User {self.user.id} disconnected from panel {self.panel_id}")
+            ws_metrics.incr('panel_disconnect')
+            ws_log.info('panel_disconnect', panel=self.panel_id, user=self.user.id, code=close_code)
+        
+        if getattr(self, 'presence', None):
+            delta = self.presence.disconnect(self.user.id)
+            if delta:
+                await self.broadcast_member_delta(delta)
+            await self.presence.close_if_empty()
 
     async def receive(self, text_data):
+        started = time.perf_counter()
         try:
             data = json.loads(text_data)
         except json.JSONDecodeError:
-            print("Invalid JSON received")
+            ws_metrics.observe('invalid_json', (time.perf_counter() - started) * 1000, error=True)
+            ws_log.sampled('invalid_json', panel=self.panel_id, user=self.user.id)
+            return
+        if not isinstance(data, dict):
+            ws_metrics.observe('invalid_message', (time.perf_counter() - started) * 1000, error=True)
+            ws_log.sampled('invalid_message', panel=self.panel_id, user=self.user.id)
             return
             
         msg_type = data.get('type')
-        print(f"Received {msg_type} from user {self.user.id}")
-        
+        error = False
+        try:
+            await self.dispatch_message(msg_type, data)
+        except Exception as e:
+            error = True
+            ws_log.error('receive_failed', panel=self.panel_id, user=self.user.id,
+                         msg_type=msg_type, error=repr(e))
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            ws_metrics.observe(self.metric_name(msg_type), elapsed_ms, error=error)
+            ws_log.sampled('received', panel=self.panel_id, user=self.user.id,
+                           msg_type=msg_type, ms=round(elapsed_ms, 3))
+
+    # Message types that get their own metric series; anything else a client
+    # sends is counted under 'unknown' so it cannot mint new series
+    SIGNALLING_TYPES = ('offer', 'answer', 'ice_candidate')
+
+    def metric_name(self, msg_type):
+        if isinstance(msg_type, str) and (msg_type in self.SIGNALLING_TYPES or msg_type in self.MODERATION_ACTIONS):
+            return msg_type
+        return 'unknown'
+
+    async def dispatch_message(self, msg_type, data):
         if msg_type == 'offer':
             await self.channel_layer.group_send(
                 self.room_group_name,
@@ -95,6 +145,125 @@ class VoicePanelConsumer(AsyncWebsocketConsumer):
                     'to_user': data['to_user'],
                 }
             )
+        elif msg_type in self.MODERATION_ACTIONS:
+            await getattr(self, self.MODERATION_ACTIONS[msg_type])(data)
+
+    # ── Moderation ───────────────────────────────────────────────────────────
+    # Same rules as the REST endpoints in views.py, applied to presence and
+    # broadcast at once; PanelMember rows are written by presence.persist_soon().
+
+    MODERATION_ACTIONS = {
+        'raise_hand':     'on_raise_hand',
+        'lower_hand':     'on_lower_hand',
+        'mute_all':       'on_mute_all',
+        'promote_member': 'on_promote_member',
+        'kick_member':    'on_kick_member',
+    }
+
+    def is_moderator(self):
+        me = self.presence.members.get(self.user.id)
+        return bool(me) and me['role'] in ['host', 'co_host']
+
+    @staticmethod
+    def target_id(data):
+        try:
+            return int(data.get('user_id'))
+        except (TypeError, ValueError):
+            return None
+
+    async def send_error(self, action, message):
+        await self.send(text_data=json.dumps({
+            'type': 'error', 'action': action, 'error': message,
+        }))
+
+    async def apply_deltas(self, deltas):
+        deltas = [d for d in deltas if d]
+        for delta in deltas:
+            await self.broadcast_member_delta(delta)
+        if deltas:
+            self.presence.persist_soon()
+
+    async def on_raise_hand(self, data):
+        if self.user.id not in self.presence.members:
+            return await self.send_error('raise_hand', 'Not a member of this panel')
+        await self.apply_deltas([self.presence.update(self.user.id, is_hand_raised=True)])
+
+    async def on_lower_hand(self, data):
+        if self.user.id not in self.presence.members:
+            return await self.send_error('lower_hand', 'Not a member of this panel')
+        await self.apply_deltas([self.presence.update(self.user.id, is_hand_raised=False)])
+
+    async def on_mute_all(self, data):
+        if not self.is_moderator():
+            return await self.send_error('mute_all', 'Only hosts can mute all')
+        await self.apply_deltas([
+            self.presence.update(user_id, is_muted=True)
+            for user_id in list(self.presence.members)
+            if user_id != self.user.id
+        ])
+
+    async def on_promote_member(self, data):
+        if not self.is_moderator():
+            return await self.send_error('promote_member', 'Only hosts can promote members')
+        user_id = self.target_id(data)
+        if user_id not in self.presence.members:
+            return await self.send_error('promote_member', 'Member not found')
+        await self.apply_deltas([
+            self.presence.update(user_id, role='speaker', is_hand_raised=False)
+        ])
+
+    async def on_kick_member(self, data):
+        if not self.is_moderator():
+            return await self.send_error('kick_member', 'Only hosts can kick members')
+        user_id = self.target_id(data)
+        delta = self.presence.remove(user_id)
+        if not delta:
+            return await self.send_error('kick_member', 'Member not found')
+        await self.apply_deltas([delta])
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {'type': 'member_kicked', 'user_id': user_id},
+        )
+
+    async def member_kicked(self, event):
+        if self.user.id == event['user_id']:
+            await self.send(text_data=json.dumps({'type': 'kicked'}))
+            await self.close(code=4003)
+
+    # ── Presence ─────────────────────────────────────────────────────────────
+
+    async def broadcast_member_delta(self, delta):
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {'type': 'member_delta', 'delta': delta},
+        )
+
+    async def member_delta(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'member_delta',
+            **event['delta'],
+        }))
+
+    async def presence_add(self, event):
+        # Sent by REST join_panel; first consumer to apply it broadcasts
+        delta = self.presence.add(event['member'])
+        if delta:
+            await self.broadcast_member_delta(delta)
+
+    async def presence_update(self, event):
+        # Sent by the REST hand/mute/promote endpoints
+        for user_id in event['user_ids'] if 'user_ids' in event else [event['user_id']]:
+            delta = self.presence.update(user_id, **event['fields'])
+            if delta:
+                await self.broadcast_member_delta(delta)
+
+    async def presence_remove(self, event):
+        # Sent by REST leave_panel / kick_member
+        delta = self.presence.remove(event['user_id'])
+        if delta:
+            await self.broadcast_member_delta(delta)
+
+    # ── Signalling ───────────────────────────────────────────────────────────
 
     async def user_joined(self, event):
         # Don't send if this is the excluded channel (the joiner themselves)
@@ -0,0 +1,161 @@
+"""
+backend/livevc/instrumentation.py
+SeekhoWithRua — WebSocket consumer logging + metrics
+
+Replaces print() in the consumers. Nothing here blocks the event loop:
+
+  - ws_log writes through a QueueHandler; a QueueListener thread does the
+    actual stdout I/O. Records are one JSON object per line.
+  - ws_log.sampled() is for per-message events (every ICE candidate) and
+    only emits WS_LOG_SAMPLE_RATE of them. Connects, disconnects and
+    errors always go through.
+  - ws_metrics keeps per-message-type counters and a fixed-bucket latency
+    histogram in memory; staff can read it at /debug/ws-metrics/.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+
+SAMPLE_RATE = getattr(settings, 'WS_LOG_SAMPLE_RATE', 0.01)
+
+# Upper bounds (ms) of the latency histogram buckets; last bucket is +inf
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  LOGGING
+# ─────────────────────────────────────────────────────────────────────────────
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'ts':    round(record.created, 3),
+            'level': record.levelname,
+            'event': record.getMessage(),
+        }
+        payload.update(getattr(record, 'fields', {}))
+        return json.dumps(payload, default=str)
+
+
+class WsLogger:
+    """Thin wrapper so call sites read ws_log.info('connect', user=..)."""
+
+    def __init__(self, name):
+        self.logger    = logging.getLogger(name)
+        self._listener = None
+
+    def _ensure_handler(self):
+        if self._listener is not None or self.logger.handlers:
+            return
+        records = queue.SimpleQueue()
+        stream  = logging.StreamHandler()
+        stream.setFormatter(JsonFormatter())
+        self._listener = logging.handlers.QueueListener(records, stream)
+        self._listener.start()
+        atexit.register(self._listener.stop)
+        self.logger.addHandler(logging.handlers.QueueHandler(records))
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
+    def log(self, level, event, **fields):
+        self._ensure_handler()
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, extra={'fields': fields})
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(logging.ERROR, event, **fields)
+
+    def sampled(self, event, **fields):
+        if random.random() < SAMPLE_RATE:
+            self.log(logging.INFO, event, sample_rate=SAMPLE_RATE, **fields)
+
+
+ws_log = WsLogger('livevc.ws')
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  METRICS
+# ─────────────────────────────────────────────────────────────────────────────
+
+class _TypeStats:
+    __slots__ = ('count', 'errors', 'total_ms', 'buckets')
+
+    def __init__(self):
+        self.count    = 0
+        self.errors   = 0
+        self.total_ms = 0.0
+        self.buckets  = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+
+class ConsumerMetrics:
+    """Counters + latency histograms keyed by event / message type."""
+
+    def __init__(self):
+        self._types   = {}
+        self._events  = {}
+        self._lock    = threading.Lock()
+        self.started  = time.time()
+
+    def incr(self, event, n=1):
+        with self._lock:
+            self._events[event] = self._events.get(event, 0) + n
+
+    def observe(self, msg_type, elapsed_ms, error=False):
+        with self._lock:
+            stats = self._types.get(msg_type)
+            if stats is None:
+                stats = self._types[msg_type] = _TypeStats()
+            stats.count    += 1
+            stats.total_ms += elapsed_ms
+            stats.errors   += int(error)
+            stats.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    @staticmethod
+    def _quantile(buckets, count, q):
+        """Upper bound of the bucket that holds the q-th observation."""
+        target, seen = q * count, 0
+        for i, n in enumerate(buckets):
+            seen += n
+            if seen >= target:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def snapshot(self):
+        with self._lock:
+            types = {
+                msg_type: {
+                    'count':   s.count,
+                    'errors':  s.errors,
+                    'mean_ms': round(s.total_ms / s.count, 3) if s.count else None,
+                    'p50_ms':  self._quantile(s.buckets, s.count, 0.50),
+                    'p99_ms':  self._quantile(s.buckets, s.count, 0.99),
+                    'histogram': dict(zip(
+                        [f'le_{b}' for b in LATENCY_BUCKETS_MS] + ['le_inf'], s.buckets,
+                    )),
+                }
+                for msg_type, s in self._types.items()
+            }
+            return {
+                'uptime_seconds': round(time.time() - self.started),
+                'events':         dict(self._events),
+                'messages':       types,
+            }
+
+
+ws_metrics = ConsumerMetrics()
@@ -0,0 +1,253 @@
+"""
+python manage.py ws_loadtest --panels 20 --peers 6
+
+Connection-storm load test for the ASGI WebSocket stack. Drives
+backend.asgi.application in-process with channels' WebsocketCommunicator:
+N panels × M peers connect to ws/voice/panel/ (and ws/notifications/),
+every pair of peers runs offer → answer → ICE, and the run reports
+
+  - handshakes per second
+  - signalling latency percentiles (offer/answer/ICE, sender → receiver)
+  - Python heap per open connection (tracemalloc)
+
+Creates throwaway loadtest_* users, tokens and panels and deletes them at
+the end unless --keep is given. Those writes go to whatever DATABASES points
+at — by default the production database — so the command refuses to run
+unless DEBUG is on or --allow-db-writes is passed.
+"""
+
+import asyncio
+import json
+import time
+import tracemalloc
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from livevc.models import VoicePanel, PanelMember
+
+
+USER_PREFIX = 'loadtest_'
+
+
+def percentiles(samples):
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+    return {
+        'count': len(ordered),
+        'p50':   pick(0.50),
+        'p90':   pick(0.90),
+        'p99':   pick(0.99),
+        'max':   round(ordered[-1], 2),
+    }
+
+
+class Peer:
+    """One simulated browser: a panel socket + its notification socket."""
+
+    def __init__(self, application, user, token, panel_id, latencies):
+        from channels.testing import WebsocketCommunicator
+        self.user_id   = user.id
+        self.panel     = WebsocketCommunicator(application, f'/ws/voice/panel/{panel_id}/?token={token}')
+        self.notify    = WebsocketCommunicator(application, f'/ws/notifications/{user.id}/?token={token}')
+        self.latencies = latencies
+        self.answered  = asyncio.Event()
+        self.expected  = 0
+        self.received  = 0
+        self.done      = asyncio.Event()
+        self._reader   = None
+
+    async def connect(self):
+        ok, _ = await self.panel.connect()
+        if not ok:
+            raise RuntimeError(f'panel socket refused for user {self.user_id}')
+        ok, _ = await self.notify.connect()
+        if not ok:
+            raise RuntimeError(f'notification socket refused for user {self.user_id}')
+        self._reader = asyncio.ensure_future(self.read_loop())
+
+    async def read_loop(self):
+        while True:
+            output = await self.panel.receive_output(timeout=3600)
+            if output.get('type') != 'websocket.send':
+                return
+            msg = json.loads(output['text'])
+            payload = msg.get('offer') or msg.get('answer') or msg.get('candidate')
+            if not isinstance(payload, dict) or 'sent_at' not in payload:
+                continue
+            kind = msg['type']
+            self.latencies[kind].append((time.perf_counter() - payload['sent_at']) * 1000)
+            if kind == 'offer':
+                await self.send('answer', msg['from_user'])
+            self.received += 1
+            if self.received >= self.expected:
+                self.done.set()
+
+    async def send(self, kind, to_user):
+        payload = {'sdp': 'x' * 512, 'sent_at': time.perf_counter()}
+        key = {'offer': 'offer', 'answer': 'answer', 'ice_candidate': 'candidate'}[kind]
+        await self.panel.send_to(text_data=json.dumps({'type': kind, key: payload, 'to_user': to_user}))
+
+    async def close(self):
+        if self._reader:
+            self._reader.cancel()
+        await self.panel.disconnect()
+        await self.notify.disconnect()
+
+
+class Command(BaseCommand):
+    help = (
+        'Connection-storm load test for the voice panel / notification WebSockets. '
+        'Creates and deletes loadtest_* users in the configured database; requires '
+        'DEBUG or --allow-db-writes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--panels', type=int, default=10, help='Number of panels (N)')
+        parser.add_argument('--peers', type=int, default=4, help='Peers per panel (M)')
+        parser.add_argument('--ice', type=int, default=4, help='ICE candidates per offer/answer pair')
+        parser.add_argument('--concurrency', type=int, default=200, help='Handshakes in flight at once')
+        parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for signalling')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users and panels')
+        parser.add_argument(
+            '--allow-db-writes', action='store_true',
+            help='Run even with DEBUG off (writes loadtest_* rows to the configured database)'
+        )
+
+    def handle(self, *args, **opts):
+        if not (settings.DEBUG or opts['allow_db_writes']):
+            raise CommandError(
+                'ws_loadtest creates and deletes users in the configured database; '
+                'run with DEBUG on or pass --allow-db-writes'
+            )
+        fixtures = self.create_fixtures(opts['panels'], opts['peers'])
+        try:
+            report = asyncio.run(self.run(fixtures, opts))
+        finally:
+            if not opts['keep']:
+                self.delete_fixtures()
+        self.print_report(report, opts)
+
+    # ── Fixtures ─────────────────────────────────────────────────────────────
+
+    def create_fixtures(self, n_panels, n_peers):
+        User = get_user_model()
+        self.delete_fixtures()
+        fixtures = []
+        for p in range(n_panels):
+            users = [
+                User.objects.create_user(
+                    username=f'{USER_PREFIX}{p}_{i}',
+                    email=f'{USER_PREFIX}{p}_{i}@example.com',
+                    password=None,
+                )
+                for i in range(n_peers)
+            ]
+            panel = VoicePanel.objects.create(
+                title=f'Load test {p}', topic='general', host=users[0], max_members=n_peers,
+            )
+            PanelMember.objects.bulk_create([
+                PanelMember(panel=panel, user=u, role='co_host' if i == 0 else 'listener')
+                for i, u in enumerate(users)
+            ])
+            tokens = [Token.objects.create(user=u).key for u in users]
+            fixtures.append((str(panel.id), list(zip(users, tokens))))
+        return fixtures
+
+    def delete_fixtures(self):
+        get_user_model().objects.filter(username__startswith=USER_PREFIX).delete()
+
+    # ── Run ──────────────────────────────────────────────────────────────────
+
+    async def run(self, fixtures, opts):
+        from backend.asgi import application
+
+        latencies = {'offer': [], 'answer': [], 'ice_candidate': []}
+        peers = [
+            (panel_id, Peer(application, user, token, panel_id, latencies))
+            for panel_id, members in fixtures
+            for user, token in members
+        ]
+        by_panel = {}
+        for panel_id, peer in peers:
+            by_panel.setdefault(panel_id, []).append(peer)
+
+        # Each peer offers to every peer after it; receivers answer, then both
+        # sides trickle ICE. Expected inbound messages per peer:
+        m = opts['peers']
+        for members in by_panel.values():
+            for idx, peer in enumerate(members):
+                offers_in  = idx
+                answers_in = m - 1 - idx
+                peer.expected = offers_in + answers_in + (m - 1) * opts['ice']
+
+        # Handshake storm
+        tracemalloc.start()
+        heap_before = tracemalloc.get_traced_memory()[0]
+        gate = asyncio.Semaphore(opts['concurrency'])
+
+        async def connect(peer):
+            async with gate:
+                await peer.connect()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connect(peer) for _, peer in peers))
+        connect_seconds = time.perf_counter() - started
+        heap_after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # Signalling
+        started = time.perf_counter()
+        sends = []
+        for members in by_panel.values():
+            for i, peer in enumerate(members):
+                for other in members[i + 1:]:
+                    sends.append(peer.send('offer', other.user_id))
+                for other in members:
+                    if other is not peer:
+                        sends.extend(peer.send('ice_candidate', other.user_id) for _ in range(opts['ice']))
+        await asyncio.gather(*sends)
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(peer.done.wait() for _, peer in peers if peer.expected)),
+                timeout=opts['timeout'],
+            )
+            timed_out = False
+        except asyncio.TimeoutError:
+            timed_out = True
+        signal_seconds = time.perf_counter() - started
+
+        await asyncio.gather(*(peer.close() for _, peer in peers))
+
+        sockets = len(peers) * 2
+        messages = sum(len(v) for v in latencies.values())
+        return {
+            'sockets':              sockets,
+            'connect_seconds':      connect_seconds,
+            'connections_per_sec':  sockets / connect_seconds if connect_seconds else 0,
+            'bytes_per_connection': (heap_after - heap_before) / sockets if sockets else 0,
+            'signal_seconds':       signal_seconds,
+            'messages_delivered':   messages,
+            'messages_per_sec':     messages / signal_seconds if signal_seconds else 0,
+            'timed_out':            timed_out,
+            'latency_ms':           {k: percentiles(v) for k, v in latencies.items()},
+        }
+
+    def print_report(self, r, opts):
+        w = self.stdout.write
+        w(f"\nPanels × peers        : {opts['panels']} × {opts['peers']}  ({r['sockets']} sockets)")
+        w(f"Handshakes            : {r['connect_seconds']:.2f}s  → {r['connections_per_sec']:.0f} conn/s")
+        w(f"Heap per connection   : {r['bytes_per_connection'] / 1024:.1f} KiB")
+        w(f"Signalling delivered  : {r['messages_delivered']} msgs in {r['signal_seconds']:.2f}s"
+          f"  → {r['messages_per_sec']:.0f} msg/s")
+        for kind, stats in r['latency_ms'].items():
+            if stats['count']:
+                w(f"  {kind:<14} ms  p50={stats['p50']}  p90={stats['p90']}  "
+                  f"p99={stats['p99']}  max={stats['max']}  (n={stats['count']})")
+        if r['timed_out']:
+            self.stderr.write(self.style.WARNING('Some signalling messages never arrived before --timeout'))
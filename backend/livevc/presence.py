@@ -0,0 +1,225 @@
+"""
+backend/livevc/presence.py
+SeekhoWithRua — Voice Panel presence
+
+Authoritative in-process state for who is in a panel, who is muted and who
+has a hand raised. VoicePanelConsumer mutates this state and pushes deltas
+to the panel group; PanelMember rows are only written by a periodic
+snapshot (and once more when the last socket leaves).
+
+State lives in the worker process, same as the InMemoryChannelLayer in
+settings.CHANNEL_LAYERS — every socket of a panel is served by one worker.
+"""
+
+import asyncio
+
+from django.conf import settings
+from channels.db import database_sync_to_async
+
+from .instrumentation import ws_log
+from .models import PanelMember
+
+
+SNAPSHOT_INTERVAL = getattr(settings, 'VOICE_PRESENCE_SNAPSHOT_SECONDS', 30)
+
+# Fields the socket is allowed to change and the snapshot writes back
+MUTABLE_FIELDS = ('role', 'is_muted', 'is_hand_raised')
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  DATABASE HELPERS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _member_dict(m):
+    return {
+        'id':             m.user.id,
+        'username':       m.user.username,
+        'first_name':     m.user.first_name,
+        'last_name':      m.user.last_name,
+        'role':           m.role,
+        'is_muted':       m.is_muted,
+        'is_hand_raised': m.is_hand_raised,
+    }
+
+
+@database_sync_to_async
+def _load_members(panel_id):
+    """One select_related query per panel load — not per poll."""
+    members = PanelMember.objects.filter(panel_id=panel_id).select_related('user')
+    return {m.user.id: _member_dict(m) for m in members}
+
+
+@database_sync_to_async
+def _write_snapshot(panel_id, members, removed):
+    """Persist dirty members with one bulk_update and one delete."""
+    if removed:
+        PanelMember.objects.filter(panel_id=panel_id, user_id__in=removed).delete()
+    if not members:
+        return
+
+    rows = list(PanelMember.objects.filter(panel_id=panel_id, user_id__in=members.keys()))
+    for row in rows:
+        for field in MUTABLE_FIELDS:
+            setattr(row, field, members[row.user_id][field])
+    PanelMember.objects.bulk_update(rows, MUTABLE_FIELDS)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  PANEL STATE
+# ─────────────────────────────────────────────────────────────────────────────
+
+class PanelPresence:
+    """Members + online sockets for a single panel."""
+
+    def __init__(self, panel_id):
+        self.panel_id      = panel_id
+        self.members       = {}        # user_id -> member dict
+        self.online        = {}        # user_id -> open socket count
+        self.dirty         = set()     # user_ids changed since last snapshot
+        self.removed       = set()     # user_ids removed since last snapshot
+        self.loaded        = False
+        self._load_lock    = asyncio.Lock()
+        self._snapshot_task = None
+
+    # ── Loading ──────────────────────────────────────────────────────────────
+
+    async def ensure_loaded(self, force=False):
+        async with self._load_lock:
+            if self.loaded and not force:
+                return
+            fresh = await _load_members(self.panel_id)
+            # Unsnapshotted socket changes win over what the DB still says
+            for user_id in self.dirty:
+                if user_id in self.members:
+                    fresh[user_id] = self.members[user_id]
+            for user_id in self.removed:
+                fresh.pop(user_id, None)
+            self.members = fresh
+            self.loaded  = True
+
+    # ── Reads ────────────────────────────────────────────────────────────────
+
+    def member_list(self):
+        return [
+            dict(m, is_online=m['id'] in self.online)
+            for m in list(self.members.values())
+        ]
+
+    def member(self, user_id):
+        m = self.members.get(user_id)
+        if m is None:
+            return None
+        return dict(m, is_online=user_id in self.online)
+
+    # ── Mutations (all return the delta to broadcast, or None) ───────────────
+
+    async def connect(self, user):
+        if user.id not in self.members:
+            # REST join_panel may have committed after our first load
+            await self.ensure_loaded(force=True)
+        self.online[user.id] = self.online.get(user.id, 0) + 1
+        self._start_snapshots()
+        if user.id not in self.members:
+            return None
+        return {'op': 'join', 'member': self.member(user.id)}
+
+    def disconnect(self, user_id):
+        count = self.online.get(user_id, 0) - 1
+        if count > 0:
+            self.online[user_id] = count
+            return None
+        self.online.pop(user_id, None)
+        if user_id not in self.members:
+            return None
+        return {'op': 'offline', 'member': self.member(user_id)}
+
+    def add(self, member):
+        """Member created through REST join_panel."""
+        if member['id'] in self.members:
+            return None
+        self.removed.discard(member['id'])
+        self.members[member['id']] = member
+        return {'op': 'join', 'member': self.member(member['id'])}
+
+    def update(self, user_id, **fields):
+        m = self.members.get(user_id)
+        if m is None:
+            return None
+        changed = {k: v for k, v in fields.items() if k in MUTABLE_FIELDS and m[k] != v}
+        if not changed:
+            return None
+        m.update(changed)
+        self.dirty.add(user_id)
+        return {'op': 'update', 'member': self.member(user_id)}
+
+    def remove(self, user_id):
+        m = self.members.pop(user_id, None)
+        if m is None:
+            return None
+        self.dirty.discard(user_id)
+        self.removed.add(user_id)
+        return {'op': 'leave', 'member': dict(m, is_online=False)}
+
+    # ── Snapshotting ─────────────────────────────────────────────────────────
+
+    async def snapshot(self):
+        if not self.dirty and not self.removed:
+            return
+        dirty   = {uid: dict(self.members[uid]) for uid in self.dirty if uid in self.members}
+        removed = set(self.removed)
+        self.dirty.clear()
+        self.removed.clear()
+        try:
+            await _write_snapshot(self.panel_id, dirty, removed)
+        except Exception as e:
+            # Put them back so the next tick retries
+            self.dirty.update(dirty.keys())
+            self.removed.update(removed)
+            ws_log.error('presence_snapshot_failed', panel=self.panel_id, error=repr(e))
+
+    def persist_soon(self):
+        """Write pending changes now, off the caller's path."""
+        asyncio.ensure_future(self.snapshot())
+
+    def _start_snapshots(self):
+        if self._snapshot_task is None or self._snapshot_task.done():
+            self._snapshot_task = asyncio.ensure_future(self._snapshot_loop())
+
+    async def _snapshot_loop(self):
+        while self.online:
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+            await self.snapshot()
+
+    async def close_if_empty(self):
+        """Flush and forget the panel once its last socket is gone."""
+        if self.online:
+            return
+        if self._snapshot_task and not self._snapshot_task.done():
+            self._snapshot_task.cancel()
+        await self.snapshot()
+        if not self.online:
+            _panels.pop(self.panel_id, None)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  REGISTRY
+# ─────────────────────────────────────────────────────────────────────────────
+
+_panels = {}
+
+
+def get_presence(panel_id):
+    """Return (creating if needed) the presence state for a panel."""
+    panel_id = str(panel_id)
+    presence = _panels.get(panel_id)
+    if presence is None:
+        presence = _panels[panel_id] = PanelPresence(panel_id)
+    return presence
+
+
+def peek_presence(panel_id):
+    """Presence state if this worker currently holds the panel, else None."""
+    presence = _panels.get(str(panel_id))
+    if presence is None or not presence.loaded:
+        return None
+    return presence
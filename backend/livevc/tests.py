@@ -1,3 +1,114 @@
-from django.test import TestCase
+"""
+Voice panel socket tests
 
-# Create your tests here.
+Drive VoicePanelConsumer through channels' WebsocketCommunicator with the
+user put straight into the scope (the token middleware is not under test),
+and push the same group events the REST views send.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from .models import PanelMember, VoicePanel
+from .routing import websocket_urlpatterns
+
+
+User = get_user_model()
+
+
+def make_user(name):
+    return User.objects.create_user(username=name, email=f'{name}@example.com', password='x')
+
+
+async def drain(communicator):
+    """Every message waiting on the socket, decoded"""
+    messages = []
+    while not await communicator.receive_nothing(timeout=0.2):
+        messages.append(json.loads(await communicator.receive_from()))
+    return messages
+
+
+def deltas(messages):
+    return {m['member']['id']: m['member'] for m in messages if m['type'] == 'member_delta'}
+
+
+class PanelPresenceEventTests(TransactionTestCase):
+
+    def setUp(self):
+        self.host, self.alice, self.bob = make_user('host'), make_user('alice'), make_user('bob')
+        self.panel = VoicePanel.objects.create(title='Panel', host=self.host)
+        PanelMember.objects.create(panel=self.panel, user=self.host, role='host')
+        PanelMember.objects.create(panel=self.panel, user=self.alice)
+        PanelMember.objects.create(panel=self.panel, user=self.bob)
+        self.group = f'panel_{self.panel.id}'
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/voice/panel/{self.panel.id}/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_batched_and_single_presence_updates(self):
+        alice = await self.connect(self.alice)
+        bob = await self.connect(self.bob)
+        await drain(alice)
+        await drain(bob)
+        layer = get_channel_layer()
+
+        await layer.group_send(self.group, {
+            'type': 'presence_update', 'user_ids': [self.alice.id, self.bob.id], 'fields': {'is_muted': True},
+        })
+        for communicator in (alice, bob):
+            muted = deltas(await drain(communicator))
+            self.assertEqual(set(muted), {self.alice.id, self.bob.id})
+            self.assertTrue(all(member['is_muted'] for member in muted.values()))
+
+        # An empty batch (host alone) is a no-op, not a KeyError that kills the handler
+        await layer.group_send(self.group, {'type': 'presence_update', 'user_ids': [], 'fields': {'is_muted': True}})
+        await layer.group_send(self.group, {
+            'type': 'presence_update', 'user_id': self.bob.id, 'fields': {'is_hand_raised': True},
+        })
+        for communicator in (alice, bob):
+            raised = deltas(await drain(communicator))
+            self.assertEqual(list(raised), [self.bob.id])
+            self.assertTrue(raised[self.bob.id]['is_hand_raised'])
+
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_rest_mute_all_with_host_alone(self):
+        await sync_to_async(PanelMember.objects.exclude(user=self.host).delete)()
+        host = await self.connect(self.host)
+        await drain(host)
+        client = APIClient()
+        client.force_authenticate(self.host)
+
+        response = await sync_to_async(client.post)(f'/api/panels/{self.panel.id}/mute-all/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await drain(host), [])
+        await host.disconnect()
+
+    async def test_rest_kick_closes_the_kicked_socket(self):
+        alice = await self.connect(self.alice)
+        bob = await self.connect(self.bob)
+        await drain(alice)
+        await drain(bob)
+        client = APIClient()
+        client.force_authenticate(self.host)
+
+        response = await sync_to_async(client.post)(f'/api/panels/{self.panel.id}/kick/{self.bob.id}/')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(json.loads(await bob.receive_from()), {'type': 'kicked'})
+        self.assertEqual(await bob.receive_output(), {'type': 'websocket.close', 'code': 4003})
+        left = [m for m in await drain(alice) if m['type'] == 'member_delta']
+        self.assertEqual([(m['op'], m['member']['id']) for m in left], [('leave', self.bob.id)])
+        await alice.disconnect()
@@ -43,6 +43,7 @@ from channels.layers                  import get_channel_layer
 
 from .models       import UserProfile, VoicePanel, PanelMember
 from .google_auth  import verify_google_token, get_or_create_google_user
+from .presence     import peek_presence
 
 from voice_rooms.models          import (
     PanelSession, UserPanelHistory,
@@ -68,6 +69,18 @@ def validate_password(password):
     return True
 
 
+def notify_panel_presence(panel_id, event):
+    """
+    Push a REST-side membership change into the panel's socket presence.
+    event: {'type': 'presence_add' | 'presence_update' | 'presence_remove', ...}
+    """
+    try:
+        channel_layer = get_channel_layer()
+        async_to_sync(channel_layer.group_send)(f'panel_{panel_id}', event)
+    except Exception:
+        pass  # Never break a REST call due to socket fan-out failure
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 #  AUTH VIEWS
 # ─────────────────────────────────────────────────────────────────────────────
@@ -468,6 +481,18 @@ def join_panel(request, panel_id):
         return Response({'error': f'Panel is full (max {panel.max_members})'}, status=400)
 
     PanelMember.objects.create(panel=panel, user=user, role='listener')
+    notify_panel_presence(panel.id, {
+        'type':   'presence_add',
+        'member': {
+            'id':             user.id,
+            'username':       user.username,
+            'first_name':     user.first_name,
+            'last_name':      user.last_name,
+            'role':           'listener',
+            'is_muted':       False,
+            'is_hand_raised': False,
+        },
+    })
 
     # Record session + co-occurrence for recommendation engine
     try:
@@ -500,6 +525,7 @@ def leave_panel(request, panel_id):
     user  = request.user
 
     PanelMember.objects.filter(panel=panel, user=user).delete()
+    notify_panel_presence(panel.id, {'type': 'presence_remove', 'user_id': user.id})
 
     # Close session + recalculate rank
     try:
@@ -522,7 +548,15 @@ def leave_panel(request, panel_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_panel_members(request, panel_id):
-    """Get all members of a panel."""
+    """
+    Get all members of a panel.
+    Served from socket presence when this worker holds the panel, so
+    polling clients don't cost a select_related query each.
+    """
+    presence = peek_presence(panel_id)
+    if presence is not None:
+        return Response(presence.member_list())
+
     panel   = get_object_or_404(VoicePanel, id=panel_id)
     members = panel.members.select_related('user').all()
     return Response([
@@ -546,6 +580,10 @@ def raise_hand(request, panel_id):
     member = get_object_or_404(PanelMember, panel=panel, user=request.user)
     member.is_hand_raised = True
     member.save()
+    notify_panel_presence(panel.id, {
+        'type': 'presence_update', 'user_id': request.user.id,
+        'fields': {'is_hand_raised': True},
+    })
     return Response({'message': 'Hand raised'})
 
 
@@ -556,6 +594,10 @@ def lower_hand(request, panel_id):
     member = get_object_or_404(PanelMember, panel=panel, user=request.user)
     member.is_hand_raised = False
     member.save()
+    notify_panel_presence(panel.id, {
+        'type': 'presence_update', 'user_id': request.user.id,
+        'fields': {'is_hand_raised': False},
+    })
     return Response({'message': 'Hand lowered'})
 
 
@@ -567,7 +609,15 @@ def mute_all(request, panel_id):
     member = get_object_or_404(PanelMember, panel=panel, user=request.user)
     if member.role not in ['host', 'co_host']:
         return Response({'error': 'Only hosts can mute all'}, status=403)
-    PanelMember.objects.filter(panel=panel).exclude(user=request.user).update(is_muted=True)
+    muted_ids = list(
+        PanelMember.objects.filter(panel=panel).exclude(user=request.user).values_list('user_id', flat=True)
+    )
+    PanelMember.objects.filter(panel=panel, user_id__in=muted_ids).update(is_muted=True)
+    if muted_ids:
+        notify_panel_presence(panel.id, {
+            'type': 'presence_update', 'user_ids': muted_ids,
+            'fields': {'is_muted': True},
+        })
     return Response({'message': 'All users muted'})
 
 
@@ -583,6 +633,10 @@ def promote_member(request, panel_id, user_id):
     target.role          = 'speaker'
     target.is_hand_raised = False
     target.save()
+    notify_panel_presence(panel.id, {
+        'type': 'presence_update', 'user_id': target.user_id,
+        'fields': {'role': 'speaker', 'is_hand_raised': False},
+    })
     return Response({'message': 'Member promoted to speaker'})
 
 
@@ -595,6 +649,9 @@ def kick_member(request, panel_id, user_id):
     if host_member.role not in ['host', 'co_host']:
         return Response({'error': 'Only hosts can kick members'}, status=403)
     PanelMember.objects.filter(panel=panel, user_id=user_id).delete()
+    notify_panel_presence(panel.id, {'type': 'presence_remove', 'user_id': user_id})
+    # Same as the socket kick: the kicked user's own socket closes with 4003
+    notify_panel_presence(panel.id, {'type': 'member_kicked', 'user_id': user_id})
     return Response({'message': 'Member kicked from panel'})
 
 
@@ -0,0 +1,78 @@
+"""
+Continuous-absence detection
+
+One gaps-and-islands query over the last LMS_ABSENCE_WINDOW_DAYS of
+attendance finds every active student whose most recent LMS_ABSENCE_STREAK
+(or more) attendance records are all 'absent'. Days without a class do not
+break a streak; any non-absent record does.
+
+Numbering each student's records newest-first twice — once overall, once
+per status — gives rn == rn_status exactly for the trailing run of records
+that share the newest record's status. Grouping that run where the status is
+'absent' yields the streak length and its first date.
+
+A streak is alerted once: students who already got a sent absence_alert
+since the streak began are left out.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Attendance, EmailLog, Student
+
+
+MIN_STREAK = getattr(settings, 'LMS_ABSENCE_STREAK', 3)
+WINDOW_DAYS = getattr(settings, 'LMS_ABSENCE_WINDOW_DAYS', 14)
+
+
+STREAKS_SQL = """
+WITH ordered AS (
+    SELECT a.student_id, a.date, a.status,
+           ROW_NUMBER() OVER (PARTITION BY a.student_id ORDER BY a.date DESC, a.id DESC) AS rn,
+           ROW_NUMBER() OVER (PARTITION BY a.student_id, a.status ORDER BY a.date DESC, a.id DESC) AS rn_status
+    FROM {attendance} a
+    JOIN {students} s ON s.id = a.student_id
+    WHERE s.is_active AND a.date >= %s AND a.date < %s
+),
+streaks AS (
+    SELECT student_id, COUNT(*) AS streak, MIN(date) AS started
+    FROM ordered
+    WHERE status = 'absent' AND rn = rn_status
+    GROUP BY student_id
+)
+SELECT streaks.student_id, streaks.streak, streaks.started
+FROM streaks
+WHERE streaks.streak >= %s
+  AND NOT EXISTS (
+      SELECT 1 FROM {email_logs} e
+      WHERE e.student_id = streaks.student_id
+        AND e.email_type = 'absence_alert'
+        AND e.status = 'sent'
+        AND e.sent_at >= streaks.started
+  )
+ORDER BY streaks.student_id
+"""
+
+
+def find_absence_streaks(min_streak=None, window_days=None, today=None):
+    """[(student_id, consecutive_absences, streak_started), ...] due an alert"""
+    today = today or timezone.now().date()
+    window_days = window_days or WINDOW_DAYS
+    qn = connection.ops.quote_name
+    sql = STREAKS_SQL.format(
+        attendance=qn(Attendance._meta.db_table),
+        students=qn(Student._meta.db_table),
+        email_logs=qn(EmailLog._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [today - timedelta(days=window_days), today, min_streak or MIN_STREAK])
+        rows = cursor.fetchall()
+    # Backends without a native date type (SQLite) hand MIN(date) back as text
+    return [
+        (student_id, streak, parse_date(started) if isinstance(started, str) else started)
+        for student_id, streak, started in rows
+    ]
@@ -12,7 +12,8 @@ class StudentAdmin(admin.ModelAdmin):
     list_display = ['user', 'grade', 'phone', 'current_monthly_fee', 'total_referral_discount', 'is_active', 'enrollment_date']
     list_filter = ['grade', 'is_active', 'enrollment_date']
     search_fields = ['user__first_name', 'user__last_name', 'user__email', 'phone', 'referral_code']
-    readonly_fields = ['referral_code', 'total_referral_discount', 'total_earnings', 'created_at', 'updated_at']
+    readonly_fields = ['referral_code', 'total_referral_discount', 'total_earnings',
+                       'referrals_total', 'referrals_paid', 'referrals_pending', 'created_at', 'updated_at']
     
     fieldsets = (
         ('User Information', {
@@ -25,7 +26,7 @@ class StudentAdmin(admin.ModelAdmin):
             'fields': ('base_monthly_fee', 'current_monthly_fee', 'total_referral_discount', 'total_earnings')
         }),
         ('Referral', {
-            'fields': ('referred_by', 'referral_code')
+            'fields': ('referred_by', 'referral_code', 'referrals_total', 'referrals_paid', 'referrals_pending')
         }),
         ('Timestamps', {
             'fields': ('enrollment_date', 'created_at', 'updated_at'),
@@ -138,7 +139,7 @@ class EmailLogAdmin(admin.ModelAdmin):
     list_display = ['student', 'email_type', 'subject', 'status', 'sent_at']
     list_filter = ['email_type', 'status', 'sent_at']
     search_fields = ['student__user__first_name', 'student__user__last_name', 'subject']
-    readonly_fields = ['sent_at']
+    readonly_fields = ['sent_at', 'context_hash']
     date_hierarchy = 'sent_at'
 
 
@@ -155,6 +156,13 @@ class QuizAdmin(admin.ModelAdmin):
     list_filter = ['is_published', 'is_active', 'created_at']
     search_fields = ['title', 'description']
     readonly_fields = ['created_at']
+    actions = ['regrade_attempts']
+    
+    def regrade_attempts(self, request, queryset):
+        from .grading import regrade_attempts
+        result = regrade_attempts(QuizAttempt.objects.filter(quiz__in=queryset))
+        self.message_user(request, f"Re-graded {result['graded']} attempts, {result['changed']} changed")
+    regrade_attempts.short_description = "Re-grade submitted attempts"
 
 
 class QuizQuestionInline(admin.TabularInline):
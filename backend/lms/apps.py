@@ -5,3 +5,7 @@ class LmsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lms'
     verbose_name = 'Learning Management System'
+    
+    def ready(self):
+        # Connects the answer-key and dashboard rollup invalidation signals
+        from . import dashboard, grading  # noqa: F401
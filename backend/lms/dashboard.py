@@ -0,0 +1,129 @@
+"""
+Cached rollups for the admin dashboard
+
+Each section is one conditional-aggregate query. The whole rollup is kept in
+the cache for LMS_DASHBOARD_CACHE_SECONDS and rebuilt by the
+refresh_admin_dashboard Celery task. Creating, verifying or deleting a
+payment only recomputes the payments section (after commit).
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Student, Course, ClassSession, Attendance, Payment
+
+
+CACHE_SECONDS = getattr(settings, 'LMS_DASHBOARD_CACHE_SECONDS', 900)
+
+
+def _month_bounds(today):
+    """First day of this month and of next month, for index-friendly range filters."""
+    start = today.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def _cache_key(month_start):
+    return f'lms:admin_dashboard:{month_start:%Y-%m}'
+
+
+# Sections — one query each
+
+def student_section():
+    return Student.objects.aggregate(
+        total_students=Count('id'),
+        active_students=Count('id', filter=Q(is_active=True)),
+    )
+
+
+def course_section(month_start, month_end):
+    return {
+        'total_courses': Course.objects.filter(is_active=True).count(),
+        'total_sessions_this_month': ClassSession.objects.filter(
+            date__gte=month_start,
+            date__lt=month_end
+        ).count(),
+    }
+
+
+def payment_section(month_start):
+    # The WHERE only admits rows the two aggregates count, so the scan stays on
+    # the pending partial index and the (status, for_month) index
+    totals = Payment.objects.filter(
+        Q(status='pending') | Q(status='completed', for_month=month_start)
+    ).aggregate(
+        pending_payments=Count('id', filter=Q(status='pending')),
+        monthly_revenue=Sum('amount', filter=Q(status='completed', for_month=month_start)),
+    )
+    totals['monthly_revenue'] = totals['monthly_revenue'] or 0
+    return totals
+
+
+def attendance_section(month_start, month_end):
+    return Attendance.objects.filter(
+        date__gte=month_start,
+        date__lt=month_end
+    ).aggregate(
+        total_marked=Count('id'),
+        present=Count('id', filter=Q(status='present')),
+        absent=Count('id', filter=Q(status='absent')),
+    )
+
+
+def compute_admin_rollup(today=None):
+    today = today or timezone.now().date()
+    month_start, month_end = _month_bounds(today)
+    rollup = {}
+    rollup.update(student_section())
+    rollup.update(course_section(month_start, month_end))
+    rollup.update(payment_section(month_start))
+    rollup['attendance_summary'] = attendance_section(month_start, month_end)
+    rollup['computed_at'] = timezone.now()
+    return rollup
+
+
+def refresh_admin_rollup(today=None):
+    """Recompute every section and store it; used by the Celery beat task."""
+    today = today or timezone.now().date()
+    rollup = compute_admin_rollup(today)
+    cache.set(_cache_key(today.replace(day=1)), rollup, CACHE_SECONDS)
+    return rollup
+
+
+def get_admin_rollup(today=None):
+    """Cached rollup, computing it on a cold cache."""
+    today = today or timezone.now().date()
+    rollup = cache.get(_cache_key(today.replace(day=1)))
+    if rollup is None:
+        rollup = refresh_admin_rollup(today)
+    return rollup
+
+
+def refresh_payment_rollup(today=None):
+    """After a payment is created, verified or deleted: recompute only the payment figures."""
+    today = today or timezone.now().date()
+    key = _cache_key(today.replace(day=1))
+    rollup = cache.get(key)
+    if rollup is None:
+        return
+    rollup.update(payment_section(today.replace(day=1)))
+    cache.set(key, rollup, CACHE_SECONDS)
+
+
+@receiver(post_save, sender=Payment)
+def refresh_on_payment_created(sender, instance, created, **kwargs):
+    # Verification refreshes explicitly in the view; new rows change pending_payments
+    if created:
+        transaction.on_commit(refresh_payment_rollup)
+
+
+@receiver(post_delete, sender=Payment)
+def refresh_on_payment_deleted(sender, instance, **kwargs):
+    transaction.on_commit(refresh_payment_rollup)
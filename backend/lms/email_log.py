@@ -0,0 +1,98 @@
+"""
+Buffered EmailLog writes
+
+Bulk email runs log through an EmailLogBuffer, which collects EmailLog rows
+and writes them with bulk_create every LMS_EMAIL_LOG_CHUNK rows (and on
+exit). Rows store the template name and its JSON context plus a SHA-256 of
+that context instead of the rendered HTML; EmailLog.render_content()
+re-renders the body when someone wants to look at it, turning the ISO
+strings DjangoJSONEncoder wrote back into dates and times first so filters
+like |date format them the way the sent email did.
+"""
+
+import hashlib
+import json
+import re
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+
+from .models import EmailLog
+
+
+CHUNK_SIZE = getattr(settings, 'LMS_EMAIL_LOG_CHUNK', 500)
+
+# Exactly what DjangoJSONEncoder emits for date / time / datetime values
+_ISO_DATE     = re.compile(r'\d{4}-\d{2}-\d{2}')
+_ISO_TIME     = re.compile(r'\d{2}:\d{2}:\d{2}(\.\d{3})?')
+_ISO_DATETIME = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{3})?(Z|[+-]\d{2}:\d{2})?')
+
+
+def context_payload(context):
+    """(JSON-safe copy of the context, hash of it) for storing on EmailLog"""
+    encoded = json.dumps(context or {}, cls=DjangoJSONEncoder, sort_keys=True)
+    return json.loads(encoded), hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _revive(value):
+    if isinstance(value, dict):
+        return {key: _revive(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_revive(item) for item in value]
+    if isinstance(value, str):
+        if _ISO_DATE.fullmatch(value):
+            return parse_date(value) or value
+        if _ISO_TIME.fullmatch(value):
+            return parse_time(value) or value
+        if _ISO_DATETIME.fullmatch(value):
+            return parse_datetime(value) or value
+    return value
+
+
+def restore_context(stored_context):
+    """Stored JSON context with its dates, times and datetimes parsed back"""
+    return _revive(stored_context or {})
+
+
+def build_email_log(student, email_type, subject, status='sent', error_message='',
+                    template_name='', context=None, content=''):
+    stored_context, context_hash = context_payload(context) if template_name else ({}, '')
+    return EmailLog(
+        student=student,
+        email_type=email_type,
+        subject=subject,
+        content=content,
+        template_name=template_name,
+        context=stored_context,
+        context_hash=context_hash,
+        status=status,
+        error_message=error_message
+    )
+
+
+class EmailLogBuffer:
+    """Collects EmailLog rows and writes them in bulk_create chunks"""
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        self.pending    = []
+        self.written    = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+        return False
+
+    def add(self, log):
+        self.pending.append(log)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            EmailLog.objects.bulk_create(self.pending, batch_size=self.chunk_size)
+            self.written += len(self.pending)
+            self.pending = []
@@ -3,33 +3,38 @@ Email service for LMS - handles all automated email notifications
 """
 
 from django.core.mail import send_mail, EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from django.conf import settings
-from .models import EmailLog, Student, Payment, ReferralTracking, ClassSession, QuizAttempt
+from .models import (
+    EmailLog, Student, Payment, ReferralTracking, ClassSession, QuizAttempt,
+    Attendance, StudentEnrollment
+)
+from .email_log import EmailLogBuffer, build_email_log
+from .email_templates import render_email
+from .mailer import PooledMailer
 
 # LMS Settings
 UPI_ID = getattr(settings, 'LMS_UPI_ID', '8826776018-4@ybl')
 MONTHLY_FEE = getattr(settings, 'LMS_MONTHLY_FEE', 1000)
+ABSENCE_CHUNK_SIZE = getattr(settings, 'LMS_ABSENCE_CHUNK_SIZE', 500)
 
 
-def log_email(student, email_type, subject, content='', status='sent', error_message=''):
-    """Log email to database"""
-    EmailLog.objects.create(
-        student=student,
-        email_type=email_type,
-        subject=subject,
-        content=content,
-        status=status,
-        error_message=error_message
+def log_email(student, email_type, subject, content='', status='sent', error_message='',
+              template_name='', context=None, log_buffer=None):
+    """Log email to database (through the bulk run's buffer when given one)"""
+    log = build_email_log(
+        student, email_type, subject, status, error_message,
+        template_name=template_name, context=context, content=content
     )
+    if log_buffer is not None:
+        log_buffer.add(log)
+    else:
+        log.save()
 
 
-def send_email_with_template(student, email_type, subject, template_name, context):
-    """Send email using HTML template"""
+def send_email_with_template(student, email_type, subject, template_name, context, mailer=None, log_buffer=None):
+    """Send email using HTML template (over the bulk run's pooled connection when given a mailer)"""
     try:
-        html_content = render_to_string(f'lms/emails/{template_name}.html', context)
-        text_content = strip_tags(html_content)
+        html_content, text_content = render_email(template_name, context)
         
         email = EmailMultiAlternatives(
             subject=subject,
@@ -38,12 +43,17 @@ def send_email_with_template(student, email_type, subject, template_name, contex
             to=[student.user.email]
         )
         email.attach_alternative(html_content, "text/html")
-        email.send()
+        if mailer:
+            mailer.send(email)
+        else:
+            email.send()
         
-        log_email(student, email_type, subject, html_content, 'sent')
+        log_email(student, email_type, subject, status='sent',
+                  template_name=template_name, context=context, log_buffer=log_buffer)
         return True
     except Exception as e:
-        log_email(student, email_type, subject, '', 'failed', str(e))
+        log_email(student, email_type, subject, status='failed', error_message=str(e),
+                  template_name=template_name, context=context, log_buffer=log_buffer)
         return False
 
 
@@ -60,7 +70,7 @@ def send_welcome_email(student):
     return send_email_with_template(student, 'welcome', subject, 'welcome', context)
 
 
-def send_payment_reminder_email(student, payment):
+def send_payment_reminder_email(student, payment, mailer=None, log_buffer=None):
     """Send payment reminder email"""
     subject = f"Payment Reminder - Fee Due for {payment.for_month.strftime('%B %Y')}"
     context = {
@@ -71,10 +81,10 @@ def send_payment_reminder_email(student, payment):
         'upi_id': 'seekhowithrua@ybl',  # Update with actual UPI ID
         'phonepe_qr_url': '/static/lms/phonepe-qr.png',  # Update with actual QR
     }
-    return send_email_with_template(student, 'payment_reminder', subject, 'payment_reminder', context)
+    return send_email_with_template(student, 'payment_reminder', subject, 'payment_reminder', context, mailer, log_buffer)
 
 
-def send_payment_receipt_email(payment):
+def send_payment_receipt_email(payment, mailer=None, log_buffer=None):
     """Send payment receipt after verification"""
     student = payment.student
     subject = f"Payment Receipt - {payment.receipt_number}"
@@ -88,14 +98,14 @@ def send_payment_receipt_email(payment):
         'current_fee': student.current_monthly_fee,
     }
     
-    if send_email_with_template(student, 'payment_receipt', subject, 'payment_receipt', context):
+    if send_email_with_template(student, 'payment_receipt', subject, 'payment_receipt', context, mailer, log_buffer):
         payment.receipt_sent = True
         payment.save()
         return True
     return False
 
 
-def send_class_reminder_email(student, class_session, hours_before):
+def send_class_reminder_email(student, class_session, hours_before, mailer=None, log_buffer=None):
     """Send class reminder email"""
     if hours_before == 24:
         subject = f"Reminder: {class_session.title} tomorrow at {class_session.start_time}"
@@ -112,10 +122,10 @@ def send_class_reminder_email(student, class_session, hours_before):
         'start_time': class_session.start_time,
         'hours_before': hours_before,
     }
-    return send_email_with_template(student, email_type, subject, 'class_reminder', context)
+    return send_email_with_template(student, email_type, subject, 'class_reminder', context, mailer, log_buffer)
 
 
-def send_feedback_form_email(student, class_session):
+def send_feedback_form_email(student, class_session, mailer=None, log_buffer=None):
     """Send feedback form link after class"""
     subject = f"Feedback Request: {class_session.title}"
     context = {
@@ -124,10 +134,10 @@ def send_feedback_form_email(student, class_session):
         'course_title': class_session.course.title,
         'feedback_url': f"https://app.seekhowithrua.com/feedback/{class_session.id}",
     }
-    return send_email_with_template(student, 'feedback_form', subject, 'feedback_form', context)
+    return send_email_with_template(student, 'feedback_form', subject, 'feedback_form', context, mailer, log_buffer)
 
 
-def send_absence_alert_email(student, consecutive_days):
+def send_absence_alert_email(student, consecutive_days, mailer=None, log_buffer=None):
     """Send alert for continuous absence"""
     subject = f"Absence Alert - {consecutive_days} Days Missed"
     context = {
@@ -135,10 +145,10 @@ def send_absence_alert_email(student, consecutive_days):
         'consecutive_days': consecutive_days,
         'parent_contact': student.whatsapp or student.phone,
     }
-    return send_email_with_template(student, 'absence_alert', subject, 'absence_alert', context)
+    return send_email_with_template(student, 'absence_alert', subject, 'absence_alert', context, mailer, log_buffer)
 
 
-def send_referral_concession_email(referral_tracking):
+def send_referral_concession_email(referral_tracking, mailer=None, log_buffer=None):
     """Send notification about applied referral concession"""
     referrer = referral_tracking.referrer
     referred = referral_tracking.referred_student
@@ -149,11 +159,11 @@ def send_referral_concession_email(referral_tracking):
         'referred_name': referred.user.get_full_name(),
         'concession_amount': referral_tracking.concession_amount,
         'new_monthly_fee': referrer.current_monthly_fee,
-        'total_referrals': ReferralTracking.objects.filter(referrer=referrer, status='paid').count(),
+        'total_referrals': referrer.referrals_paid,
         'referral_code': referrer.referral_code,
     }
     
-    if send_email_with_template(referrer, 'referral_concession', subject, 'referral_concession', context):
+    if send_email_with_template(referrer, 'referral_concession', subject, 'referral_concession', context, mailer, log_buffer):
         referral_tracking.concession_notification_sent = True
         referral_tracking.save()
         return True
@@ -166,13 +176,13 @@ def send_earnings_notification_email(student):
     context = {
         'student_name': student.user.get_full_name(),
         'total_earnings': student.total_earnings,
-        'active_referrals': ReferralTracking.objects.filter(referrer=student, status='paid').count(),
+        'active_referrals': student.referrals_paid,
         'earning_per_referral': 200,
     }
     return send_email_with_template(student, 'earnings_notification', subject, 'earnings_notification', context)
 
 
-def send_test_result_email(test_result):
+def send_test_result_email(test_result, mailer=None, log_buffer=None):
     """Send test results to student"""
     student = test_result.student
     test = test_result.test
@@ -187,135 +197,128 @@ def send_test_result_email(test_result):
         'rank': test_result.rank,
         'remarks': test_result.remarks,
     }
-    return send_email_with_template(student, 'test_result', subject, 'test_result', context)
+    return send_email_with_template(student, 'test_result', subject, 'test_result', context, mailer, log_buffer)
 
 
 # Bulk email functions for Celery tasks
 
-def send_payment_reminders_to_all():
-    """Send payment reminders to all students with pending payments"""
+def send_test_result_emails(results, on_progress=None, progress_every=25):
+    """Send result emails for a batch of TestResults over one SMTP connection"""
+    results = list(results)
+    sent_count = failed_count = 0
+    
+    with PooledMailer() as mailer, EmailLogBuffer() as log_buffer:
+        for i, result in enumerate(results, 1):
+            if send_test_result_email(result, mailer, log_buffer):
+                sent_count += 1
+            else:
+                failed_count += 1
+            if on_progress and (i % progress_every == 0 or i == len(results)):
+                on_progress(sent=sent_count, failed=failed_count, total=len(results))
+    
+    return sent_count
+
+def pending_reminder_payments():
+    """Pending payments for the current month"""
     from django.utils import timezone
-    from datetime import timedelta
     
-    # Get students with pending payments for current month
-    current_month = timezone.now().replace(day=1)
-    pending_payments = Payment.objects.filter(
+    current_month = timezone.now().date().replace(day=1)
+    return Payment.objects.filter(
         for_month=current_month,
         status='pending'
-    ).select_related('student')
+    )
+
+
+def send_payment_reminders_to_all(id_range=None):
+    """Send payment reminders to all students with pending payments (or those in a payment id range)"""
+    pending_payments = pending_reminder_payments().select_related('student__user')
+    if id_range:
+        pending_payments = pending_payments.filter(id__range=id_range)
     
     sent_count = 0
-    for payment in pending_payments:
-        if send_payment_reminder_email(payment.student, payment):
-            sent_count += 1
+    with PooledMailer() as mailer, EmailLogBuffer() as log_buffer:
+        for payment in pending_payments:
+            if send_payment_reminder_email(payment.student, payment, mailer, log_buffer):
+                sent_count += 1
     
     return sent_count
 
 
-def send_class_reminders():
-    """Send class reminders (24h and 1h before)"""
-    from django.utils import timezone
-    from datetime import timedelta
+def send_class_reminder_batch(hours_before, session_ids, enrollment_range=None):
+    """Remind every active enrollee (optionally an enrollment id range) of already-claimed sessions"""
+    from .reminders import session_pairs
     
-    now = timezone.now()
     sent_count = 0
-    
-    # 24 hour reminders
-    classes_24h = ClassSession.objects.filter(
-        date=now.date() + timedelta(days=1),
-        reminder_sent_24h=False
-    )
-    
-    for session in classes_24h:
-        enrollments = StudentEnrollment.objects.filter(
-            course=session.course,
-            is_active=True
-        ).select_related('student')
-        
-        for enrollment in enrollments:
-            if send_class_reminder_email(enrollment.student, session, 24):
+    with PooledMailer() as mailer, EmailLogBuffer() as log_buffer:
+        for session, student in session_pairs(session_ids, enrollment_range):
+            if send_class_reminder_email(student, session, hours_before, mailer, log_buffer):
                 sent_count += 1
-        
-        session.reminder_sent_24h = True
-        session.save()
     
-    # 1 hour reminders
-    classes_1h = ClassSession.objects.filter(
-        date=now.date(),
-        start_time__hour=now.hour + 1,
-        reminder_sent_1h=False
-    )
+    return sent_count
+
+
+def send_class_reminders():
+    """Send class reminders (24h and 1h before)"""
+    from .reminders import claim_reminder_sessions
     
-    for session in classes_1h:
-        enrollments = StudentEnrollment.objects.filter(
-            course=session.course,
-            is_active=True
-        ).select_related('student')
-        
-        for enrollment in enrollments:
-            if send_class_reminder_email(enrollment.student, session, 1):
-                sent_count += 1
-        
-        session.reminder_sent_1h = True
-        session.save()
+    sent_count = 0
+    for hours_before in (24, 1):
+        session_ids = claim_reminder_sessions(hours_before)
+        if session_ids:
+            sent_count += send_class_reminder_batch(hours_before, session_ids)
     
     return sent_count
 
 
-def check_continuous_absence():
-    """Check for students with 3+ days of continuous absence"""
-    from django.utils import timezone
-    from datetime import timedelta
-    
-    today = timezone.now().date()
-    students = Student.objects.filter(is_active=True)
+def send_absence_alerts(streaks):
+    """Alert each (student_id, consecutive_absences) row"""
+    students = Student.objects.select_related('user').in_bulk([row[0] for row in streaks])
     
     alerted_count = 0
-    for student in students:
-        # Check last 3 days
-        consecutive_absent = 0
-        for i in range(1, 4):
-            check_date = today - timedelta(days=i)
-            attendance = Attendance.objects.filter(
-                student=student,
-                date=check_date
-            ).first()
-            
-            if attendance and attendance.status == 'absent':
-                consecutive_absent += 1
-            else:
-                break
-        
-        if consecutive_absent >= 3:
-            if send_absence_alert_email(student, consecutive_absent):
+    with PooledMailer() as mailer, EmailLogBuffer() as log_buffer:
+        for student_id, consecutive_absent in streaks:
+            if send_absence_alert_email(students[student_id], consecutive_absent, mailer, log_buffer):
                 alerted_count += 1
     
     return alerted_count
 
 
-def send_feedback_form_requests():
-    """Send feedback forms for completed classes"""
-    from django.utils import timezone
+def check_continuous_absence(min_streak=None, window_days=None, chunk_size=ABSENCE_CHUNK_SIZE):
+    """Alert students whose latest attendance records are consecutive absences"""
+    from .absence import find_absence_streaks
     
-    now = timezone.now()
-    completed_classes = ClassSession.objects.filter(
-        date__lt=now.date(),
-        feedback_form_sent=False
-    )
+    streaks = [(student_id, streak) for student_id, streak, _ in find_absence_streaks(min_streak, window_days)]
+    
+    alerted_count = 0
+    for start in range(0, len(streaks), chunk_size):
+        alerted_count += send_absence_alerts(streaks[start:start + chunk_size])
+    
+    return alerted_count
+
+
+def send_feedback_form_requests(max_sends=None):
+    """Send feedback forms for completed classes (resumable, capped per run)"""
+    from .feedback_dispatch import dispatch_feedback_forms
+    
+    return dispatch_feedback_forms(max_sends).get('sent', 0)
+
+
+def send_payment_verification_emails(payment_ids, referral_ids):
+    """Receipts for bulk-verified payments plus concession notices for the referrals they activated"""
+    payments = Payment.objects.filter(id__in=payment_ids, receipt_sent=False).select_related('student__user')
+    referrals = ReferralTracking.objects.filter(
+        id__in=referral_ids,
+        concession_notification_sent=False
+    ).select_related('referrer__user', 'referred_student__user')
     
     sent_count = 0
-    for session in completed_classes:
-        enrollments = StudentEnrollment.objects.filter(
-            course=session.course,
-            is_active=True
-        ).select_related('student')
-        
-        for enrollment in enrollments:
-            if send_feedback_form_email(enrollment.student, session):
+    with PooledMailer() as mailer, EmailLogBuffer() as log_buffer:
+        for payment in payments:
+            if send_payment_receipt_email(payment, mailer, log_buffer):
+                sent_count += 1
+        for referral in referrals:
+            if send_referral_concession_email(referral, mailer, log_buffer):
                 sent_count += 1
-        
-        session.feedback_form_sent = True
-        session.save()
     
     return sent_count
 
@@ -341,7 +344,7 @@ def send_quiz_result_email(attempt):
     
     if send_email_with_template(student, 'quiz_result', subject, 'quiz_result', context):
         attempt.result_email_sent = True
-        attempt.save()
+        attempt.save(update_fields=['result_email_sent'])
         return True
     return False
 
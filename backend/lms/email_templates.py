@@ -0,0 +1,100 @@
+"""
+Compiled email templates
+
+Each lms/emails/<name>.html template is compiled once per process, together
+with a plaintext twin derived from its source: <head>/<style> dropped, links
+kept as "text (url)", tags stripped, entities decoded — with the template
+tags left in place. Sending an email is then two renders of already-compiled
+templates; strip_tags no longer runs over every rendered body.
+
+    html, text = render_email('class_reminder', context)
+    pairs = render_email_batch('class_reminder', contexts)
+
+With DEBUG on, templates are recompiled per call so edits show up at once.
+"""
+
+import html
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.template import Context, engines
+
+
+TEMPLATE_DIR = 'lms/emails'
+
+_TEMPLATE_TOKEN = re.compile(r'{%.*?%}|{{.*?}}|{#.*?#}', re.S)
+_HIDDEN_BLOCK = re.compile(r'<(head|style|script)\b.*?</\1\s*>', re.S | re.I)
+_LINK = re.compile(r'<a\b[^>]*?href="([^"]*)"[^>]*>(.*?)</a\s*>', re.S | re.I)
+_LINE_BREAK = re.compile(r'<(br|/p|/div|/h[1-6]|/li|/tr|/table)\b[^>]*>', re.I)
+_TAG = re.compile(r'<[^>]+>')
+_BLANK_LINES = re.compile(r'\n\s*\n(\s*\n)+')
+
+
+def plaintext_source(html_source):
+    """Turn an HTML email template's source into a plaintext template source"""
+    tokens = []
+
+    def protect(match):
+        tokens.append(match.group(0))
+        return f'\x00{len(tokens) - 1}\x00'
+
+    text = _TEMPLATE_TOKEN.sub(protect, html_source)
+    text = _HIDDEN_BLOCK.sub('', text)
+    text = _LINK.sub(lambda m: f'{m.group(2)} ({m.group(1)})', text)
+    text = _LINE_BREAK.sub('\n', text)
+    text = _TAG.sub('', text)
+    text = html.unescape(text)
+    text = '\n'.join(line.strip() for line in text.splitlines())
+    text = _BLANK_LINES.sub('\n\n', text).strip()
+    text = re.sub('\x00(\\d+)\x00', lambda m: tokens[int(m.group(1))], text)
+    return '{% autoescape off %}' + text + '{% endautoescape %}'
+
+
+class CompiledEmailTemplate:
+    """HTML template + derived plaintext template, both compiled once"""
+
+    def __init__(self, name):
+        engine = engines['django'].engine
+        self.name = name
+        self.html_template = engine.get_template(f'{TEMPLATE_DIR}/{name}.html')
+        self.text_template = engine.from_string(plaintext_source(self.html_template.source))
+        self.autoescape = engine.autoescape
+
+    def _render(self, context):
+        html_content = self.html_template.render(context)
+        text_content = _BLANK_LINES.sub('\n\n', self.text_template.render(context)).strip()
+        return html_content, text_content
+
+    def render(self, context):
+        return self._render(Context(context, autoescape=self.autoescape))
+
+    def render_many(self, contexts):
+        """Render a batch of contexts, reusing one Context object"""
+        base = Context(autoescape=self.autoescape)
+        rendered = []
+        for context in contexts:
+            with base.push(context):
+                rendered.append(self._render(base))
+        return rendered
+
+
+@lru_cache(maxsize=None)
+def _cached_template(name):
+    return CompiledEmailTemplate(name)
+
+
+def get_email_template(name):
+    if settings.DEBUG:
+        return CompiledEmailTemplate(name)
+    return _cached_template(name)
+
+
+def render_email(template_name, context):
+    """(html, text) for one email"""
+    return get_email_template(template_name).render(context)
+
+
+def render_email_batch(template_name, contexts):
+    """[(html, text), ...] for many emails from the same template"""
+    return get_email_template(template_name).render_many(contexts)
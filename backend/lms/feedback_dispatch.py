@@ -0,0 +1,134 @@
+"""
+Resumable feedback-form dispatch
+
+Walks ended sessions with feedback_form_sent=False in (date, id) order, and
+each session's active enrollments in id order — keyset cursors throughout,
+no OFFSET. After every email the session's feedback_cursor is moved to that
+enrollment id, so a run that crashes resumes at the next student instead of
+re-sending; a session is flagged feedback_form_sent once its last enrollee
+is done.
+
+A run stops after LMS_FEEDBACK_MAX_PER_RUN emails and the task re-queues
+itself, so a backlog drains in steady slices. Sessions older than
+LMS_FEEDBACK_MAX_AGE_DAYS (e.g. left over from an outage) are closed without
+sending — nobody wants a feedback form for last month's class. Each close is
+logged at WARNING with the session ids, since those students never get a form.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .email_log import EmailLogBuffer
+from .mailer import PooledMailer
+from .models import ClassSession, StudentEnrollment
+
+
+MAX_PER_RUN = getattr(settings, 'LMS_FEEDBACK_MAX_PER_RUN', 2000)
+MAX_AGE_DAYS = getattr(settings, 'LMS_FEEDBACK_MAX_AGE_DAYS', 7)
+PAGE_SIZE = 500
+
+LOCK_KEY = 'lms:feedback_dispatch:lock'
+LOCK_SECONDS = 60 * 60
+REPORT_KEY = 'lms:feedback_dispatch:last_run'
+
+logger = logging.getLogger(__name__)
+
+
+def pending_sessions(today):
+    return ClassSession.objects.filter(date__lt=today, feedback_form_sent=False)
+
+
+def dispatch_feedback_forms(max_sends=None, today=None):
+    """Send up to max_sends feedback forms, resuming where the last run stopped. Returns a run report."""
+    if not cache.add(LOCK_KEY, True, LOCK_SECONDS):
+        return {'skipped': 'another feedback dispatch is running'}
+    try:
+        report = _dispatch(max_sends or MAX_PER_RUN, today or timezone.localtime().date())
+    finally:
+        cache.delete(LOCK_KEY)
+    cache.set(REPORT_KEY, report, None)
+    return report
+
+
+def close_stale_sessions(today):
+    """Flag sessions older than MAX_AGE_DAYS as sent without emailing anyone; returns how many"""
+    stale_ids = list(
+        pending_sessions(today)
+        .filter(date__lt=today - timedelta(days=MAX_AGE_DAYS))
+        .order_by('date', 'id')
+        .values_list('id', flat=True)
+    )
+    if not stale_ids:
+        return 0
+    closed = ClassSession.objects.filter(id__in=stale_ids, feedback_form_sent=False).update(feedback_form_sent=True)
+    logger.warning(
+        'Closed %d feedback session(s) older than %d days without sending: %s',
+        closed, MAX_AGE_DAYS, ', '.join(map(str, stale_ids))
+    )
+    return closed
+
+
+def _dispatch(budget, today):
+    from .email_service import send_feedback_form_email
+
+    started = time.perf_counter()
+    stale = close_stale_sessions(today)
+
+    sent = failed = completed = 0
+    resumed_from = None
+    last_key = None  # (date, id) of the last session visited
+
+    with PooledMailer() as mailer, EmailLogBuffer() as log_buffer:
+        while budget > 0:
+            sessions = pending_sessions(today).select_related('course').order_by('date', 'id')
+            if last_key:
+                sessions = sessions.filter(Q(date__gt=last_key[0]) | Q(date=last_key[0], id__gt=last_key[1]))
+            session = sessions.first()
+            if session is None:
+                break
+            last_key = (session.date, session.id)
+            if session.feedback_cursor and resumed_from is None:
+                resumed_from = {'session': session.id, 'after_enrollment': session.feedback_cursor}
+
+            cursor = session.feedback_cursor
+            while budget > 0:
+                limit = min(budget, PAGE_SIZE)
+                page = list(
+                    StudentEnrollment.objects.filter(
+                        course_id=session.course_id,
+                        is_active=True,
+                        id__gt=cursor
+                    ).select_related('student__user').order_by('id')[:limit]
+                )
+                for enrollment in page:
+                    if send_feedback_form_email(enrollment.student, session, mailer, log_buffer):
+                        sent += 1
+                    else:
+                        failed += 1
+                    cursor = enrollment.id
+                    ClassSession.objects.filter(id=session.id).update(feedback_cursor=cursor)
+                    budget -= 1
+                if len(page) < limit:
+                    ClassSession.objects.filter(id=session.id).update(feedback_form_sent=True)
+                    completed += 1
+                    break
+
+    elapsed = time.perf_counter() - started
+    return {
+        'sent': sent,
+        'failed': failed,
+        'sessions_completed': completed,
+        'stale_sessions_closed': stale,
+        'resumed_from': resumed_from,
+        'capped': budget <= 0,
+        'remaining_sessions': pending_sessions(today).count(),
+        'seconds': round(elapsed, 3),
+        'per_second': round((sent + failed) / elapsed, 1) if elapsed else None,
+        'finished_at': timezone.now().isoformat(),
+    }
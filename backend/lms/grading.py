@@ -0,0 +1,116 @@
+"""
+Quiz grading engine
+
+Each quiz's answer key — {question id: (normalized answer, marks)} plus the
+quiz's total and passing marks — is built once and kept in the Django cache
+for LMS_QUIZ_KEY_CACHE_SECONDS. Saving or deleting a question, or saving the
+quiz, drops the cached key (after commit), so the next grade sees the edit.
+
+Grading is pure in-memory work against the key: grade_attempt() scores one
+attempt without touching the database, and regrade_attempts() walks any
+number of submitted attempts with iterator() and writes only the ones whose
+score changed, with bulk_update — e.g. after fixing a wrong answer in the key.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Quiz, QuizAttempt, QuizQuestion
+
+
+KEY_CACHE_SECONDS = getattr(settings, 'LMS_QUIZ_KEY_CACHE_SECONDS', 60 * 60 * 24)
+REGRADE_BATCH_SIZE = 1000
+GRADED_FIELDS = ['score', 'percentage', 'is_passed']
+
+
+def normalize_answer(answer):
+    return str(answer or '').strip().lower()
+
+
+def answer_key_cache_key(quiz_id):
+    return f'lms:quiz_answer_key:{quiz_id}'
+
+
+def build_answer_key(quiz_id):
+    quiz = Quiz.objects.only('total_marks', 'passing_marks').get(id=quiz_id)
+    questions = QuizQuestion.objects.filter(quiz_id=quiz_id).values_list('id', 'correct_answer', 'marks')
+    return {
+        'answers': {str(qid): (normalize_answer(correct), marks) for qid, correct, marks in questions},
+        'total_marks': quiz.total_marks,
+        'passing_marks': quiz.passing_marks,
+    }
+
+
+def get_answer_key(quiz_id):
+    """The quiz's normalized answer key, from the cache when it is there"""
+    key = cache.get(answer_key_cache_key(quiz_id))
+    if key is None:
+        key = build_answer_key(quiz_id)
+        cache.set(answer_key_cache_key(quiz_id), key, KEY_CACHE_SECONDS)
+    return key
+
+
+def invalidate_answer_key(quiz_id):
+    transaction.on_commit(lambda: cache.delete(answer_key_cache_key(quiz_id)))
+
+
+def score_answers(answers, key):
+    """(score, percentage, is_passed) for a {question id: answer} dict"""
+    score = 0
+    for question_id, (correct, marks) in key['answers'].items():
+        if normalize_answer(answers.get(question_id)) == correct:
+            score += marks
+    percentage = Decimal('0.00')
+    if key['total_marks'] > 0:
+        percentage = (Decimal(score * 100) / key['total_marks']).quantize(Decimal('0.01'))
+    return score, percentage, score >= key['passing_marks']
+
+
+def grade_attempt(attempt, key=None):
+    """Set score / percentage / is_passed on the attempt in memory; returns True if they changed"""
+    key = key or get_answer_key(attempt.quiz_id)
+    graded = score_answers(attempt.answers or {}, key)
+    changed = graded != (attempt.score, Decimal(attempt.percentage), attempt.is_passed)
+    attempt.score, attempt.percentage, attempt.is_passed = graded
+    return changed
+
+
+def regrade_attempts(attempts, batch_size=REGRADE_BATCH_SIZE):
+    """Re-grade submitted attempts in memory and bulk_update the changed ones. Returns counts."""
+    keys = {}
+    changed = []
+    graded = 0
+    attempts = attempts.filter(submitted_at__isnull=False).only(
+        'id', 'quiz_id', 'answers', *GRADED_FIELDS
+    ).order_by()
+
+    with transaction.atomic():
+        for attempt in attempts.iterator(chunk_size=batch_size):
+            if attempt.quiz_id not in keys:
+                keys[attempt.quiz_id] = build_answer_key(attempt.quiz_id)
+            graded += 1
+            if grade_attempt(attempt, keys[attempt.quiz_id]):
+                changed.append(attempt)
+        QuizAttempt.objects.bulk_update(changed, GRADED_FIELDS, batch_size=batch_size)
+
+    return {'graded': graded, 'changed': len(changed)}
+
+
+def regrade_quiz(quiz_id):
+    return regrade_attempts(QuizAttempt.objects.filter(quiz_id=quiz_id))
+
+
+@receiver(post_save, sender=QuizQuestion)
+@receiver(post_delete, sender=QuizQuestion)
+def drop_key_on_question_change(sender, instance, **kwargs):
+    invalidate_answer_key(instance.quiz_id)
+
+
+@receiver(post_save, sender=Quiz)
+def drop_key_on_quiz_change(sender, instance, **kwargs):
+    invalidate_answer_key(instance.id)
@@ -0,0 +1,135 @@
+"""
+Pooled SMTP sending for bulk LMS emails
+
+A PooledMailer holds one get_connection() open for a whole bulk run instead of
+a TLS handshake per email. Messages go out over that connection through
+send_messages(); every LMS_EMAIL_BATCH_SIZE messages the session is recycled
+(SMTP servers such as Gmail cap messages per connection). Transient failures
+(dropped connection, 4xx replies) reconnect and retry with exponential
+backoff; permanent 5xx rejections fail the message straight away.
+
+    with PooledMailer() as mailer:
+        for student in students:
+            send_class_reminder_email(student, session, 24, mailer=mailer)
+    mailer.stats()   # sent / failed / retries / throughput
+"""
+
+import smtplib
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+
+BATCH_SIZE = getattr(settings, 'LMS_EMAIL_BATCH_SIZE', 100)
+MAX_RETRIES = getattr(settings, 'LMS_EMAIL_MAX_RETRIES', 3)
+RETRY_BACKOFF = getattr(settings, 'LMS_EMAIL_RETRY_BACKOFF', 1.0)
+
+
+def is_transient(exc):
+    """Worth a reconnect + retry? Dropped sockets and 4xx replies are; 5xx are not."""
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return False
+    return isinstance(exc, (smtplib.SMTPException, OSError))
+
+
+class PooledMailer:
+    """One SMTP connection shared by every message of a bulk run"""
+
+    def __init__(self, batch_size=None, max_retries=None, backoff=None, connection=None):
+        self.batch_size  = batch_size or BATCH_SIZE
+        self.max_retries = MAX_RETRIES if max_retries is None else max_retries
+        self.backoff     = RETRY_BACKOFF if backoff is None else backoff
+        self.connection  = connection or get_connection()
+        self.sent        = 0
+        self.failed      = 0
+        self.retries     = 0
+        self.sessions    = 0
+        self._in_session = 0
+        self._open       = False
+        self._started    = None
+        self._elapsed    = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        self._elapsed = time.perf_counter() - self._started
+        return False
+
+    # ── Connection ───────────────────────────────────────────────────────────
+
+    def _ensure_open(self):
+        if not self._open:
+            self.connection.open()
+            self._open = True
+            self._in_session = 0
+            self.sessions += 1
+
+    def _discard(self):
+        """Drop a connection that just failed; errors closing it are irrelevant"""
+        try:
+            self.close()
+        except Exception:
+            self._open = False
+
+    def close(self):
+        if self._open:
+            try:
+                self.connection.close()
+            finally:
+                self._open = False
+
+    # ── Sending ──────────────────────────────────────────────────────────────
+
+    def send(self, message):
+        """Send one message over the shared connection; raises once retries are exhausted"""
+        attempt = 0
+        while True:
+            try:
+                self._ensure_open()
+                self.connection.send_messages([message])
+                break
+            except Exception as exc:
+                self._discard()
+                if attempt >= self.max_retries or not is_transient(exc):
+                    self.failed += 1
+                    raise
+                attempt += 1
+                self.retries += 1
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+        self.sent += 1
+        self._in_session += 1
+        if self._in_session >= self.batch_size:
+            self.close()
+        return True
+
+    def send_batch(self, messages):
+        """Send a list of messages; returns (sent, [(message, exception), ...])"""
+        sent, errors = 0, []
+        for message in messages:
+            try:
+                self.send(message)
+                sent += 1
+            except Exception as exc:
+                errors.append((message, exc))
+        return sent, errors
+
+    # ── Metrics ──────────────────────────────────────────────────────────────
+
+    def stats(self):
+        elapsed = self._elapsed or (time.perf_counter() - self._started if self._started else 0)
+        return {
+            'sent':       self.sent,
+            'failed':     self.failed,
+            'retries':    self.retries,
+            'sessions':   self.sessions,
+            'batch_size': self.batch_size,
+            'seconds':    round(elapsed, 3),
+            'per_second': round(self.sent / elapsed, 1) if elapsed else None,
+        }
@@ -0,0 +1,108 @@
+"""
+python manage.py email_render_benchmark --count 2000 [--template class_reminder]
+
+Renders every LMS email template --count times three ways and prints renders
+per second for each:
+
+  - legacy    render_to_string() + strip_tags() per email (the old path)
+  - compiled  CompiledEmailTemplate.render() per email
+  - batch     CompiledEmailTemplate.render_many() over all contexts
+"""
+
+import time
+from datetime import date, datetime, time as dtime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from lms.email_templates import CompiledEmailTemplate
+
+
+def sample_context(i):
+    """One context that satisfies every template; values vary per email"""
+    return {
+        'student_name': f'Student {i}',
+        'student': {'total_referral_discount': i % 3 * 200},
+        'grade': 'Class 10',
+        'referral_code': f'RUA{i:05d}',
+        'monthly_fee': 1000,
+        'login_email': f'student{i}@example.com',
+        'email': f'student{i}@example.com',
+        'amount': Decimal('1000.00'),
+        'for_month': 'October 2026',
+        'due_date': date(2026, 10, 10),
+        'upi_id': 'seekhowithrua@ybl',
+        'phonepe_qr_url': '/static/lms/phonepe-qr.png',
+        'receipt_number': f'RUA2026{i:06d}',
+        'payment_date': datetime(2026, 10, 5, 12, 0),
+        'utr_number': f'UTR{i:010d}',
+        'current_fee': 800,
+        'class_title': 'Linear Equations',
+        'course_title': 'Mathematics',
+        'date': date(2026, 10, 20),
+        'start_time': dtime(17, 0),
+        'hours_before': 24 if i % 2 else 1,
+        'feedback_url': f'https://app.seekhowithrua.com/feedback/{i}',
+        'consecutive_days': 3,
+        'parent_contact': '9999999999',
+        'referrer_name': f'Student {i}',
+        'referred_name': f'Friend {i}',
+        'concession_amount': 200,
+        'new_monthly_fee': 800,
+        'total_referrals': i % 12,
+        'test_title': 'Unit Test 3',
+        'quiz_title': 'Quick Quiz',
+        'session_title': 'Linear Equations',
+        'marks_obtained': 40 + i % 60,
+        'score': 7,
+        'total_marks': 100,
+        'percentage': Decimal('72.50'),
+        'rank': i % 40 + 1,
+        'remarks': 'Good work',
+        'is_passed': bool(i % 2),
+        'passing_marks': 40,
+        'time_taken_minutes': 4,
+        'time_taken_seconds': 30,
+        'verification_url': f'https://api.seekhowithrua.com/api/lms/enrollment/verify_email/?token={i}',
+    }
+
+
+TEMPLATES = [
+    'welcome', 'email_verification', 'payment_reminder', 'payment_receipt',
+    'class_reminder', 'feedback_form', 'absence_alert', 'referral_concession',
+    'test_result', 'quiz_result',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark email template rendering (renders/sec per template)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Emails rendered per template per mode')
+        parser.add_argument('--template', action='append', help='Template name (repeatable); default all')
+
+    def handle(self, *args, **opts):
+        count = opts['count']
+        contexts = [sample_context(i) for i in range(count)]
+        w = self.stdout.write
+        w(f"{'template':<22}{'legacy/s':>12}{'compiled/s':>12}{'batch/s':>12}{'speedup':>9}")
+
+        for name in opts['template'] or TEMPLATES:
+            started = time.perf_counter()
+            for context in contexts:
+                strip_tags(render_to_string(f'lms/emails/{name}.html', context))
+            legacy = count / (time.perf_counter() - started)
+
+            template = CompiledEmailTemplate(name)
+            started = time.perf_counter()
+            for context in contexts:
+                template.render(context)
+            compiled = count / (time.perf_counter() - started)
+
+            started = time.perf_counter()
+            template.render_many(contexts)
+            batch = count / (time.perf_counter() - started)
+
+            w(f'{name:<22}{legacy:>12.0f}{compiled:>12.0f}{batch:>12.0f}{max(compiled, batch) / legacy:>8.1f}x')
@@ -0,0 +1,66 @@
+"""
+python manage.py email_throughput --count 1000 --batch-size 100
+
+Sends --count synthetic emails twice through the given email backend —
+once the old way (message.send(), a new connection each) and once through
+PooledMailer — and prints messages per second for both. Defaults to the
+locmem backend so nothing leaves the machine; pass --backend to point it at
+console or a real SMTP server.
+"""
+
+import os
+import time
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand
+
+from lms.mailer import PooledMailer
+
+
+LOCMEM = 'django.core.mail.backends.locmem.EmailBackend'
+CONSOLE = 'django.core.mail.backends.console.EmailBackend'
+
+
+class Command(BaseCommand):
+    help = 'Compare per-message and pooled email sending throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500, help='Emails per run')
+        parser.add_argument('--batch-size', type=int, default=None, help='Messages per SMTP session')
+        parser.add_argument('--backend', default=LOCMEM, help='Email backend import path')
+        parser.add_argument('--to', default='throughput@example.com', help='Recipient address')
+
+    def connection(self, backend):
+        if backend == CONSOLE:
+            return get_connection(backend, stream=open(os.devnull, 'w'))
+        return get_connection(backend)
+
+    def messages(self, count, to):
+        for i in range(count):
+            email = EmailMultiAlternatives(
+                subject=f'Throughput test {i}',
+                body='Plain text body ' * 20,
+                to=[to]
+            )
+            email.attach_alternative('<p>HTML body</p>' * 20, 'text/html')
+            yield email
+
+    def handle(self, *args, **opts):
+        count, backend = opts['count'], opts['backend']
+
+        started = time.perf_counter()
+        for email in self.messages(count, opts['to']):
+            email.connection = self.connection(backend)
+            email.send()
+        unpooled = time.perf_counter() - started
+
+        with PooledMailer(batch_size=opts['batch_size'], connection=self.connection(backend)) as mailer:
+            mailer.send_batch(list(self.messages(count, opts['to'])))
+        pooled = mailer.stats()
+
+        w = self.stdout.write
+        w(f'Backend      : {backend}')
+        w(f'Per-message  : {count} emails in {unpooled:.3f}s  → {count / unpooled:.0f} msg/s')
+        w(f"Pooled       : {pooled['sent']} emails in {pooled['seconds']}s  → {pooled['per_second']} msg/s"
+          f"  ({pooled['sessions']} sessions of ≤{pooled['batch_size']}, "
+          f"{pooled['retries']} retries, {pooled['failed']} failed)")
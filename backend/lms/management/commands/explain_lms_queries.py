@@ -0,0 +1,44 @@
+"""
+python manage.py explain_lms_queries [--plans]
+
+Checks that the LMS hot queries are served by the indexes added in
+migration 0005. Each check runs the real dashboard / task code, captures the
+SQL it sends, EXPLAINs every statement and fails unless one of the expected
+indexes shows up in a plan (see lms/query_plans.py; lms.tests runs the same
+checks). Exits with an error if a declared index is missing from the
+database or a check fails.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from lms.query_plans import hot_queries, indexes_used, missing_indexes
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the LMS dashboard and task queries and check they use their indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plans', action='store_true', help='Print every query plan')
+
+    def handle(self, *args, **opts):
+        missing = missing_indexes()
+        for model, index in missing:
+            self.stdout.write(self.style.ERROR(f'missing {index.name} on {model._meta.db_table}'))
+        if missing:
+            raise CommandError(f'{len(missing)} declared index(es) missing; run manage.py migrate lms')
+
+        failures = 0
+        for label, run, expected in hot_queries(timezone.now().date()):
+            used, plans = indexes_used(run, expected)
+            if used:
+                self.stdout.write(self.style.SUCCESS(f'ok    {label}: {used[0]}'))
+            else:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'FAIL  {label}: none of {", ".join(expected)} used'))
+            if opts['plans'] or not used:
+                for plan in plans:
+                    self.stdout.write(plan + '\n')
+
+        if failures:
+            raise CommandError(f'{failures} hot query check(s) not using their index')
@@ -0,0 +1,37 @@
+"""
+python manage.py reconcile_referral_counters [--dry-run] [--retier]
+
+Re-counts ReferralTracking per referrer with one grouped query and corrects
+any Student whose referrals_total / referrals_paid / referrals_pending have
+drifted (referrals deleted, or status changed by QuerySet.update(),
+bulk_update() or raw SQL). --retier also re-applies the fee tier for the
+corrected students.
+"""
+
+from django.core.management.base import BaseCommand
+
+from lms.models import ReferralTracking, Student
+from lms.referral_counters import COUNTERS, reconcile_referral_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized referral counters on Student and fix drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+        parser.add_argument('--retier', action='store_true', help='Re-apply the fee tier for corrected students')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **opts):
+        drifted = reconcile_referral_counters(
+            Student, ReferralTracking,
+            batch_size=opts['batch_size'], dry_run=opts['dry_run'], retier=opts['retier']
+        )
+        for student_id, stored, counts in drifted:
+            self.stdout.write(
+                f'student {student_id}: '
+                + ', '.join(f'{field} {stored[field]} -> {counts[field]}' for field in COUNTERS)
+            )
+
+        verb = 'would fix' if opts['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} student(s) drifted, {verb} {len(drifted)}'))
@@ -0,0 +1,291 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Course',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('category', models.CharField(max_length=50)),
+                ('level', models.CharField(choices=[('beginner', 'Beginner'), ('intermediate', 'Intermediate'), ('advanced', 'Advanced')], default='beginner', max_length=20)),
+                ('youtube_playlist_id', models.CharField(blank=True, max_length=100)),
+                ('course_fee', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('is_paid', models.BooleanField(default=False)),
+                ('syllabus_pdf', models.FileField(blank=True, null=True, upload_to='lms/syllabus/')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'lms_courses',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClassSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('youtube_video_id', models.CharField(blank=True, max_length=20)),
+                ('is_live', models.BooleanField(default=False)),
+                ('recording_available', models.BooleanField(default=False)),
+                ('reminder_sent_24h', models.BooleanField(default=False)),
+                ('reminder_sent_1h', models.BooleanField(default=False)),
+                ('feedback_form_sent', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessions', to='lms.course')),
+            ],
+            options={
+                'db_table': 'lms_class_sessions',
+                'ordering': ['-date', '-start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Quiz',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('time_limit_minutes', models.IntegerField(default=10)),
+                ('total_marks', models.IntegerField(default=10)),
+                ('passing_marks', models.IntegerField(default=5)),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_published', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('class_session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='quiz', to='lms.classsession')),
+            ],
+            options={
+                'db_table': 'lms_quizzes',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='QuizQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_text', models.TextField()),
+                ('question_type', models.CharField(choices=[('mcq', 'Multiple Choice'), ('true_false', 'True/False'), ('short_answer', 'Short Answer')], default='mcq', max_length=20)),
+                ('option_a', models.CharField(blank=True, max_length=255)),
+                ('option_b', models.CharField(blank=True, max_length=255)),
+                ('option_c', models.CharField(blank=True, max_length=255)),
+                ('option_d', models.CharField(blank=True, max_length=255)),
+                ('correct_answer', models.CharField(max_length=255)),
+                ('marks', models.IntegerField(default=1)),
+                ('order', models.IntegerField(default=0)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='questions', to='lms.quiz')),
+            ],
+            options={
+                'db_table': 'lms_quiz_questions',
+                'ordering': ['order'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Student',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=15)),
+                ('whatsapp', models.CharField(blank=True, max_length=15)),
+                ('address', models.TextField()),
+                ('date_of_birth', models.DateField()),
+                ('grade', models.CharField(choices=[('7', '7th Grade'), ('8', '8th Grade'), ('9', '9th Grade'), ('10', '10th Grade')], max_length=2)),
+                ('base_monthly_fee', models.DecimalField(decimal_places=2, default=1000.0, max_digits=10)),
+                ('current_monthly_fee', models.DecimalField(decimal_places=2, default=1000.0, max_digits=10)),
+                ('total_referral_discount', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('total_earnings', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('enrollment_date', models.DateField(auto_now_add=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('referral_code', models.CharField(max_length=10, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('referred_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='referrals', to='lms.student')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='lms_student', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'lms_students',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReferralTracking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending Payment'), ('paid', 'Paid - Active'), ('inactive', 'Inactive')], default='pending', max_length=20)),
+                ('concession_amount', models.DecimalField(decimal_places=2, default=200.0, max_digits=10)),
+                ('applied_to_month', models.DateField(blank=True, null=True)),
+                ('referred_date', models.DateField(auto_now_add=True)),
+                ('payment_received_date', models.DateField(blank=True, null=True)),
+                ('concession_notification_sent', models.BooleanField(default=False)),
+                ('referred_student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='referral_record', to='lms.student')),
+                ('referrer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referrals_made', to='lms.student')),
+            ],
+            options={
+                'db_table': 'lms_referral_tracking',
+                'ordering': ['-referred_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_type', models.CharField(choices=[('monthly_fee', 'Monthly Fee'), ('course_fee', 'Course Fee'), ('referral_bonus', 'Referral Bonus')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed'), ('refunded', 'Refunded')], default='pending', max_length=20)),
+                ('utr_number', models.CharField(blank=True, max_length=50, verbose_name='UTR/Transaction Number')),
+                ('payment_method', models.CharField(default='phonepe_upi', max_length=20)),
+                ('payment_screenshot', models.ImageField(blank=True, null=True, upload_to='lms/payment_screenshots/')),
+                ('for_month', models.DateField(help_text='The month this payment is for')),
+                ('payment_date', models.DateTimeField(auto_now_add=True)),
+                ('due_date', models.DateField()),
+                ('receipt_number', models.CharField(blank=True, max_length=20, unique=True)),
+                ('receipt_sent', models.BooleanField(default=False)),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True)),
+                ('verified_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='verified_payments', to=settings.AUTH_USER_MODEL)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='lms.student')),
+            ],
+            options={
+                'db_table': 'lms_payments',
+                'ordering': ['-payment_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EmailVerification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True)),
+                ('is_verified', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='email_verification', to='lms.student')),
+            ],
+            options={
+                'db_table': 'lms_email_verifications',
+            },
+        ),
+        migrations.CreateModel(
+            name='EmailLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email_type', models.CharField(choices=[('welcome', 'Welcome Email'), ('payment_reminder', 'Payment Reminder'), ('payment_receipt', 'Payment Receipt'), ('class_reminder_24h', 'Class Reminder - 24h Before'), ('class_reminder_1h', 'Class Reminder - 1h Before'), ('feedback_form', 'Feedback Form'), ('absence_alert', 'Absence Alert'), ('referral_concession', 'Referral Concession'), ('earnings_notification', 'Earnings Notification'), ('test_result', 'Test Result')], max_length=30)),
+                ('subject', models.CharField(max_length=200)),
+                ('content', models.TextField(blank=True)),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+                ('status', models.CharField(choices=[('sent', 'Sent'), ('failed', 'Failed')], max_length=10)),
+                ('error_message', models.TextField(blank=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_logs', to='lms.student')),
+            ],
+            options={
+                'db_table': 'lms_email_logs',
+                'ordering': ['-sent_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Test',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('test_type', models.CharField(choices=[('weekly', 'Weekly Test'), ('monthly', 'Monthly Test'), ('final', 'Final Exam'), ('quiz', 'Quiz')], max_length=20)),
+                ('total_marks', models.IntegerField(default=100)),
+                ('date', models.DateField()),
+                ('syllabus', models.TextField(blank=True)),
+                ('is_published', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tests', to='lms.course')),
+            ],
+            options={
+                'db_table': 'lms_tests',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='QuizAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answers', models.JSONField(default=dict)),
+                ('score', models.IntegerField(default=0)),
+                ('percentage', models.DecimalField(decimal_places=2, default=0.0, max_digits=5)),
+                ('is_passed', models.BooleanField(default=False)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('time_taken_seconds', models.IntegerField(default=0)),
+                ('result_email_sent', models.BooleanField(default=False)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='lms.quiz')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempts', to='lms.student')),
+            ],
+            options={
+                'db_table': 'lms_quiz_attempts',
+                'ordering': ['-submitted_at'],
+                'unique_together': {('quiz', 'student')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Attendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('present', 'Present'), ('absent', 'Absent'), ('leave', 'Leave')], max_length=10)),
+                ('marked_at', models.DateTimeField(auto_now_add=True)),
+                ('notes', models.TextField(blank=True)),
+                ('marked_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('class_session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendances', to='lms.classsession')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_records', to='lms.student')),
+            ],
+            options={
+                'db_table': 'lms_attendance',
+                'ordering': ['-date'],
+                'unique_together': {('student', 'date', 'class_session')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentEnrollment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enrolled_at', models.DateTimeField(auto_now_add=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('completed_sessions', models.ManyToManyField(blank=True, to='lms.classsession')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrolled_students', to='lms.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='lms.student')),
+            ],
+            options={
+                'db_table': 'lms_student_enrollments',
+                'unique_together': {('student', 'course')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TestResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('marks_obtained', models.IntegerField()),
+                ('rank', models.IntegerField(blank=True, null=True)),
+                ('remarks', models.TextField(blank=True)),
+                ('percentage', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='test_results', to='lms.student')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='lms.test')),
+            ],
+            options={
+                'db_table': 'lms_test_results',
+                'ordering': ['-marks_obtained'],
+                'unique_together': {('test', 'student')},
+            },
+        ),
+    ]
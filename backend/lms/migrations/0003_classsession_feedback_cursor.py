@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0002_emaillog_template_context'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classsession',
+            name='feedback_cursor',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
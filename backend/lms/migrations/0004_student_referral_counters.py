@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:55
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_referral_counters(apps, schema_editor):
+    # Historical models only: the new columns start at 0, so only referrers need a write
+    Student = apps.get_model('lms', 'Student')
+    ReferralTracking = apps.get_model('lms', 'ReferralTracking')
+    rows = ReferralTracking.objects.values('referrer_id').annotate(
+        referrals_total=Count('id'),
+        referrals_paid=Count('id', filter=Q(status='paid')),
+        referrals_pending=Count('id', filter=Q(status='pending')),
+    ).order_by()
+    Student.objects.bulk_update(
+        [
+            Student(
+                id=row['referrer_id'],
+                referrals_total=row['referrals_total'],
+                referrals_paid=row['referrals_paid'],
+                referrals_pending=row['referrals_pending'],
+            )
+            for row in rows
+        ],
+        ['referrals_total', 'referrals_paid', 'referrals_pending'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0003_classsession_feedback_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='referrals_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='referrals_paid',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='referrals_pending',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_referral_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:10
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL, so building the index does not
+    block writes to the live table; a plain AddIndex on other databases.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('lms', '0004_student_referral_counters'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='classsession',
+            index=models.Index(fields=['date', 'start_time'], name='lms_session_date_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='classsession',
+            index=models.Index(condition=models.Q(('reminder_sent_24h', False)), fields=['date'], name='lms_session_remind24_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='classsession',
+            index=models.Index(condition=models.Q(('reminder_sent_1h', False)), fields=['date', 'start_time'], name='lms_session_remind1_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='classsession',
+            index=models.Index(condition=models.Q(('feedback_form_sent', False)), fields=['date', 'id'], name='lms_session_feedback_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'status'], name='lms_att_date_status_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='payment',
+            index=models.Index(fields=['status', 'for_month'], name='lms_pay_status_month_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['for_month'], name='lms_pay_pending_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='emaillog',
+            index=models.Index(fields=['student', 'email_type', 'sent_at'], name='lms_email_student_type_idx'),
+        ),
+    ]
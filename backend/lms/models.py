@@ -3,10 +3,13 @@ LMS App for SeekhoWithRua Coaching Institute
 Handles students, courses, payments, attendance, tests, and referrals
 """
 
-from django.db import models
-from django.contrib.auth.models import User
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
 from django.utils import timezone
 import uuid
+from decimal import Decimal
 
 
 class Student(models.Model):
@@ -19,7 +22,7 @@ class Student(models.Model):
         ('10', '10th Grade'),
     ]
     
-    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='lms_student')
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='lms_student')
     
     # Personal Info
     phone = models.CharField(max_length=15)
@@ -44,6 +47,12 @@ class Student(models.Model):
     referred_by = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='referrals')
     referral_code = models.CharField(max_length=10, unique=True)
     
+    # Referral counters, kept in step with ReferralTracking
+    # (reconcile with `manage.py reconcile_referral_counters`)
+    referrals_total = models.PositiveIntegerField(default=0)
+    referrals_paid = models.PositiveIntegerField(default=0)
+    referrals_pending = models.PositiveIntegerField(default=0)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -71,11 +80,13 @@ class Student(models.Model):
         5 referrals = ₹1000 concession (FREE)
         10+ referrals = Start earning ₹200-500 per referral
         """
-        active_referrals = ReferralTracking.objects.filter(
-            referrer=self,
-            status='paid'
-        ).count()
-        
+        self.refresh_from_db(fields=['referrals_total', 'referrals_paid', 'referrals_pending'])
+        self.apply_referral_tier(self.referrals_paid)
+        self.save()
+        return self.current_monthly_fee
+    
+    def apply_referral_tier(self, active_referrals):
+        """Set fee / discount / earnings for this many paid referrals (does not save)"""
         if active_referrals >= 10:
             # Student earns money
             self.current_monthly_fee = 0
@@ -91,9 +102,21 @@ class Student(models.Model):
             self.current_monthly_fee = max(0, 1000 - (active_referrals * 200))
             self.total_referral_discount = active_referrals * 200
             self.total_earnings = 0
-        
-        self.save()
-        return self.current_monthly_fee
+    
+    def referral_stats(self):
+        """Referral counters and next milestone, read from this row alone"""
+        active = self.referrals_paid
+        next_milestone = 5 if active < 5 else (10 if active < 10 else active + 5)
+        return {
+            'total_referrals': self.referrals_total,
+            'active_referrals': active,
+            'pending_referrals': self.referrals_pending,
+            'current_fee': self.current_monthly_fee,
+            'total_discount': self.total_referral_discount,
+            'total_earnings': self.total_earnings,
+            'next_milestone': next_milestone,
+            'referrals_to_next_milestone': next_milestone - active,
+        }
 
 
 class Course(models.Model):
@@ -158,6 +181,7 @@ class ClassSession(models.Model):
     reminder_sent_24h = models.BooleanField(default=False)
     reminder_sent_1h = models.BooleanField(default=False)
     feedback_form_sent = models.BooleanField(default=False)
+    feedback_cursor = models.PositiveIntegerField(default=0)  # Last StudentEnrollment id sent this session's feedback form
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -165,6 +189,14 @@ class ClassSession(models.Model):
     class Meta:
         db_table = 'lms_class_sessions'
         ordering = ['-date', '-start_time']
+        indexes = [
+            # Dashboard month counts, upcoming classes
+            models.Index(fields=['date', 'start_time'], name='lms_session_date_idx'),
+            # Reminder / feedback runs only ever look at sessions not yet handled
+            models.Index(fields=['date'], condition=Q(reminder_sent_24h=False), name='lms_session_remind24_idx'),
+            models.Index(fields=['date', 'start_time'], condition=Q(reminder_sent_1h=False), name='lms_session_remind1_idx'),
+            models.Index(fields=['date', 'id'], condition=Q(feedback_form_sent=False), name='lms_session_feedback_idx'),
+        ]
     
     def __str__(self):
         return f"{self.course.title} - {self.title} ({self.date})"
@@ -185,7 +217,7 @@ class Attendance(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES)
     
     # Marked by
-    marked_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    marked_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     marked_at = models.DateTimeField(auto_now_add=True)
     
     # Notes
@@ -195,6 +227,11 @@ class Attendance(models.Model):
         db_table = 'lms_attendance'
         unique_together = ['student', 'date', 'class_session']
         ordering = ['-date']
+        indexes = [
+            # Month summaries and the absence-streak window; (student, date)
+            # lookups already use the unique_together index
+            models.Index(fields=['date', 'status'], name='lms_att_date_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.user.get_full_name()} - {self.date} - {self.status}"
@@ -255,9 +292,16 @@ class TestResult(models.Model):
     def __str__(self):
         return f"{self.student.user.get_full_name()} - {self.test.title}: {self.marks_obtained}"
     
+    @staticmethod
+    def percentage_for(marks, total_marks):
+        """marks as a percentage of total_marks, to 2 places (None when total_marks is 0)"""
+        if total_marks <= 0:
+            return None
+        return (Decimal(marks * 100) / total_marks).quantize(Decimal('0.01'))
+    
     def save(self, *args, **kwargs):
         if self.test.total_marks > 0:
-            self.percentage = (self.marks_obtained / self.test.total_marks) * 100
+            self.percentage = self.percentage_for(self.marks_obtained, self.test.total_marks)
         super().save(*args, **kwargs)
 
 
@@ -299,13 +343,19 @@ class Payment(models.Model):
     receipt_sent = models.BooleanField(default=False)
     
     # Admin verification
-    verified_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='verified_payments')
+    verified_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='verified_payments')
     verified_at = models.DateTimeField(null=True, blank=True)
     notes = models.TextField(blank=True)
     
     class Meta:
         db_table = 'lms_payments'
         ordering = ['-payment_date']
+        indexes = [
+            # Revenue / finance reports (status='completed', for_month range)
+            models.Index(fields=['status', 'for_month'], name='lms_pay_status_month_idx'),
+            # Pending payments are a small slice: reminders and the pending count
+            models.Index(fields=['for_month'], condition=Q(status='pending'), name='lms_pay_pending_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.user.get_full_name()} - ₹{self.amount} - {self.status}"
@@ -333,7 +383,14 @@ class Payment(models.Model):
 
 
 class ReferralTracking(models.Model):
-    """Track referrals and concessions"""
+    """
+    Track referrals and concessions
+
+    The referrer's referrals_* counters move with save() (new rows and status
+    edits on loaded rows) and change_status(). QuerySet.update(),
+    bulk_update() and deletes bypass them; verify_payments() moves the
+    counters itself, anything else is repaired by reconcile_referral_counters.
+    """
     
     STATUS_CHOICES = [
         ('pending', 'Pending Payment'),
@@ -357,6 +414,12 @@ class ReferralTracking(models.Model):
     # Notification
     concession_notification_sent = models.BooleanField(default=False)
     
+    # Student counter kept per status (inactive referrals only count towards the total)
+    COUNTER_FIELDS = {
+        'paid': 'referrals_paid',
+        'pending': 'referrals_pending',
+    }
+    
     class Meta:
         db_table = 'lms_referral_tracking'
         ordering = ['-referred_date']
@@ -364,12 +427,64 @@ class ReferralTracking(models.Model):
     def __str__(self):
         return f"{self.referrer.user.get_full_name()} referred {self.referred_student.user.get_full_name()}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_status = instance.__dict__.get('status')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        previous = getattr(self, '_saved_status', None)
+        update_fields = kwargs.get('update_fields')
+        status_written = update_fields is None or 'status' in update_fields
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                counters = {'referrals_total': F('referrals_total') + 1}
+                field = self.COUNTER_FIELDS.get(self.status)
+                if field:
+                    counters[field] = F(field) + 1
+                Student.objects.filter(id=self.referrer_id).update(**counters)
+            elif status_written and previous and previous != self.status:
+                self._move_counters(previous, self.status)
+        if status_written:
+            self._saved_status = self.status
+    
+    def _move_counters(self, old_status, new_status):
+        counters = {}
+        old_field = self.COUNTER_FIELDS.get(old_status)
+        new_field = self.COUNTER_FIELDS.get(new_status)
+        if old_field:
+            # Greatest() keeps a drifted counter from going negative (CHECK >= 0)
+            counters[old_field] = Greatest(F(old_field) - 1, 0)
+        if new_field:
+            counters[new_field] = F(new_field) + 1
+        if counters:
+            Student.objects.filter(id=self.referrer_id).update(**counters)
+    
+    def change_status(self, status, **fields):
+        """
+        Move this referral from its current status to status, plus any extra
+        fields, and the referrer's counters with it. The UPDATE is conditional
+        on the current status, so of two concurrent changes only one counts;
+        returns False for the loser.
+        """
+        with transaction.atomic():
+            changed = ReferralTracking.objects.filter(id=self.id, status=self.status).update(status=status, **fields)
+            if not changed:
+                return False
+            self._move_counters(self.status, status)
+        for field, value in fields.items():
+            setattr(self, field, value)
+        self.status = self._saved_status = status
+        return True
+    
     def mark_as_paid(self):
         """When referred student pays, activate referral and apply concession"""
         if self.status == 'pending':
-            self.status = 'paid'
-            self.payment_received_date = timezone.now().date()
-            self.save()
+            if not self.change_status('paid', payment_received_date=timezone.now().date()):
+                return
             
             # Recalculate referrer's fee
             self.referrer.calculate_referral_concession()
@@ -406,7 +521,12 @@ class EmailLog(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='email_logs')
     email_type = models.CharField(max_length=30, choices=EMAIL_TYPES)
     subject = models.CharField(max_length=200)
-    content = models.TextField(blank=True)
+    content = models.TextField(blank=True)  # Only on older rows; newer ones re-render from template + context
+    
+    # Template the email was rendered from (lms/emails/<template_name>.html)
+    template_name = models.CharField(max_length=50, blank=True)
+    context = models.JSONField(default=dict, blank=True)
+    context_hash = models.CharField(max_length=64, blank=True)
     
     sent_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=10, choices=[('sent', 'Sent'), ('failed', 'Failed')])
@@ -415,9 +535,21 @@ class EmailLog(models.Model):
     class Meta:
         db_table = 'lms_email_logs'
         ordering = ['-sent_at']
+        indexes = [
+            # "Was this student already sent X since ..." (absence alerts)
+            models.Index(fields=['student', 'email_type', 'sent_at'], name='lms_email_student_type_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.user.get_full_name()} - {self.email_type} - {self.status}"
+    
+    def render_content(self):
+        """HTML body as sent — stored content for older rows, re-rendered for newer ones"""
+        if self.content or not self.template_name:
+            return self.content
+        from .email_log import restore_context
+        from .email_templates import render_email
+        return render_email(self.template_name, restore_context(self.context))[0]
 
 
 class StudentEnrollment(models.Model):
@@ -529,18 +661,11 @@ class QuizAttempt(models.Model):
         return f"{self.student.user.get_full_name()} - {self.quiz.title}: {self.score}/{self.quiz.total_marks}"
     
     def calculate_score(self):
-        """Calculate score based on answers"""
-        total = 0
-        for question in self.quiz.questions.all():
-            student_answer = self.answers.get(str(question.id), '')
-            if student_answer.lower().strip() == question.correct_answer.lower().strip():
-                total += question.marks
+        """Calculate score based on answers (against the cached answer key, see grading.py)"""
+        from .grading import GRADED_FIELDS, grade_attempt
         
-        self.score = total
-        if self.quiz.total_marks > 0:
-            self.percentage = (total / self.quiz.total_marks) * 100
-        self.is_passed = self.score >= self.quiz.passing_marks
-        self.save()
+        grade_attempt(self)
+        self.save(update_fields=GRADED_FIELDS)
         return self.score
 
 
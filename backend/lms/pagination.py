@@ -0,0 +1,70 @@
+"""
+List endpoint paging and field selection
+
+KeysetPagination is DRF's cursor pagination ordered on the primary key, so
+every page is `WHERE id < <cursor> ORDER BY id DESC LIMIT n` against the pk
+index — the same cost on page 1 as on page 500, and stable while rows are
+being added. ?page_size= picks the size up to MAX_PAGE_SIZE.
+
+SparseFieldsMixin lets a list/retrieve caller trim the payload with
+?fields=id,status,amount; the serializer (SparseFieldsSerializerMixin in
+serializers.py) drops every other field and rejects unknown names.
+
+keyset_iterator() is the same idea for background reads: it walks a
+queryset in batches of `WHERE key > <last> ORDER BY key LIMIT n`, one plain
+query each. Unlike QuerySet.iterator() it needs no server-side cursor, which
+the transaction pooler (Supabase, port 6543) cannot keep open between
+statements.
+"""
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+
+PAGE_SIZE = getattr(settings, 'LMS_PAGE_SIZE', 100)
+MAX_PAGE_SIZE = getattr(settings, 'LMS_MAX_PAGE_SIZE', 500)
+
+
+class KeysetPagination(CursorPagination):
+    page_size = PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+    ordering = '-id'
+
+
+class SparseFieldsMixin:
+    """Viewset mixin: passes ?fields= to the serializer as context['fields']"""
+    fields_query_param = 'fields'
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fields = self.request.query_params.get(self.fields_query_param) if self.request else None
+        if fields and self.action in ['list', 'retrieve']:
+            context['fields'] = [name.strip() for name in fields.split(',') if name.strip()]
+        return context
+
+
+def after(keys, values):
+    """Q for rows ordered after `values` on `keys`: (k1 > v1) OR (k1 = v1 AND k2 > v2) ..."""
+    condition, equal = Q(), {}
+    for key, value in zip(keys, values):
+        condition |= Q(**equal, **{f'{key}__gt': value})
+        equal[key] = value
+    return condition
+
+
+def keyset_iterator(queryset, keys, chunk_size, key_of=None):
+    """
+    Yield the rows of queryset ordered by `keys` (unique together), reading
+    chunk_size rows per query. key_of(row) gives a row's key values; by
+    default they are read as attributes of the row.
+    """
+    key_of = key_of or (lambda row: [getattr(row, key) for key in keys])
+    queryset = queryset.order_by(*keys)
+    batch = list(queryset[:chunk_size])
+    while batch:
+        yield from batch
+        if len(batch) < chunk_size:
+            return
+        batch = list(queryset.filter(after(keys, key_of(batch[-1])))[:chunk_size])
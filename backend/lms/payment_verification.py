@@ -0,0 +1,83 @@
+"""
+Bulk payment verification
+
+verify_payments() verifies N payments in one transaction with a fixed number
+of queries, however many payments or referrers are involved:
+
+  1. lock the payments (select_for_update) and bulk_update them to completed
+  2. flip the pending referrals of those students to paid in one UPDATE
+  3. move the referrers' paid/pending counters by the number of referrals
+     each just gained, apply the fee tier in memory and bulk_update them
+
+Receipts and concession emails go out afterwards in one Celery job.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Payment, ReferralTracking, Student
+
+
+def verify_payments(payment_ids, verified_by):
+    """Returns {'results': [{payment_id, outcome}], 'referrals_activated': [...], 'referrers_updated': n}"""
+    payment_ids = list(dict.fromkeys(payment_ids))
+    now = timezone.now()
+
+    with transaction.atomic():
+        payments = {
+            payment.id: payment
+            for payment in Payment.objects.select_for_update().filter(id__in=payment_ids)
+        }
+        to_verify = [p for p in payments.values() if p.status != 'completed']
+        for payment in to_verify:
+            payment.status = 'completed'
+            payment.verified_by = verified_by
+            payment.verified_at = now
+        Payment.objects.bulk_update(to_verify, ['status', 'verified_by', 'verified_at'])
+
+        # Referrals activated by these students' first verified payment
+        referrals = list(
+            ReferralTracking.objects.select_for_update().filter(
+                referred_student_id__in={p.student_id for p in to_verify},
+                status='pending'
+            ).values_list('id', 'referrer_id')
+        )
+        referral_ids = [referral_id for referral_id, _ in referrals]
+        ReferralTracking.objects.filter(id__in=referral_ids).update(
+            status='paid',
+            payment_received_date=now.date()
+        )
+
+        # Move each referrer's counters by what it just gained and re-tier it
+        activated = Counter(referrer_id for _, referrer_id in referrals)
+        referrers = list(Student.objects.select_for_update().filter(id__in=activated))
+        for referrer in referrers:
+            referrer.referrals_paid += activated[referrer.id]
+            referrer.referrals_pending = max(0, referrer.referrals_pending - activated[referrer.id])
+            referrer.apply_referral_tier(referrer.referrals_paid)
+            referrer.updated_at = now
+        Student.objects.bulk_update(
+            referrers,
+            ['referrals_paid', 'referrals_pending', 'current_monthly_fee',
+             'total_referral_discount', 'total_earnings', 'updated_at']
+        )
+
+    verified_ids = {p.id for p in to_verify}
+    results = []
+    for payment_id in payment_ids:
+        if payment_id in verified_ids:
+            outcome = 'verified'
+        elif payment_id in payments:
+            outcome = 'already_verified'
+        else:
+            outcome = 'not_found'
+        results.append({'payment_id': payment_id, 'outcome': outcome})
+
+    return {
+        'results': results,
+        'verified_ids': sorted(verified_ids),
+        'referrals_activated': referral_ids,
+        'referrers_updated': len(referrers),
+    }
@@ -0,0 +1,81 @@
+"""
+Index checks for the LMS hot queries
+
+hot_queries() lists the dashboard and Celery task queries that must stay on
+an index, each with the index names (from migration 0005) any one of which
+should show up in its plan. indexes_used() runs the real code, captures the
+SQL it sends and EXPLAINs every statement. On PostgreSQL sequential scans
+are disabled for the check, so a nearly empty table does not hide a missing
+index.
+
+Used by the explain_lms_queries command and by lms.tests.
+"""
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from .absence import find_absence_streaks
+from .dashboard import _month_bounds, attendance_section, course_section, payment_section
+from .email_service import pending_reminder_payments
+from .feedback_dispatch import pending_sessions
+from .reminders import due_sessions
+
+
+def hot_queries(today):
+    """(label, callable running the real query, index names any of which must be used)"""
+    month_start, month_end = _month_bounds(today)
+    return [
+        ('dashboard: payments', lambda: payment_section(month_start),
+         ['lms_pay_pending_idx', 'lms_pay_status_month_idx']),
+        ('dashboard: attendance', lambda: attendance_section(month_start, month_end),
+         ['lms_att_date_status_idx']),
+        ('dashboard: sessions this month', lambda: course_section(month_start, month_end),
+         ['lms_session_date_idx', 'lms_session_remind24_idx', 'lms_session_remind1_idx']),
+        ('task: payment reminders', lambda: list(pending_reminder_payments().values_list('id', flat=True)),
+         ['lms_pay_pending_idx', 'lms_pay_status_month_idx']),
+        ('task: 24h class reminders', lambda: list(due_sessions(24).values_list('id', flat=True)),
+         ['lms_session_remind24_idx', 'lms_session_date_idx']),
+        ('task: 1h class reminders', lambda: list(due_sessions(1).values_list('id', flat=True)),
+         ['lms_session_remind1_idx', 'lms_session_date_idx']),
+        ('task: feedback walk', lambda: pending_sessions(today).order_by('date', 'id').first(),
+         ['lms_session_feedback_idx']),
+        ('task: absence streaks', lambda: find_absence_streaks(today=today),
+         ['lms_att_date_status_idx']),
+        ('task: absence alert dedupe', lambda: find_absence_streaks(today=today),
+         ['lms_email_student_type_idx']),
+    ]
+
+
+def missing_indexes():
+    """[(model, index)] declared in Meta.indexes but absent from the database"""
+    missing = []
+    with connection.cursor() as cursor:
+        for model in apps.get_app_config('lms').get_models():
+            existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            missing += [(model, index) for index in model._meta.indexes if index.name not in existing]
+    return missing
+
+
+def explain(sql):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql)
+        return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+
+def query_plans(run):
+    """EXPLAIN output for every statement run() sends"""
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        with CaptureQueriesContext(connection) as captured:
+            run()
+        return [explain(query['sql']) for query in captured.captured_queries]
+
+
+def indexes_used(run, expected):
+    """(names from `expected` that appear in run()'s plans, the plans)"""
+    plans = query_plans(run)
+    return [name for name in expected if any(name in plan for plan in plans)], plans
@@ -0,0 +1,57 @@
+"""
+Test ranking
+
+Ranks for one test are written by a single UPDATE ... FROM over a
+Window(Rank()) / Window(DenseRank()) subquery, so re-ranking costs one round
+trip however many students sat the test.
+
+Tie policies:
+    competition  1, 2, 2, 4   (default)
+    dense        1, 2, 2, 3
+"""
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Window
+from django.db.models.functions import CumeDist, DenseRank, Rank
+
+from .models import TestResult
+
+
+TIE_POLICIES = {
+    'competition': Rank,
+    'dense': DenseRank,
+}
+
+DEFAULT_TIE_POLICY = getattr(settings, 'LMS_RANK_TIE_POLICY', 'competition')
+
+
+def rank_test_results(test, tie_policy=None):
+    """Recompute rank for every result of this test in one statement. Returns rows updated."""
+    rank_function = TIE_POLICIES[tie_policy or DEFAULT_TIE_POLICY]
+    ranked = TestResult.objects.filter(test=test).annotate(
+        new_rank=Window(rank_function(), order_by=F('marks_obtained').desc())
+    ).order_by().values('id', 'new_rank')
+    subquery, params = ranked.query.sql_with_params()
+
+    qn = connection.ops.quote_name
+    table = qn(TestResult._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET {qn("rank")} = ranked.new_rank '
+            f'FROM ({subquery}) AS ranked '
+            f'WHERE {table}.{qn("id")} = ranked.id',
+            params
+        )
+        return cursor.rowcount
+
+
+def with_percentile(queryset):
+    """Annotate percentile — share of the test's results at or below this score (0–100]"""
+    return queryset.annotate(
+        percentile=Window(
+            CumeDist(),
+            partition_by=F('test_id'),
+            order_by=F('marks_obtained').asc()
+        ) * 100
+    )
@@ -0,0 +1,65 @@
+"""
+Referral counter reconciliation
+
+Student.referrals_total / referrals_paid / referrals_pending are kept in
+step with ReferralTracking by F() updates as referrals are created and
+paid. reconcile_referral_counters() re-counts them with one grouped query
+and corrects every Student whose counters differ.
+
+The reconcile_referral_counters management command runs it to repair
+drift from writes that bypass ReferralTracking.save() / change_status():
+QuerySet.update() or bulk_update() of status, raw SQL, and deletes.
+"""
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+
+COUNTERS = ['referrals_total', 'referrals_paid', 'referrals_pending']
+TIER_FIELDS = ['current_monthly_fee', 'total_referral_discount', 'total_earnings']
+
+
+def actual_counts(referral_model):
+    """{referrer id: {counter: value}} from one grouped query"""
+    rows = referral_model.objects.values('referrer_id').annotate(
+        referrals_total=Count('id'),
+        referrals_paid=Count('id', filter=Q(status='paid')),
+        referrals_pending=Count('id', filter=Q(status='pending')),
+    ).order_by()
+    return {row.pop('referrer_id'): row for row in rows}
+
+
+def reconcile_referral_counters(student_model, referral_model, batch_size=500, dry_run=False, retier=False):
+    """
+    Correct drifted counters; returns [(student id, stored counters, actual counters)].
+    retier re-applies the fee tier too, so it needs the real Student model.
+    """
+    zero = dict.fromkeys(COUNTERS, 0)
+    drifted = []
+
+    with transaction.atomic():
+        actual = actual_counts(referral_model)
+        students = student_model.objects.select_for_update().only('id', *COUNTERS).filter(
+            Q(id__in=actual) | Q(referrals_total__gt=0) | Q(referrals_paid__gt=0) | Q(referrals_pending__gt=0)
+        )
+        for student in students.iterator(chunk_size=batch_size):
+            stored = {field: getattr(student, field) for field in COUNTERS}
+            counts = actual.get(student.id, zero)
+            if stored != counts:
+                drifted.append((student.id, stored, counts))
+
+        if drifted and not dry_run:
+            now = timezone.now()
+            fixed = student_model.objects.in_bulk([student_id for student_id, _, _ in drifted])
+            fields = COUNTERS + ['updated_at'] + (TIER_FIELDS if retier else [])
+            for student_id, _, counts in drifted:
+                student = fixed[student_id]
+                for field in COUNTERS:
+                    setattr(student, field, counts[field])
+                if retier:
+                    student.apply_referral_tier(student.referrals_paid)
+                student.updated_at = now
+            student_model.objects.bulk_update(fixed.values(), fields, batch_size=batch_size)
+
+    return drifted
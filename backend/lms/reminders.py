@@ -0,0 +1,96 @@
+"""
+Class reminder dispatch
+
+Each run claims the sessions it will remind about before sending anything:
+inside one transaction the due sessions are locked with
+select_for_update(skip_locked=True) and their reminder flag is flipped, so
+two Celery workers running at once split the sessions between them instead
+of both emailing the same class. All (session, student) pairs for the
+claimed sessions then come back from a joined StudentEnrollment query, read
+in keyset batches.
+
+Windows (session date/start_time are in TIME_ZONE):
+    24h  sessions on tomorrow's date
+    1h   sessions starting between now and the end of the next hour — a
+         datetime range, so a 23:00 run reaches 00:xx classes tomorrow
+
+Claiming first means a worker that dies mid-run does not resend; the
+unsent remainder of its claim is skipped rather than duplicated.
+"""
+
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ClassSession, StudentEnrollment
+from .pagination import keyset_iterator
+
+
+PAIR_CHUNK_SIZE = 1000
+
+REMINDER_FLAGS = {
+    24: 'reminder_sent_24h',
+    1: 'reminder_sent_1h',
+}
+
+
+def starting_between(start, end):
+    """Q for sessions whose date + start_time falls in [start, end) (naive local datetimes)"""
+    if start.date() == end.date():
+        return Q(date=start.date(), start_time__gte=start.time(), start_time__lt=end.time())
+    return (
+        Q(date=start.date(), start_time__gte=start.time())
+        | Q(date__gt=start.date(), date__lt=end.date())
+        | Q(date=end.date(), start_time__lt=end.time())
+    )
+
+
+def due_sessions(hours_before, now=None):
+    now = timezone.localtime(now or timezone.now()).replace(tzinfo=None)
+    if hours_before == 24:
+        due = Q(date=now.date() + timedelta(days=1))
+    else:
+        window_end = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=2)
+        due = starting_between(now, window_end)
+    return ClassSession.objects.filter(due, **{REMINDER_FLAGS[hours_before]: False})
+
+
+def claim_sessions(queryset, flag):
+    """Lock the sessions in queryset, set `flag` on them and return their ids"""
+    with transaction.atomic():
+        session_ids = list(
+            queryset
+            .select_for_update(skip_locked=True)
+            .order_by()
+            .values_list('id', flat=True)
+        )
+        if session_ids:
+            ClassSession.objects.filter(id__in=session_ids).update(**{flag: True})
+    return session_ids
+
+
+def claim_reminder_sessions(hours_before, now=None):
+    return claim_sessions(due_sessions(hours_before, now), REMINDER_FLAGS[hours_before])
+
+
+def session_enrollments(session_ids):
+    """Active enrollments of the given sessions' courses, one row per (session, enrollment)"""
+    return StudentEnrollment.objects.filter(
+        is_active=True,
+        course__sessions__id__in=session_ids
+    ).annotate(
+        session_id=F('course__sessions__id')
+    )
+
+
+def session_pairs(session_ids, enrollment_range=None):
+    """(session, student) for every active enrollee of the given sessions, PAIR_CHUNK_SIZE per query"""
+    enrollments = session_enrollments(session_ids).select_related('student__user', 'course')
+    if enrollment_range:
+        enrollments = enrollments.filter(id__range=enrollment_range)
+
+    sessions = ClassSession.objects.select_related('course').in_bulk(session_ids)
+    for enrollment in keyset_iterator(enrollments, ['id', 'session_id'], PAIR_CHUNK_SIZE):
+        yield sessions[enrollment.session_id], enrollment.student
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from django.contrib.auth.models import User
+from django.contrib.auth import get_user_model
 from .models import (
     Student, Course, ClassSession, Attendance,
     Test, TestResult, Payment, ReferralTracking,
@@ -8,13 +8,53 @@ from .models import (
 )
 
 
+User = get_user_model()
+
+
+def request_student(request):
+    """The requesting user's Student profile, or None (anonymous, staff without one)"""
+    if request is None or not request.user.is_authenticated:
+        return None
+    try:
+        return request.user.lms_student
+    except Student.DoesNotExist:
+        return None
+
+
+class RequestStudentMixin:
+    """
+    Method fields below prefer annotations and per-user id sets put in the
+    context by the viewsets; the per-object queries are only a fallback. The
+    requesting student is looked up once per serializer tree.
+    """
+    
+    def request_student(self):
+        if '_request_student' not in self.context:
+            self.context['_request_student'] = request_student(self.context.get('request'))
+        return self.context['_request_student']
+
+
+class SparseFieldsSerializerMixin:
+    """Keeps only the fields named in context['fields'] (set from ?fields= by the viewset)"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get('fields')
+        if requested:
+            unknown = set(requested) - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'first_name', 'last_name', 'email', 'username']
 
 
-class StudentSerializer(serializers.ModelSerializer):
+class StudentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     full_name = serializers.CharField(source='user.get_full_name', read_only=True)
     email = serializers.CharField(source='user.email', read_only=True)
@@ -25,9 +65,13 @@ class StudentSerializer(serializers.ModelSerializer):
             'id', 'user', 'full_name', 'email', 'phone', 'whatsapp', 'address',
             'date_of_birth', 'grade', 'base_monthly_fee', 'current_monthly_fee',
             'total_referral_discount', 'total_earnings', 'referral_code',
-            'referred_by', 'enrollment_date', 'is_active'
+            'referred_by', 'referrals_total', 'referrals_paid', 'referrals_pending',
+            'enrollment_date', 'is_active'
+        ]
+        read_only_fields = [
+            'referral_code', 'total_referral_discount', 'total_earnings',
+            'referrals_total', 'referrals_paid', 'referrals_pending'
         ]
-        read_only_fields = ['referral_code', 'total_referral_discount', 'total_earnings']
 
 
 class StudentCreateSerializer(serializers.ModelSerializer):
@@ -82,7 +126,7 @@ class StudentCreateSerializer(serializers.ModelSerializer):
         return student
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(RequestStudentMixin, serializers.ModelSerializer):
     enrolled_count = serializers.SerializerMethodField()
     is_enrolled = serializers.SerializerMethodField()
     
@@ -95,20 +139,27 @@ class CourseSerializer(serializers.ModelSerializer):
         ]
     
     def get_enrolled_count(self, obj):
+        # Annotated by the view when it lists many courses
+        annotated = getattr(obj, 'active_enrollment_count', None)
+        if annotated is not None:
+            return annotated
         return obj.enrolled_students.filter(is_active=True).count()
     
     def get_is_enrolled(self, obj):
-        request = self.context.get('request')
-        if request and hasattr(request.user, 'lms_student'):
+        enrolled_ids = self.context.get('enrolled_course_ids')
+        if enrolled_ids is not None:
+            return obj.id in enrolled_ids
+        student = self.request_student()
+        if student:
             return StudentEnrollment.objects.filter(
-                student=request.user.lms_student,
+                student=student,
                 course=obj,
                 is_active=True
             ).exists()
         return False
 
 
-class ClassSessionSerializer(serializers.ModelSerializer):
+class ClassSessionSerializer(RequestStudentMixin, serializers.ModelSerializer):
     course_title = serializers.CharField(source='course.title', read_only=True)
     is_attended = serializers.SerializerMethodField()
     youtube_embed_url = serializers.SerializerMethodField()
@@ -123,10 +174,13 @@ class ClassSessionSerializer(serializers.ModelSerializer):
         ]
     
     def get_is_attended(self, obj):
-        request = self.context.get('request')
-        if request and hasattr(request.user, 'lms_student'):
+        attended_ids = self.context.get('attended_session_ids')
+        if attended_ids is not None:
+            return obj.id in attended_ids
+        student = self.request_student()
+        if student:
             return Attendance.objects.filter(
-                student=request.user.lms_student,
+                student=student,
                 class_session=obj,
                 status='present'
             ).exists()
@@ -138,7 +192,7 @@ class ClassSessionSerializer(serializers.ModelSerializer):
         return None
 
 
-class AttendanceSerializer(serializers.ModelSerializer):
+class AttendanceSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.user.get_full_name', read_only=True)
     session_title = serializers.CharField(source='class_session.title', read_only=True)
     
@@ -163,6 +217,9 @@ class TestSerializer(serializers.ModelSerializer):
         ]
     
     def get_results_count(self, obj):
+        annotated = getattr(obj, 'result_count', None)
+        if annotated is not None:
+            return annotated
         return obj.results.count()
 
 
@@ -178,7 +235,7 @@ class TestResultSerializer(serializers.ModelSerializer):
         ]
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.user.get_full_name', read_only=True)
     
     class Meta:
@@ -236,14 +293,15 @@ class ReferralStatsSerializer(serializers.Serializer):
     referrals_to_next_milestone = serializers.IntegerField()
 
 
-class EmailLogSerializer(serializers.ModelSerializer):
+class EmailLogSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.user.get_full_name', read_only=True)
     
     class Meta:
         model = EmailLog
         fields = [
             'id', 'student', 'student_name', 'email_type',
-            'subject', 'status', 'sent_at', 'error_message'
+            'subject', 'status', 'sent_at', 'error_message',
+            'template_name', 'context_hash'
         ]
 
 
@@ -260,10 +318,14 @@ class StudentEnrollmentSerializer(serializers.ModelSerializer):
         ]
     
     def get_progress_percentage(self, obj):
-        total_sessions = obj.course.sessions.count()
+        total_sessions = getattr(obj, 'course_session_count', None)
+        if total_sessions is None:
+            total_sessions = obj.course.sessions.count()
         if total_sessions == 0:
             return 0
-        completed = obj.completed_sessions.count()
+        completed = getattr(obj, 'completed_session_count', None)
+        if completed is None:
+            completed = obj.completed_sessions.count()
         return round((completed / total_sessions) * 100)
 
 
@@ -289,6 +351,7 @@ class AdminDashboardSerializer(serializers.Serializer):
     recent_enrollments = StudentSerializer(many=True)
     recent_payments = PaymentSerializer(many=True)
     attendance_summary = serializers.DictField()
+    computed_at = serializers.DateTimeField()
 
 
 class QuizQuestionSerializer(serializers.ModelSerializer):
@@ -316,7 +379,7 @@ class QuizQuestionAdminSerializer(serializers.ModelSerializer):
         ]
 
 
-class QuizSerializer(serializers.ModelSerializer):
+class QuizSerializer(RequestStudentMixin, serializers.ModelSerializer):
     """Quiz serializer with questions"""
     questions = QuizQuestionSerializer(many=True, read_only=True)
     session_title = serializers.CharField(source='class_session.title', read_only=True)
@@ -331,11 +394,14 @@ class QuizSerializer(serializers.ModelSerializer):
         ]
     
     def get_has_attempted(self, obj):
-        request = self.context.get('request')
-        if request and hasattr(request.user, 'lms_student'):
+        attempted_ids = self.context.get('attempted_quiz_ids')
+        if attempted_ids is not None:
+            return obj.id in attempted_ids
+        student = self.request_student()
+        if student:
             return QuizAttempt.objects.filter(
                 quiz=obj,
-                student=request.user.lms_student
+                student=student
             ).exists()
         return False
 
@@ -357,6 +423,9 @@ class QuizAttemptSerializer(serializers.ModelSerializer):
         read_only_fields = ['score', 'percentage', 'is_passed', 'started_at']
     
     def get_total_questions(self, obj):
+        annotated = getattr(obj, 'question_count', None)
+        if annotated is not None:
+            return annotated
         return obj.quiz.questions.count()
 
 
@@ -1,39 +1,161 @@
 """
 Celery tasks for LMS email automation
+
+Payment reminders, class reminders and absence alerts are coordinators: each
+finds (and, for sessions, claims) the rows to email, splits them into id
+ranges of LMS_TASK_CHUNK_SIZE and fans the ranges out as a chord of chunk
+subtasks; summarize_job totals their counts. Feedback forms go through the
+resumable dispatcher in feedback_dispatch.py instead.
 """
 
-from celery import shared_task
-from .email_service import (
-    send_payment_reminders_to_all,
-    send_class_reminders,
-    check_continuous_absence,
-    send_feedback_form_requests,
-)
+from celery import chord, shared_task
+from django.conf import settings
+from django.core.cache import cache
+
+from . import email_service
+
+
+# Rows (payments, enrollments, students) per subtask
+CHUNK_SIZE = getattr(settings, 'LMS_TASK_CHUNK_SIZE', 500)
+
+# Pause between capped feedback-form runs while a backlog drains
+FEEDBACK_RESUME_SECONDS = getattr(settings, 'LMS_FEEDBACK_RESUME_SECONDS', 600)
+
+
+def id_ranges(ids, chunk_size=None):
+    """Split ids into contiguous (first_id, last_id) ranges of at most chunk_size ids"""
+    chunk_size = chunk_size or CHUNK_SIZE
+    ids = sorted(set(ids))
+    return [
+        (ids[i], ids[min(i + chunk_size, len(ids)) - 1])
+        for i in range(0, len(ids), chunk_size)
+    ]
+
+
+def fan_out(job, subtasks):
+    """Run subtasks in parallel; summarize_job collects their counts"""
+    if not subtasks:
+        return f"{job}: nothing to send"
+    result = chord(subtasks)(summarize_job.s(job))
+    return f"{job}: queued {len(subtasks)} chunks (summary task {result.id})"
 
 
+@shared_task
+def summarize_job(counts, job):
+    """Chord callback — totals from every chunk of one job"""
+    return {'job': job, 'chunks': len(counts), 'sent': sum(counts)}
+
+
+# Payment reminders
+
 @shared_task
 def send_payment_reminders():
     """Send payment reminders to all students with pending payments (7th-10th)"""
-    count = send_payment_reminders_to_all()
-    return f"Sent {count} payment reminders"
+    payment_ids = email_service.pending_reminder_payments().values_list('id', flat=True)
+    return fan_out('payment reminders', [
+        send_payment_reminder_chunk.s(first_id, last_id)
+        for first_id, last_id in id_ranges(payment_ids)
+    ])
 
 
+@shared_task
+def send_payment_reminder_chunk(first_id, last_id):
+    return email_service.send_payment_reminders_to_all(id_range=(first_id, last_id))
+
+
+# Class reminders
+
 @shared_task
 def send_class_reminders():
     """Send class reminders (24h and 1h before)"""
-    count = send_class_reminders()
-    return f"Sent {count} class reminders"
+    from .reminders import claim_reminder_sessions, session_enrollments
+    
+    subtasks = []
+    for hours_before in (24, 1):
+        session_ids = claim_reminder_sessions(hours_before)
+        if not session_ids:
+            continue
+        enrollment_ids = session_enrollments(session_ids).values_list('id', flat=True)
+        subtasks += [
+            send_class_reminder_chunk.s(hours_before, session_ids, first_id, last_id)
+            for first_id, last_id in id_ranges(enrollment_ids)
+        ]
+    return fan_out('class reminders', subtasks)
 
 
+@shared_task
+def send_class_reminder_chunk(hours_before, session_ids, first_id, last_id):
+    return email_service.send_class_reminder_batch(hours_before, session_ids, (first_id, last_id))
+
+
+# Absence alerts
+
 @shared_task
 def check_continuous_absence():
-    """Check for students with 3+ days of continuous absence"""
-    count = check_continuous_absence()
-    return f"Sent {count} absence alerts"
+    """Check for students with 3+ consecutive absences"""
+    from .absence import find_absence_streaks
+    
+    streaks = [[student_id, streak] for student_id, streak, _ in find_absence_streaks()]
+    return fan_out('absence alerts', [
+        send_absence_alert_chunk.s(streaks[i:i + CHUNK_SIZE])
+        for i in range(0, len(streaks), CHUNK_SIZE)
+    ])
 
 
+@shared_task
+def send_absence_alert_chunk(streaks):
+    return email_service.send_absence_alerts([tuple(row) for row in streaks])
+
+
+# Feedback forms
+
 @shared_task
 def send_feedback_form_requests():
-    """Send feedback forms for completed classes"""
-    count = send_feedback_form_requests()
-    return f"Sent {count} feedback form requests"
+    """Send feedback forms for completed classes; re-queues itself while a backlog remains"""
+    from .feedback_dispatch import dispatch_feedback_forms
+    
+    report = dispatch_feedback_forms()
+    if report.get('capped') and report.get('remaining_sessions'):
+        send_feedback_form_requests.apply_async(countdown=FEEDBACK_RESUME_SECONDS)
+    return report
+
+
+@shared_task
+def refresh_admin_dashboard():
+    """Rebuild the cached admin dashboard rollup"""
+    from .dashboard import refresh_admin_rollup
+    refresh_admin_rollup()
+    return "Admin dashboard rollup refreshed"
+
+
+def result_email_progress_key(task_id):
+    return f'lms:result_emails:{task_id}'
+
+
+@shared_task(bind=True)
+def send_test_result_emails(self, test_id, student_ids):
+    """Email results of one test to the given students (queued by submit_marks)"""
+    from .models import TestResult
+    
+    key = result_email_progress_key(self.request.id)
+    results = TestResult.objects.filter(
+        test_id=test_id,
+        student_id__in=student_ids
+    ).select_related('student__user', 'test')
+    
+    def on_progress(sent, failed, total):
+        cache.set(key, {'state': 'running', 'sent': sent, 'failed': failed, 'total': total}, 86400)
+    
+    cache.set(key, {'state': 'running', 'sent': 0, 'failed': 0, 'total': len(student_ids)}, 86400)
+    count = email_service.send_test_result_emails(results, on_progress=on_progress)
+    progress = cache.get(key) or {}
+    progress['state'] = 'done'
+    cache.set(key, progress, 86400)
+    return f"Sent {count} test result emails"
+
+
+@shared_task
+def send_payment_verification_emails(payment_ids, referral_ids):
+    """Receipts + referral concession emails after a bulk verification"""
+    count = email_service.send_payment_verification_emails(payment_ids, referral_ids)
+    return f"Sent {count} payment verification emails"
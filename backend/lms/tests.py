@@ -0,0 +1,1007 @@
+"""
+LMS regression tests
+
+Query-count tests pin the number of queries an endpoint issues and check it
+does not move when the amount of data behind it grows.
+"""
+
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from importlib import import_module
+import smtplib
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APIClient
+
+from . import exports, feedback_dispatch, reminders, tasks
+from .absence import find_absence_streaks
+from .dashboard import get_admin_rollup
+from .mailer import PooledMailer
+from .email_log import EmailLogBuffer, build_email_log, context_payload, restore_context
+from .email_service import send_class_reminder_email
+from .email_templates import plaintext_source, render_email, render_email_batch
+from .grading import answer_key_cache_key, get_answer_key
+from .pagination import KeysetPagination, keyset_iterator
+from .ranking import rank_test_results, with_percentile
+from .query_plans import hot_queries, indexes_used, missing_indexes
+from .serializers import AdminDashboardSerializer
+from .models import (
+    Student, Course, ClassSession, Attendance, Test, TestResult, Payment,
+    StudentEnrollment, ReferralTracking, Quiz, QuizQuestion, QuizAttempt, EmailLog,
+)
+
+
+User = get_user_model()
+API = '/api/lms'
+
+
+def make_student(username, **extra):
+    user = User.objects.create_user(username, f'{username}@example.com', 'x', first_name=username)
+    return Student.objects.create(
+        user=user, phone='9999999999', address='-', date_of_birth=date(2010, 1, 1), grade='8', **extra
+    )
+
+
+def make_course(title):
+    return Course.objects.create(title=title, description='-', category='maths')
+
+
+def make_session(course, days_from_today, title='Session'):
+    return ClassSession.objects.create(
+        course=course,
+        title=title,
+        date=timezone.now().date() + timedelta(days=days_from_today),
+        start_time=time(10),
+        end_time=time(11),
+    )
+
+
+def client_for(student_or_user):
+    user = getattr(student_or_user, 'user', student_or_user)
+    client = APIClient()
+    # Fresh instance so nothing is pre-cached on the user the view sees
+    client.force_authenticate(User.objects.get(pk=user.pk))
+    return client
+
+
+class StudentDashboardQueryCountTests(TestCase):
+    """DashboardViewSet.student stays at a fixed number of queries"""
+
+    QUERIES = 7
+
+    def enrol(self, student, n_courses):
+        for i in range(n_courses):
+            course = make_course(f'Course {i}')
+            StudentEnrollment.objects.create(student=student, course=course)
+            past, upcoming = make_session(course, -1), make_session(course, 1)
+            Attendance.objects.create(student=student, class_session=past, date=past.date, status='present')
+            Attendance.objects.create(student=student, class_session=upcoming, date=upcoming.date, status='present')
+            test = Test.objects.create(course=course, title=f'Test {i}', test_type='weekly', date=past.date)
+            TestResult.objects.create(test=test, student=student, marks_obtained=40 + i)
+            Payment.objects.create(
+                student=student, amount=1000, payment_type='monthly_fee', status='completed',
+                receipt_number=f'T{student.id:03d}{i:03d}', for_month=past.date.replace(day=1),
+                due_date=past.date.replace(day=1),
+            )
+
+    def assert_dashboard_queries(self, n_courses):
+        student = make_student(f'student_{n_courses}')
+        self.enrol(student, n_courses)
+        client = client_for(student)
+        with self.assertNumQueries(self.QUERIES):
+            response = client.get(f'{API}/dashboard/student/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['enrolled_courses']), n_courses)
+
+    def test_four_enrollments(self):
+        self.assert_dashboard_queries(4)
+
+    def test_twelve_enrollments(self):
+        self.assert_dashboard_queries(12)
+
+
+class FinanceReportTests(TestCase):
+    """DashboardViewSet.finance rejects bad year ranges with 400"""
+
+    def setUp(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client = client_for(admin)
+        student = make_student('payer')
+        Payment.objects.create(
+            student=student, amount=1500, payment_type='monthly_fee', status='completed',
+            receipt_number='F001', for_month=date(2025, 3, 1), due_date=date(2025, 3, 1),
+        )
+
+    def finance(self, **params):
+        return self.client.get(f'{API}/dashboard/finance/', params)
+
+    def test_out_of_range_years(self):
+        for params in ({'year': 0}, {'year': 9999}, {'from_year': 1999, 'to_year': 2001},
+                       {'from_year': 9998, 'to_year': 9999}, {'year': 'abc'}):
+            with self.subTest(**params):
+                self.assertEqual(self.finance(**params).status_code, 400)
+
+    def test_last_accepted_year(self):
+        self.assertEqual(self.finance(year=9998).status_code, 200)
+
+    def test_csv_export(self):
+        response = self.finance(year=2025, export='csv')
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('2025-03,monthly_fee,1500', body)
+
+
+class SessionPairsTests(TestCase):
+    """reminders.session_pairs reads every (session, student) pair across keyset batches"""
+
+    def test_pairs_span_batches(self):
+        courses = [make_course('Maths'), make_course('Science')]
+        sessions = [make_session(course, 1, title=f'{course.title} {i}') for course in courses for i in range(3)]
+        students = [make_student(f'pair_{i}') for i in range(4)]
+        for student in students:
+            for course in courses:
+                StudentEnrollment.objects.create(student=student, course=course)
+        StudentEnrollment.objects.filter(student=students[-1], course=courses[0]).update(is_active=False)
+
+        expected = {
+            (session.id, student.id)
+            for session in sessions for student in students
+            if not (student == students[-1] and session.course_id == courses[0].id)
+        }
+        for chunk_size in (1, 2, 5, 1000):
+            with self.subTest(chunk_size=chunk_size), mock.patch.object(reminders, 'PAIR_CHUNK_SIZE', chunk_size):
+                pairs = [(session.id, student.id) for session, student in reminders.session_pairs([s.id for s in sessions])]
+                self.assertEqual(len(pairs), len(expected))
+                self.assertEqual(set(pairs), expected)
+
+
+class StaleFeedbackSessionTests(TestCase):
+    """Sessions past LMS_FEEDBACK_MAX_AGE_DAYS are closed unsent, and the close is logged"""
+
+    def test_stale_sessions_closed_and_logged(self):
+        course = make_course('History')
+        StudentEnrollment.objects.create(student=make_student('late'), course=course)
+        old = make_session(course, -(feedback_dispatch.MAX_AGE_DAYS + 3))
+        recent = make_session(course, -1)
+
+        with self.assertLogs('lms.feedback_dispatch', 'WARNING') as logs:
+            closed = feedback_dispatch.close_stale_sessions(timezone.localtime().date())
+
+        self.assertEqual(closed, 1)
+        self.assertIn(str(old.id), logs.output[0])
+        old.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertTrue(old.feedback_form_sent)
+        self.assertFalse(recent.feedback_form_sent)
+
+
+class ReferralCounterTests(TestCase):
+    """Student referral counters follow ReferralTracking and can be reconciled"""
+
+    def setUp(self):
+        self.referrer = make_student('referrer')
+
+    def refer(self, name, status='pending'):
+        return ReferralTracking.objects.create(referrer=self.referrer, referred_student=make_student(name), status=status)
+
+    def counters(self):
+        self.referrer.refresh_from_db()
+        return self.referrer.referrals_total, self.referrer.referrals_paid, self.referrer.referrals_pending
+
+    def test_mark_as_paid_moves_counters(self):
+        referral = self.refer('friend')
+        self.refer('other', status='inactive')
+        referral.mark_as_paid()
+        self.assertEqual(self.counters(), (2, 1, 0))
+
+    def test_mark_as_paid_with_drifted_pending_counter(self):
+        referral = self.refer('friend')
+        Student.objects.filter(id=self.referrer.id).update(referrals_pending=0)
+        referral.mark_as_paid()
+        self.assertEqual(self.counters(), (1, 1, 0))
+
+    def test_status_change_away_from_paid(self):
+        referral = self.refer('friend', status='paid')
+        self.refer('other')
+        self.assertTrue(referral.change_status('inactive'))
+        self.assertEqual(self.counters(), (2, 0, 1))
+
+        # A stale copy still thinks the referral is paid; its change is refused
+        stale = ReferralTracking.objects.get(id=referral.id)
+        stale.status = 'paid'
+        self.assertFalse(stale.change_status('pending'))
+        self.assertEqual(self.counters(), (2, 0, 1))
+
+    def test_status_edit_through_save(self):
+        referral = ReferralTracking.objects.get(id=self.refer('friend', status='paid').id)
+        referral.status = 'pending'
+        referral.save()
+        referral.concession_notification_sent = True
+        referral.save()
+        self.assertEqual(self.counters(), (1, 0, 1))
+        referral.status = 'inactive'
+        referral.save(update_fields=['concession_notification_sent'])
+        self.assertEqual(self.counters(), (1, 0, 1))
+
+    def test_migration_backfill(self):
+        migration = import_module('lms.migrations.0004_student_referral_counters')
+        self.refer('a', status='paid')
+        self.refer('b')
+        self.refer('c', status='inactive')
+        Student.objects.update(referrals_total=0, referrals_paid=0, referrals_pending=0)
+        migration.backfill_referral_counters(django_apps, None)
+        self.assertEqual(self.counters(), (3, 1, 1))
+
+    def test_reconcile_command_fixes_drift(self):
+        self.refer('a', status='paid')
+        self.refer('b')
+        Student.objects.filter(id=self.referrer.id).update(referrals_total=0, referrals_paid=0, referrals_pending=5)
+        call_command('reconcile_referral_counters', '--dry-run', stdout=mock.MagicMock())
+        self.assertEqual(self.counters(), (0, 0, 5))
+        call_command('reconcile_referral_counters', stdout=mock.MagicMock())
+        self.assertEqual(self.counters(), (2, 1, 1))
+
+
+class ListQueryCountTests(TestCase):
+    """Course and quiz lists issue the same queries for 3 rows as for 12"""
+
+    COURSE_LIST_QUERIES = 3
+    QUIZ_LIST_QUERIES = 4
+
+    def setUp(self):
+        self.student = make_student('lister')
+        self.others = [make_student(f'classmate_{i}') for i in range(3)]
+
+    def add_courses(self, n):
+        for i in range(n):
+            course = make_course(f'Course {i}')
+            for student in [self.student] + self.others:
+                StudentEnrollment.objects.create(student=student, course=course, is_active=i % 2 == 0)
+
+    def add_quizzes(self, n):
+        course = make_course('Quizzes')
+        for i in range(n):
+            quiz = Quiz.objects.create(
+                class_session=make_session(course, -1, title=f'Quiz session {i}'),
+                title=f'Quiz {i}', is_published=True,
+            )
+            for order in range(3):
+                QuizQuestion.objects.create(quiz=quiz, question_text='?', correct_answer='a', order=order)
+            if i % 2:
+                QuizAttempt.objects.create(quiz=quiz, student=self.student)
+
+    def assert_list_queries(self, url, queries, n):
+        client = client_for(self.student)
+        with self.assertNumQueries(queries):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), n)
+        return response.data
+
+    def test_course_list(self):
+        for n in (3, 12):
+            with self.subTest(courses=n):
+                Course.objects.all().delete()
+                self.add_courses(n)
+                courses = self.assert_list_queries(f'{API}/courses/', self.COURSE_LIST_QUERIES, n)
+                self.assertEqual(sum(course['is_enrolled'] for course in courses), (n + 1) // 2)
+
+    def test_quiz_list(self):
+        for n in (3, 12):
+            with self.subTest(quizzes=n):
+                Course.objects.all().delete()
+                self.add_quizzes(n)
+                quizzes = self.assert_list_queries(f'{API}/quizzes/', self.QUIZ_LIST_QUERIES, n)
+                self.assertEqual(sum(quiz['has_attempted'] for quiz in quizzes), n // 2)
+
+
+class EndpointQueryCountTests(TestCase):
+    """Every list endpoint issues the same queries for 2 rows as for 6"""
+
+    SESSION_LIST_QUERIES = 3
+    TEST_LIST_QUERIES = 1
+    COURSE_SESSIONS_QUERIES = 3
+    MY_RESULT_QUERIES = 4
+    STUDENT_LIST_QUERIES = 1
+    PAYMENT_LIST_QUERIES = 1
+    ATTENDANCE_LIST_QUERIES = 1
+    EMAIL_LOG_LIST_QUERIES = 1
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('auditor', 'auditor@example.com', 'x')
+        self.student = make_student('counted')
+        self.course = make_course('Biology')
+        self.quiz = Quiz.objects.create(
+            class_session=make_session(self.course, -1, title='Quiz session'), title='Cells', is_published=True,
+        )
+        QuizAttempt.objects.create(quiz=self.quiz, student=self.student, submitted_at=timezone.now())
+        self.rows = 0
+
+    def grow(self, n):
+        """Add rows until every list has n of them (plus the fixed ones from setUp)"""
+        month = timezone.now().date().replace(day=1)
+        for i in range(self.rows, n):
+            other = make_student(f'row_{i}')
+            session = make_session(self.course, -2 - i, title=f'Session {i}')
+            for student in (self.student, other):
+                Attendance.objects.create(student=student, class_session=session, date=session.date, status='present')
+            test = Test.objects.create(course=self.course, title=f'Test {i}', test_type='weekly', date=session.date)
+            TestResult.objects.create(test=test, student=other, marks_obtained=50)
+            Payment.objects.create(
+                student=other, amount=1000, payment_type='monthly_fee', status='pending',
+                receipt_number=f'Q{i:03d}', for_month=month, due_date=month,
+            )
+            EmailLog.objects.create(student=other, email_type='welcome', subject=f'Hi {i}')
+            QuizQuestion.objects.create(quiz=self.quiz, question_text=f'Q{i}', correct_answer='a', order=i)
+        self.rows = n
+
+    def assert_queries_flat(self, user, endpoints):
+        """{url: queries} checked at both sizes; returns {url: rows} from the larger one"""
+        rows = {}
+        for n in (2, 6):
+            self.grow(n)
+            client = client_for(user)
+            for url, queries in endpoints.items():
+                with self.subTest(url=url, rows=n), self.assertNumQueries(queries):
+                    response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                data = response.data
+                rows[url] = data['results'] if isinstance(data, dict) and 'results' in data else data
+        return rows
+
+    def test_student_lists(self):
+        sessions_url, tests_url = f'{API}/sessions/', f'{API}/tests/'
+        rows = self.assert_queries_flat(self.student, {
+            sessions_url: self.SESSION_LIST_QUERIES,
+            tests_url: self.TEST_LIST_QUERIES,
+        })
+        self.assertEqual(sum(session['is_attended'] for session in rows[sessions_url]), 6)
+        self.assertEqual([test['results_count'] for test in rows[tests_url]], [1] * 6)
+
+    def test_my_quiz_result(self):
+        url = f'{API}/quizzes/{self.quiz.id}/my_result/'
+        attempt = self.assert_queries_flat(self.student, {url: self.MY_RESULT_QUERIES})[url]
+        self.assertEqual(attempt['total_questions'], 6)
+
+    def test_admin_lists(self):
+        # courses/<id>/sessions/ is staff only, like every CourseViewSet action beyond list / retrieve
+        endpoints = {
+            f'{API}/courses/{self.course.id}/sessions/': (self.COURSE_SESSIONS_QUERIES, 7),
+            f'{API}/students/': (self.STUDENT_LIST_QUERIES, 7),
+            f'{API}/payments/': (self.PAYMENT_LIST_QUERIES, 6),
+            f'{API}/attendance/': (self.ATTENDANCE_LIST_QUERIES, 12),
+            f'{API}/email-logs/': (self.EMAIL_LOG_LIST_QUERIES, 6),
+        }
+        rows = self.assert_queries_flat(self.admin, {url: queries for url, (queries, _) in endpoints.items()})
+        for url, (_, count) in endpoints.items():
+            self.assertEqual(len(rows[url]), count, url)
+
+
+class HotQueryIndexTests(TestCase):
+    """The dashboard and task hot queries are planned on their indexes (as explain_lms_queries checks)"""
+
+    def test_declared_indexes_migrated(self):
+        self.assertEqual([index.name for _, index in missing_indexes()], [])
+
+    def test_hot_queries_use_their_indexes(self):
+        for label, run, expected in hot_queries(timezone.localtime().date()):
+            with self.subTest(label):
+                used, plans = indexes_used(run, expected)
+                self.assertTrue(used, f'none of {", ".join(expected)} used:\n' + '\n'.join(plans))
+
+    def test_command_passes(self):
+        call_command('explain_lms_queries', stdout=mock.MagicMock())
+
+
+class PaymentExportTests(TestCase):
+    """Payment export streams every row once, in order, across keyset batches"""
+
+    def setUp(self):
+        admin = User.objects.create_superuser('exporter', 'exporter@example.com', 'x')
+        self.client = client_for(admin)
+        student = make_student('payer')
+        months = [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)]
+        for i in range(11):
+            Payment.objects.create(
+                student=student, amount=100 + i, payment_type='monthly_fee', status='completed',
+                receipt_number=f'E{i:03d}', for_month=months[i % 3], due_date=months[i % 3],
+            )
+        self.expected = list(
+            Payment.objects.order_by('for_month', 'id').values_list('receipt_number', flat=True)
+        )
+
+    def test_csv_spans_batches(self):
+        for chunk_size in (1, 4, 11, 2000):
+            with self.subTest(chunk_size=chunk_size), mock.patch.object(exports, 'ITERATOR_CHUNK_SIZE', chunk_size):
+                response = self.client.get(f'{API}/payments/export/', {'export': 'csv'})
+                self.assertEqual(response.status_code, 200)
+                lines = b''.join(response.streaming_content).decode().splitlines()
+                self.assertEqual([line.split(',')[1] for line in lines[1:]], self.expected)
+
+
+class AdminRollupTests(TestCase):
+    """The cached admin rollup follows payment creates and deletes"""
+
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('rollup')
+
+    def pending_payment(self, receipt):
+        return Payment.objects.create(
+            student=self.student, amount=1000, payment_type='monthly_fee', status='pending',
+            receipt_number=receipt, for_month=date(2025, 1, 1), due_date=date(2025, 1, 1),
+        )
+
+    def test_computed_at_is_a_datetime(self):
+        rollup = get_admin_rollup()
+        self.assertIsInstance(rollup['computed_at'], datetime)
+        field = AdminDashboardSerializer().fields['computed_at']
+        self.assertEqual(parse_datetime(field.to_representation(rollup['computed_at'])), rollup['computed_at'])
+
+    def test_pending_count_follows_create_and_delete(self):
+        self.assertEqual(get_admin_rollup()['pending_payments'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.pending_payment('R001')
+            self.pending_payment('R002')
+        self.assertEqual(get_admin_rollup()['pending_payments'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(get_admin_rollup()['pending_payments'], 1)
+
+
+class BulkMarkAttendanceTests(TestCase):
+    """AttendanceViewSet.bulk_mark upserts and reports an outcome per row"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('marker', 'marker@example.com', 'x')
+        self.session = make_session(make_course('Physics'), 0)
+        self.present, self.late = make_student('present'), make_student('on_leave')
+        Attendance.objects.create(
+            student=self.late, class_session=self.session, date=self.session.date, status='absent'
+        )
+
+    def test_created_updated_and_rejected_rows(self):
+        missing_id = self.late.id + 1000
+        response = client_for(self.admin).post(f'{API}/attendance/bulk_mark/', {
+            'session_id': self.session.id,
+            'attendance': [
+                {'student_id': self.present.id, 'status': 'present'},
+                {'student_id': self.late.id, 'status': 'leave'},
+                {'student_id': missing_id, 'status': 'present'},
+            ],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {key: response.data[key] for key in ('created', 'updated', 'rejected')},
+            {'created': 1, 'updated': 1, 'rejected': 1},
+        )
+        self.assertEqual(response.data['results'], [
+            {'student_id': self.present.id, 'status': 'present', 'outcome': 'created'},
+            {'student_id': self.late.id, 'status': 'leave', 'outcome': 'updated'},
+            {'student_id': missing_id, 'outcome': 'rejected', 'error': 'Student not found'},
+        ])
+        rows = Attendance.objects.filter(class_session=self.session)
+        self.assertEqual(rows.count(), 2)
+        self.assertEqual(dict(rows.values_list('student_id', 'status')), {self.present.id: 'present', self.late.id: 'leave'})
+        self.assertEqual(set(rows.values_list('marked_by', flat=True)), {self.admin.id})
+
+
+class RankingTests(TestCase):
+    """rank_test_results tie policies and with_percentile against a hand-computed fixture"""
+
+    MARKS = [90, 80, 80, 70, 60]
+
+    def setUp(self):
+        course = make_course('Chemistry')
+        self.test = Test.objects.create(course=course, title='Unit 1', test_type='weekly', date=date(2025, 1, 10), total_marks=100)
+        self.other = Test.objects.create(course=course, title='Unit 2', test_type='weekly', date=date(2025, 1, 17), total_marks=100)
+        self.results = [
+            TestResult.objects.create(test=self.test, student=make_student(f'ranked_{i}'), marks_obtained=marks)
+            for i, marks in enumerate(self.MARKS)
+        ]
+        self.untouched = TestResult.objects.create(test=self.other, student=self.results[0].student, marks_obtained=10)
+
+    def ranks(self):
+        return [TestResult.objects.get(id=result.id).rank for result in self.results]
+
+    def test_competition_ranking(self):
+        self.assertEqual(rank_test_results(self.test, 'competition'), 5)
+        self.assertEqual(self.ranks(), [1, 2, 2, 4, 5])
+
+    def test_dense_ranking(self):
+        rank_test_results(self.test, 'dense')
+        self.assertEqual(self.ranks(), [1, 2, 2, 3, 4])
+
+    def test_ranking_leaves_other_tests_alone(self):
+        rank_test_results(self.test)
+        self.untouched.refresh_from_db()
+        self.assertIsNone(self.untouched.rank)
+
+    def test_percentile(self):
+        percentiles = dict(with_percentile(TestResult.objects.filter(test=self.test)).values_list('id', 'percentile'))
+        self.assertEqual(
+            [round(percentiles[result.id], 2) for result in self.results],
+            [100.0, 80.0, 80.0, 40.0, 20.0],
+        )
+
+
+class SubmitMarksTests(TestCase):
+    """TestViewSet.submit_marks stores exact percentages, ranks, and queues the emails once"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('grader', 'grader@example.com', 'x')
+        self.test = Test.objects.create(
+            course=make_course('Biology'), title='Cells', test_type='weekly', date=date(2025, 2, 1), total_marks=30
+        )
+        self.students = [make_student(f'sitter_{i}') for i in range(3)]
+
+    def test_submit_marks(self):
+        marks = [20, 25, 20]
+        with mock.patch('lms.views.send_test_result_emails') as task:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                response = client_for(self.admin).post(f'{API}/tests/{self.test.id}/submit_marks/', {
+                    'marks': [{'student_id': s.id, 'marks': m} for s, m in zip(self.students, marks)],
+                }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(callbacks), 1)
+        task.apply_async.assert_called_once_with(
+            args=[self.test.id, [s.id for s in self.students]], task_id=response.data['email_task_id']
+        )
+        results = {r.student_id: r for r in TestResult.objects.filter(test=self.test)}
+        self.assertEqual(
+            [(results[s.id].percentage, results[s.id].rank) for s in self.students],
+            [(Decimal('66.67'), 2), (Decimal('83.33'), 1), (Decimal('66.67'), 2)],
+        )
+
+
+class FlakyBackend(LocmemBackend):
+    """locmem backend that raises the queued errors before delivering, and counts opens"""
+
+    def __init__(self, errors=(), **kwargs):
+        super().__init__(**kwargs)
+        self.errors = list(errors)
+        self.opened = 0
+
+    def open(self):
+        self.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if self.errors:
+            raise self.errors.pop(0)
+        return super().send_messages(messages)
+
+
+def message(i):
+    return EmailMessage(f'Subject {i}', 'Body', 'from@example.com', [f'to{i}@example.com'])
+
+
+@mock.patch('lms.mailer.time.sleep')
+class PooledMailerTests(SimpleTestCase):
+    """PooledMailer sends over one connection, recycles it per batch and retries transient errors"""
+
+    def test_batches_recycle_the_connection(self, sleep):
+        connection = FlakyBackend()
+        with PooledMailer(batch_size=2, connection=connection) as mailer:
+            sent, errors = mailer.send_batch([message(i) for i in range(5)])
+
+        self.assertEqual((sent, errors), (5, []))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(connection.opened, 3)
+        self.assertEqual({k: mailer.stats()[k] for k in ('sent', 'failed', 'retries', 'sessions')},
+                         {'sent': 5, 'failed': 0, 'retries': 0, 'sessions': 3})
+        sleep.assert_not_called()
+
+    def test_transient_errors_retry_with_backoff(self, sleep):
+        connection = FlakyBackend(errors=[
+            smtplib.SMTPServerDisconnected('dropped'),
+            smtplib.SMTPResponseException(421, b'try later'),
+        ])
+        with PooledMailer(max_retries=3, backoff=0.5, connection=connection) as mailer:
+            mailer.send(message(0))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [0.5, 1.0])
+        self.assertEqual((mailer.sent, mailer.failed, mailer.retries, mailer.sessions), (1, 0, 2, 3))
+
+    def test_permanent_error_is_not_retried(self, sleep):
+        connection = FlakyBackend(errors=[smtplib.SMTPResponseException(550, b'no such user')])
+        with PooledMailer(connection=connection) as mailer:
+            sent, errors = mailer.send_batch([message(0), message(1)])
+
+        self.assertEqual(sent, 1)
+        self.assertEqual([exc.smtp_code for _, exc in errors], [550])
+        self.assertEqual([m.to for m in mail.outbox], [['to1@example.com']])
+        self.assertEqual((mailer.failed, mailer.retries), (1, 0))
+        sleep.assert_not_called()
+
+    def test_gives_up_after_max_retries(self, sleep):
+        connection = FlakyBackend(errors=[smtplib.SMTPServerDisconnected('dropped')] * 3)
+        with PooledMailer(max_retries=2, backoff=1, connection=connection) as mailer:
+            with self.assertRaises(smtplib.SMTPServerDisconnected):
+                mailer.send(message(0))
+
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [1, 2])
+        self.assertEqual((mailer.sent, mailer.failed, mailer.retries), (0, 1, 2))
+
+
+class EmailTemplateTests(SimpleTestCase):
+    """Compiled email templates render HTML plus a plaintext twin derived from the source"""
+
+    context = {
+        'student_name': 'Asha & Co',
+        'class_title': 'Algebra',
+        'course_title': 'Maths',
+        'date': date(2025, 3, 4),
+        'start_time': time(10),
+        'hours_before': 1,
+    }
+
+    def test_plaintext_source(self):
+        source = plaintext_source(
+            '<html><head><style>p { color: red; }</style></head><body>'
+            '<p>Hi {{ name }},</p><p>{% if late %}Late &amp; sorry{% endif %}</p>'
+            '<a href="https://example.com/x">Open</a></body></html>'
+        )
+        self.assertEqual(
+            source,
+            '{% autoescape off %}Hi {{ name }},\n{% if late %}Late & sorry{% endif %}\n'
+            'Open (https://example.com/x){% endautoescape %}'
+        )
+
+    def test_render_email(self):
+        html_body, text_body = render_email('class_reminder', self.context)
+
+        self.assertIn('<p>Hello Asha &amp; Co,</p>', html_body)
+        self.assertIn('<h3>Algebra</h3>', html_body)
+        self.assertIn('Hello Asha & Co,', text_body)
+        self.assertIn('Class starts in 1 hour!', text_body)
+        self.assertIn('Join Class (https://app.seekhowithrua.com/classes)', text_body)
+        self.assertIn('© 2026 Seekhowithrua.', text_body)
+        self.assertNotIn('<', text_body)
+        self.assertNotIn('font-family', text_body)
+        self.assertNotIn('\n\n\n', text_body)
+
+    def test_batch_matches_single_renders(self):
+        contexts = [dict(self.context, hours_before=hours, class_title=f'Class {hours}') for hours in (24, 1)]
+        self.assertEqual(render_email_batch('class_reminder', contexts), [render_email('class_reminder', c) for c in contexts])
+        self.assertIn('IN 24 HOURS', render_email_batch('class_reminder', contexts)[0][1])
+
+
+class EmailLogTests(TestCase):
+    """EmailLogBuffer writes in chunks; rows keep template + context and re-render on demand"""
+
+    def setUp(self):
+        self.student = make_student('logged')
+
+    def log(self, i):
+        return build_email_log(self.student, 'welcome', f'Subject {i}', template_name='welcome', context={'n': i})
+
+    def test_buffer_flushes_every_chunk_and_on_exit(self):
+        with EmailLogBuffer(chunk_size=2) as log_buffer:
+            for i in range(5):
+                log_buffer.add(self.log(i))
+                self.assertEqual(EmailLog.objects.count(), (i + 1) // 2 * 2)
+            self.assertEqual(len(log_buffer.pending), 1)
+        self.assertEqual(log_buffer.written, 5)
+        self.assertEqual(EmailLog.objects.count(), 5)
+
+    def test_rows_store_context_not_html(self):
+        context = {'when': date(2025, 3, 4), 'name': 'Asha'}
+        row = build_email_log(self.student, 'welcome', 'Hi', template_name='welcome', context=context)
+        stored, digest = context_payload(context)
+        self.assertEqual(row.context, {'when': '2025-03-04', 'name': 'Asha'})
+        self.assertEqual((row.context, row.context_hash), (stored, digest))
+        self.assertEqual(len(row.context_hash), 64)
+        self.assertEqual(row.content, '')
+        self.assertEqual(restore_context(row.context), context)
+
+    def test_render_content(self):
+        session = make_session(make_course('Maths'), 1, title='Algebra')
+        with mock.patch('lms.mailer.time.sleep'), PooledMailer(connection=FlakyBackend()) as mailer:
+            with EmailLogBuffer() as log_buffer:
+                self.assertTrue(send_class_reminder_email(self.student, session, 24, mailer, log_buffer))
+
+        self.assertEqual(len(mail.outbox), 1)
+        sent = mail.outbox[0]
+        row = EmailLog.objects.get()
+        self.assertEqual((row.email_type, row.template_name, row.status), ('class_reminder_24h', 'class_reminder', 'sent'))
+        self.assertEqual(row.render_content(), sent.alternatives[0][0])
+        self.assertIn('<h3>Algebra</h3>', row.render_content())
+
+        legacy = EmailLog.objects.create(student=self.student, email_type='welcome', subject='Old', content='<p>old</p>')
+        self.assertEqual(legacy.render_content(), '<p>old</p>')
+
+
+class AbsenceStreakTests(TestCase):
+    """Trailing runs of 'absent' records, with days off ignored and sent alerts deduped"""
+
+    def setUp(self):
+        course = make_course('Physics')
+        self.sessions = {days: make_session(course, -days) for days in (6, 5, 4, 2, 1)}
+        self.today = timezone.now().date()
+
+    def record(self, student, marks):
+        for days, status in marks.items():
+            session = self.sessions[days]
+            Attendance.objects.create(student=student, class_session=session, date=session.date, status=status)
+        return student
+
+    def alert(self, student, days_ago):
+        log = EmailLog.objects.create(student=student, email_type='absence_alert', subject='-', status='sent')
+        EmailLog.objects.filter(pk=log.pk).update(sent_at=timezone.now() - timedelta(days=days_ago))
+
+    def streaks(self):
+        return {
+            student_id: (streak, (self.today - started).days)
+            for student_id, streak, started in find_absence_streaks(min_streak=3, window_days=14, today=self.today)
+        }
+
+    def test_consecutive_absences_across_days_off(self):
+        # No class on day -3, so -5, -4, -2, -1 are four consecutive records
+        student = self.record(make_student('away'), {6: 'present', 5: 'absent', 4: 'absent', 2: 'absent', 1: 'absent'})
+        self.assertEqual(self.streaks(), {student.id: (4, 5)})
+
+    def test_any_other_status_breaks_the_streak(self):
+        self.record(make_student('back'), {6: 'absent', 5: 'absent', 4: 'present', 2: 'absent', 1: 'absent'})
+        self.record(make_student('excused'), {6: 'absent', 5: 'absent', 4: 'absent', 2: 'leave', 1: 'absent'})
+        self.record(make_student('returned'), {5: 'absent', 4: 'absent', 2: 'absent', 1: 'present'})
+        self.assertEqual(self.streaks(), {})
+
+    def test_alerted_streak_is_not_reported_again(self):
+        marks = {5: 'present', 4: 'absent', 2: 'absent', 1: 'absent'}
+        alerted = self.record(make_student('alerted'), marks)
+        self.alert(alerted, days_ago=1)
+        # An alert about an earlier streak does not cover the current one
+        earlier = self.record(make_student('earlier'), marks)
+        self.alert(earlier, days_ago=6)
+        self.record(make_student('inactive', is_active=False), marks)
+
+        self.assertEqual(self.streaks(), {earlier.id: (3, 4)})
+
+
+class TaskFanOutTests(TestCase):
+    """Coordinators split ids into ranges and fan them out as a chord"""
+
+    def test_id_ranges_at_chunk_boundaries(self):
+        cases = [
+            ([], 2, []),
+            ([7], 2, [(7, 7)]),
+            ([1, 2, 3, 4], 2, [(1, 2), (3, 4)]),
+            ([5, 1, 4, 2, 3], 2, [(1, 2), (3, 4), (5, 5)]),
+            ([3, 1, 3, 2, 1], 2, [(1, 2), (3, 3)]),
+            ([1, 5, 9, 20], 3, [(1, 9), (20, 20)]),
+            ([1, 2, 3], 3, [(1, 3)]),
+        ]
+        for ids, chunk_size, expected in cases:
+            with self.subTest(ids=ids, chunk_size=chunk_size):
+                self.assertEqual(tasks.id_ranges(ids, chunk_size), expected)
+
+    def test_payment_reminders_fan_out_in_chunks(self):
+        month = timezone.now().date().replace(day=1)
+        for i in range(6):
+            Payment.objects.create(
+                student=make_student(f'payer{i}'), amount=1000, payment_type='monthly_fee',
+                status='completed' if i == 2 else 'pending',
+                receipt_number=f'R{i:03d}', for_month=month, due_date=month,
+            )
+
+        summarize = mock.patch.object(tasks.summarize_job, 'run', wraps=tasks.summarize_job.run)
+        with mock.patch.object(tasks, 'CHUNK_SIZE', 2), summarize as summary:
+            report = tasks.send_payment_reminders.delay().get()
+
+        # Five pending ids, two per chunk; the completed payment inside a range is not emailed
+        self.assertTrue(report.startswith('payment reminders: queued 3 chunks'))
+        summary.assert_called_once()
+        counts, job = summary.call_args.args
+        self.assertEqual((sorted(counts), job), ([1, 2, 2], 'payment reminders'))
+        self.assertEqual(tasks.summarize_job.run(counts, job), {'job': 'payment reminders', 'chunks': 3, 'sent': 5})
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_nothing_to_send_skips_the_chord(self):
+        with mock.patch.object(tasks, 'chord') as chord:
+            self.assertEqual(tasks.send_payment_reminders(), 'payment reminders: nothing to send')
+        chord.assert_not_called()
+
+
+class BulkVerifyPaymentsTests(TestCase):
+    """PaymentViewSet.bulk_verify reports every id and keeps the cached rollup current"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('verifier', 'verifier@example.com', 'x')
+        self.month = timezone.now().date().replace(day=1)
+        self.pending = [self.payment(f'V{i:03d}', 'pending') for i in range(2)]
+        self.done = self.payment('V100', 'completed')
+
+    def payment(self, receipt, status):
+        return Payment.objects.create(
+            student=make_student(receipt.lower()), amount=500, payment_type='monthly_fee', status=status,
+            receipt_number=receipt, for_month=self.month, due_date=self.month,
+        )
+
+    @mock.patch('lms.views.send_payment_verification_emails')
+    def test_outcome_per_id(self, emails):
+        missing_id = self.done.id + 1000
+        self.assertEqual(get_admin_rollup()['pending_payments'], 2)
+        self.assertEqual(get_admin_rollup()['monthly_revenue'], 500)
+        ids = [self.pending[0].id, self.done.id, missing_id, self.pending[1].id, self.pending[0].id]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client_for(self.admin).post(f'{API}/payments/bulk_verify/', {'payment_ids': ids}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'payment_id': self.pending[0].id, 'outcome': 'verified'},
+            {'payment_id': self.done.id, 'outcome': 'already_verified'},
+            {'payment_id': missing_id, 'outcome': 'not_found'},
+            {'payment_id': self.pending[1].id, 'outcome': 'verified'},
+        ])
+        for payment in self.pending:
+            payment.refresh_from_db()
+            self.assertEqual((payment.status, payment.verified_by), ('completed', self.admin))
+            self.assertIsNotNone(payment.verified_at)
+        self.done.refresh_from_db()
+        self.assertIsNone(self.done.verified_by)
+        emails.delay.assert_called_once_with(sorted(p.id for p in self.pending), [])
+
+        rollup = get_admin_rollup()
+        self.assertEqual((rollup['pending_payments'], rollup['monthly_revenue']), (0, 1500))
+
+    @mock.patch('lms.views.send_payment_verification_emails')
+    def test_nothing_to_verify(self, emails):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client_for(self.admin).post(
+                f'{API}/payments/bulk_verify/', {'payment_ids': [self.done.id]}, format='json'
+            )
+        self.assertEqual(response.data['results'], [{'payment_id': self.done.id, 'outcome': 'already_verified'}])
+        emails.delay.assert_not_called()
+
+    def test_rejects_bad_input_and_non_staff(self):
+        admin = client_for(self.admin)
+        for body in ({}, {'payment_ids': []}, {'payment_ids': ['x']}, {'payment_ids': 3}):
+            with self.subTest(body=body):
+                self.assertEqual(admin.post(f'{API}/payments/bulk_verify/', body, format='json').status_code, 400)
+        student = client_for(self.pending[0].student)
+        response = student.post(f'{API}/payments/bulk_verify/', {'payment_ids': [self.pending[0].id]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class QuizRegradeTests(TestCase):
+    """Fixing the answer key drops the cached key and regrade rescores submitted attempts"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('grader', 'grader@example.com', 'x')
+        self.quiz = Quiz.objects.create(
+            class_session=make_session(make_course('Chemistry'), -1), title='Bonds',
+            total_marks=2, passing_marks=2, is_published=True,
+        )
+        self.q1, self.q2 = [
+            QuizQuestion.objects.create(quiz=self.quiz, question_text=f'Q{i}', correct_answer=answer, marks=1, order=i)
+            for i, answer in enumerate(['a', 'b'])
+        ]
+
+    def submit(self, name, answers):
+        student = make_student(name)
+        QuizAttempt.objects.create(quiz=self.quiz, student=student)
+        response = client_for(student).post(f'{API}/quizzes/{self.quiz.id}/submit_attempt/', {
+            'answers': {str(self.q1.id): answers[0], str(self.q2.id): answers[1]}, 'time_taken_seconds': 30,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        return student
+
+    def scores(self):
+        return {
+            attempt.student.user.username: (attempt.score, attempt.percentage, attempt.is_passed)
+            for attempt in QuizAttempt.objects.filter(quiz=self.quiz).select_related('student__user')
+        }
+
+    def test_regrade_after_answer_fix(self):
+        self.submit('right', ['A ', 'b'])
+        self.submit('wrong', ['a', 'c'])
+        self.assertEqual(self.scores(), {
+            'right': (2, Decimal('100.00'), True),
+            'wrong': (1, Decimal('50.00'), False),
+        })
+        self.assertIsNotNone(cache.get(answer_key_cache_key(self.quiz.id)))
+
+        # The key said 'b'; the right answer was 'c'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.q2.correct_answer = 'c'
+            self.q2.save()
+        self.assertIsNone(cache.get(answer_key_cache_key(self.quiz.id)))
+        self.assertEqual(get_answer_key(self.quiz.id)['answers'][str(self.q2.id)], ('c', 1))
+
+        response = client_for(self.admin).post(f'{API}/quizzes/{self.quiz.id}/regrade/')
+        self.assertEqual(response.data, {'graded': 2, 'changed': 2})
+        self.assertEqual(self.scores(), {
+            'right': (1, Decimal('50.00'), False),
+            'wrong': (2, Decimal('100.00'), True),
+        })
+
+        # Nothing changed since, so a second pass writes nothing
+        response = client_for(self.admin).post(f'{API}/quizzes/{self.quiz.id}/regrade/')
+        self.assertEqual(response.data, {'graded': 2, 'changed': 0})
+
+    def test_regrade_is_admin_only(self):
+        student = self.submit('student', ['a', 'b'])
+        self.assertEqual(client_for(student).post(f'{API}/quizzes/{self.quiz.id}/regrade/').status_code, 403)
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages neither repeat nor skip rows, and ?fields= trims or rejects"""
+
+    def setUp(self):
+        self.admin = client_for(User.objects.create_superuser('pager', 'pager@example.com', 'x'))
+        self.student = make_student('paged')
+        self.month = timezone.now().date().replace(day=1)
+        self.payments = [self.payment(i) for i in range(7)]
+
+    def payment(self, i):
+        return Payment.objects.create(
+            student=self.student, amount=100 + i, payment_type='monthly_fee', status='pending',
+            receipt_number=f'K{i:03d}', for_month=self.month, due_date=self.month,
+        )
+
+    def walk(self, url, between_pages=None):
+        ids, pages = [], 0
+        while url:
+            response = self.admin.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+            pages += 1
+            if between_pages:
+                between_pages(pages)
+        return ids, pages
+
+    def test_pages_are_stable_while_rows_are_added(self):
+        expected = sorted((p.id for p in self.payments), reverse=True)
+        ids, pages = self.walk(f'{API}/payments/?page_size=3', lambda page: self.payment(100 + page))
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids, expected)
+
+    def test_non_unique_ordering_with_id_tiebreak(self):
+        course = make_course('Paging')
+        sessions = [make_session(course, -days) for days in (1, 2)]
+        for i in range(5):
+            student = make_student(f'tied_{i}')
+            for session in sessions:
+                Attendance.objects.create(student=student, class_session=session, date=session.date, status='present')
+        expected = list(Attendance.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+        with mock.patch.object(KeysetPagination, 'ordering', ('-date', '-id')):
+            ids, _ = self.walk(f'{API}/attendance/?page_size=3')
+        self.assertEqual(ids, expected)
+
+        # Background reads: chunk boundaries inside a run of equal dates
+        rows = keyset_iterator(Attendance.objects.all(), ['date', 'id'], chunk_size=3)
+        self.assertEqual([row.id for row in rows], expected[::-1])
+
+    def test_fields_filter(self):
+        response = self.admin.get(f'{API}/payments/?fields=id,status&page_size=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([set(row) for row in response.data['results']], [{'id', 'status'}] * 2)
+
+        response = self.admin.get(f'{API}/payments/{self.payments[0].id}/?fields=amount')
+        self.assertEqual(response.data, {'amount': '100.00'})
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.admin.get(f'{API}/payments/?fields=id,password,bogus')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bogus', str(response.data['fields']))
+        self.assertIn('password', str(response.data['fields']))
@@ -5,11 +5,17 @@ LMS API Views
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.db.models import Count, Sum, Q
+from django.db.models.functions import TruncMonth
+from django.core.cache import cache
 from django.core.mail import send_mail, EmailMultiAlternatives
 from datetime import timedelta, datetime
+import uuid
 
 from .models import (
     Student, Course, ClassSession, Attendance,
@@ -24,13 +30,75 @@ from .serializers import (
     ReferralTrackingSerializer, ReferralStatsSerializer, EmailLogSerializer,
     StudentEnrollmentSerializer, StudentDashboardSerializer, AdminDashboardSerializer,
     QuizSerializer, QuizQuestionAdminSerializer, QuizAttemptSerializer, 
-    QuizSubmitSerializer, EmailVerificationSerializer, EnrollmentRequestSerializer
+    QuizSubmitSerializer, EmailVerificationSerializer, EnrollmentRequestSerializer,
+    request_student
 )
 from .email_service import (
     send_welcome_email, send_payment_receipt_email,
-    send_test_result_email, send_quiz_result_email,
+    send_quiz_result_email,
     send_verification_email
 )
+from .dashboard import get_admin_rollup, refresh_admin_rollup, refresh_payment_rollup
+from .exports import stream_csv, stream_export, stream_ndjson
+from .grading import GRADED_FIELDS, grade_attempt, regrade_quiz
+from .pagination import KeysetPagination, SparseFieldsMixin
+from .payment_verification import verify_payments
+from .ranking import DEFAULT_TIE_POLICY, TIE_POLICIES, rank_test_results, with_percentile
+from .tasks import result_email_progress_key, send_payment_verification_emails, send_test_result_emails
+
+
+User = get_user_model()
+
+# Widest range the finance report accepts in one request
+FINANCE_MAX_YEARS = 10
+# Years the finance report accepts (to_year + 1 must still be a valid date)
+FINANCE_MIN_YEAR = 2000
+FINANCE_MAX_YEAR = 9998
+
+# Export columns: (header, values_list lookup)
+ATTENDANCE_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('date', 'date'),
+    ('status', 'status'),
+    ('student_id', 'student_id'),
+    ('first_name', 'student__user__first_name'),
+    ('last_name', 'student__user__last_name'),
+    ('session_id', 'class_session_id'),
+    ('session_title', 'class_session__title'),
+    ('course', 'class_session__course__title'),
+    ('notes', 'notes'),
+    ('marked_at', 'marked_at'),
+]
+PAYMENT_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('receipt_number', 'receipt_number'),
+    ('student_id', 'student_id'),
+    ('first_name', 'student__user__first_name'),
+    ('last_name', 'student__user__last_name'),
+    ('amount', 'amount'),
+    ('payment_type', 'payment_type'),
+    ('status', 'status'),
+    ('payment_method', 'payment_method'),
+    ('utr_number', 'utr_number'),
+    ('for_month', 'for_month'),
+    ('due_date', 'due_date'),
+    ('payment_date', 'payment_date'),
+    ('verified_at', 'verified_at'),
+]
+TEST_RESULT_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('test_id', 'test_id'),
+    ('test_title', 'test__title'),
+    ('test_date', 'test__date'),
+    ('course', 'test__course__title'),
+    ('student_id', 'student_id'),
+    ('first_name', 'student__user__first_name'),
+    ('last_name', 'student__user__last_name'),
+    ('marks_obtained', 'marks_obtained'),
+    ('total_marks', 'test__total_marks'),
+    ('percentage', 'percentage'),
+    ('rank', 'rank'),
+]
 
 
 class IsAdminUser(permissions.BasePermission):
@@ -39,10 +107,51 @@ class IsAdminUser(permissions.BasePermission):
         return request.user and request.user.is_staff
 
 
-class StudentViewSet(viewsets.ModelViewSet):
+def attended_session_ids(request, sessions=None):
+    """Ids of sessions the requesting student was present at, or None for non-students"""
+    student = request_student(request)
+    if student is None:
+        return None
+    attended = Attendance.objects.filter(student=student, status='present')
+    if sessions is not None:
+        attended = attended.filter(class_session__in=sessions)
+    return set(attended.values_list('class_session_id', flat=True))
+
+
+def export_params(request):
+    """
+    (format, gzip, date_from, date_to) from ?export=csv|ndjson, ?gzip=1 and
+    ?from= / ?to= (YYYY-MM-DD, inclusive). Raises ValueError on bad input.
+    """
+    export = request.query_params.get('export', 'csv')
+    if export not in ('csv', 'ndjson'):
+        raise ValueError('export must be csv or ndjson')
+    dates = []
+    for param in ('from', 'to'):
+        value = request.query_params.get(param)
+        parsed = parse_date(value) if value else None
+        if value and parsed is None:
+            raise ValueError(f'{param} must be a YYYY-MM-DD date')
+        dates.append(parsed)
+    compress = request.query_params.get('gzip') in ('1', 'true')
+    return export, compress, dates[0], dates[1]
+
+
+def date_range(field, date_from, date_to):
+    """Filter kwargs for an inclusive date range on `field`"""
+    bounds = {}
+    if date_from:
+        bounds[f'{field}__gte'] = date_from
+    if date_to:
+        bounds[f'{field}__lte'] = date_to
+    return bounds
+
+
+class StudentViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """API endpoint for managing students"""
     queryset = Student.objects.all()
     serializer_class = StudentSerializer
+    pagination_class = KeysetPagination
     
     def get_permissions(self):
         if self.action in ['create']:
@@ -57,9 +166,9 @@ class StudentViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Student.objects.all()
+            return Student.objects.select_related('user')
         # Students can only see their own profile
-        return Student.objects.filter(user=user)
+        return Student.objects.filter(user=user).select_related('user')
     
     def perform_create(self, serializer):
         student = serializer.save()
@@ -115,6 +224,26 @@ class CourseViewSet(viewsets.ModelViewSet):
             return [permissions.AllowAny()]
         return [IsAdminUser()]
     
+    def get_queryset(self):
+        return Course.objects.filter(is_active=True).annotate(
+            active_enrollment_count=Count(
+                'enrolled_students',
+                filter=Q(enrolled_students__is_active=True)
+            )
+        )
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        student = request_student(self.request)
+        if student and self.action in ['list', 'retrieve']:
+            context['enrolled_course_ids'] = set(
+                StudentEnrollment.objects.filter(
+                    student=student,
+                    is_active=True
+                ).values_list('course_id', flat=True)
+            )
+        return context
+    
     @action(detail=True, methods=['post'])
     def enroll(self, request, pk=None):
         """Enroll current student in course"""
@@ -149,11 +278,14 @@ class CourseViewSet(viewsets.ModelViewSet):
     def sessions(self, request, pk=None):
         """Get all class sessions for this course"""
         course = self.get_object()
-        sessions = course.sessions.all()
+        sessions = course.sessions.select_related('course')
         serializer = ClassSessionSerializer(
             sessions, 
             many=True, 
-            context={'request': request}
+            context={
+                'request': request,
+                'attended_session_ids': attended_session_ids(request, course.sessions.all()),
+            }
         )
         return Response(serializer.data)
 
@@ -169,7 +301,7 @@ class ClassSessionViewSet(viewsets.ModelViewSet):
         return [IsAdminUser()]
     
     def get_queryset(self):
-        queryset = ClassSession.objects.all()
+        queryset = ClassSession.objects.select_related('course')
         
         # Filter by course
         course_id = self.request.query_params.get('course')
@@ -184,6 +316,12 @@ class ClassSessionViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ['list', 'retrieve']:
+            context['attended_session_ids'] = attended_session_ids(self.request)
+        return context
+    
     @action(detail=True, methods=['post'])
     def mark_attendance(self, request, pk=None):
         """Mark attendance for current student"""
@@ -255,14 +393,15 @@ class ClassSessionViewSet(viewsets.ModelViewSet):
         })
 
 
-class AttendanceViewSet(viewsets.ModelViewSet):
+class AttendanceViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """API endpoint for managing attendance"""
     queryset = Attendance.objects.all()
     serializer_class = AttendanceSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAdminUser]
     
     def get_queryset(self):
-        queryset = Attendance.objects.all()
+        queryset = Attendance.objects.select_related('student__user', 'class_session')
         
         # Filter by student
         student_id = self.request.query_params.get('student')
@@ -281,6 +420,24 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream attendance rows (same ?student= / ?date= / ?session= filters as the list).
+        
+        ?from=2025-01-01&to=2025-12-31   inclusive date range
+        ?export=csv | ndjson   ?gzip=1
+        """
+        try:
+            export, compress, date_from, date_to = export_params(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = self.get_queryset().filter(
+            **date_range('date', date_from, date_to)
+        ).order_by('date', 'id')
+        return stream_export(queryset, ATTENDANCE_EXPORT_COLUMNS, 'attendance', export, compress)
+    
     @action(detail=False, methods=['post'])
     def bulk_mark(self, request):
         """Mark attendance for multiple students"""
@@ -301,21 +458,76 @@ class AttendanceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        created_count = 0
+        # Validate rows; student ids are checked in one query
+        requested_ids = set()
         for item in attendance_data:
-            Attendance.objects.update_or_create(
-                student_id=item['student_id'],
+            try:
+                requested_ids.add(int(item.get('student_id')))
+            except (TypeError, ValueError, AttributeError):
+                pass
+        known_ids = set(Student.objects.filter(id__in=requested_ids).values_list('id', flat=True))
+        valid_statuses = {choice for choice, _ in Attendance.STATUS_CHOICES}
+        
+        results = []
+        rows = {}  # student_id -> index into results (last entry for a student wins)
+        for item in attendance_data:
+            student_id = item.get('student_id') if isinstance(item, dict) else None
+            try:
+                student_id = int(student_id)
+            except (TypeError, ValueError):
+                results.append({'student_id': student_id, 'outcome': 'rejected', 'error': 'Invalid student_id'})
+                continue
+            if student_id not in known_ids:
+                results.append({'student_id': student_id, 'outcome': 'rejected', 'error': 'Student not found'})
+                continue
+            if item.get('status') not in valid_statuses:
+                results.append({'student_id': student_id, 'outcome': 'rejected', 'error': 'Invalid status'})
+                continue
+            if student_id in rows:
+                results[rows[student_id]].update(outcome='superseded')
+            rows[student_id] = len(results)
+            results.append({'student_id': student_id, 'status': item['status']})
+        
+        if not rows:
+            return Response(
+                {'error': 'No valid attendance rows', 'results': results},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # One upsert on (student, date, class_session)
+        with transaction.atomic():
+            existing = set(Attendance.objects.filter(
                 class_session=session,
                 date=session.date,
-                defaults={
-                    'status': item['status'],
-                    'marked_by': request.user
-                }
+                student_id__in=rows.keys()
+            ).values_list('student_id', flat=True))
+            Attendance.objects.bulk_create(
+                [
+                    Attendance(
+                        student_id=student_id,
+                        class_session=session,
+                        date=session.date,
+                        status=results[index]['status'],
+                        marked_by=request.user
+                    )
+                    for student_id, index in rows.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['student', 'date', 'class_session'],
+                update_fields=['status', 'marked_by']
             )
-            created_count += 1
         
+        for student_id, index in rows.items():
+            results[index]['outcome'] = 'updated' if student_id in existing else 'created'
+        
+        updated_count = len(existing)
+        created_count = len(rows) - updated_count
         return Response({
-            'message': f'Attendance marked for {created_count} students'
+            'message': f'Attendance marked for {len(rows)} students',
+            'created': created_count,
+            'updated': updated_count,
+            'rejected': sum(1 for r in results if r['outcome'] == 'rejected'),
+            'results': results,
         })
 
 
@@ -329,59 +541,141 @@ class TestViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated()]
         return [IsAdminUser()]
     
+    def get_queryset(self):
+        queryset = Test.objects.select_related('course')
+        if self.action in ['list', 'retrieve']:
+            queryset = queryset.annotate(result_count=Count('results'))
+        return queryset
+    
     @action(detail=True, methods=['get'])
     def results(self, request, pk=None):
         """Get all results for this test"""
         test = self.get_object()
-        results = test.results.all()
+        results = test.results.select_related('student__user', 'test')
+        if request.query_params.get('percentile') in ('1', 'true'):
+            results = with_percentile(results)
+            serializer = TestResultSerializer(results, many=True)
+            data = serializer.data
+            for row, result in zip(data, results):
+                row['percentile'] = round(result.percentile, 2)
+            return Response(data)
         serializer = TestResultSerializer(results, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export_results(self, request):
+        """
+        Stream test results.
+        
+        ?test= ?course=                  optional filters
+        ?from=2025-01-01&to=2025-12-31   inclusive test-date range
+        ?export=csv | ndjson   ?gzip=1
+        """
+        try:
+            export, compress, date_from, date_to = export_params(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = TestResult.objects.filter(**date_range('test__date', date_from, date_to))
+        test_id = request.query_params.get('test')
+        if test_id:
+            queryset = queryset.filter(test_id=test_id)
+        course_id = request.query_params.get('course')
+        if course_id:
+            queryset = queryset.filter(test__course_id=course_id)
+        queryset = queryset.order_by('test_id', 'id')
+        return stream_export(queryset, TEST_RESULT_EXPORT_COLUMNS, 'test_results', export, compress)
+    
     @action(detail=True, methods=['post'])
     def submit_marks(self, request, pk=None):
         """Submit marks for students (admin only)"""
         test = self.get_object()
         marks_data = request.data.get('marks', [])  # List of {student_id, marks, remarks}
+        tie_policy = request.data.get('tie_policy') or DEFAULT_TIE_POLICY
+        if tie_policy not in TIE_POLICIES:
+            return Response(
+                {'error': f"tie_policy must be one of: {', '.join(TIE_POLICIES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        created_results = []
+        # Validate rows; student ids are checked in one query
+        rows = {}
         for item in marks_data:
-            result, created = TestResult.objects.update_or_create(
+            try:
+                rows[int(item['student_id'])] = (int(item['marks']), item.get('remarks', ''))
+            except (KeyError, TypeError, ValueError):
+                return Response(
+                    {'error': 'Each mark needs an integer student_id and marks'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        unknown = set(rows) - set(Student.objects.filter(id__in=rows.keys()).values_list('id', flat=True))
+        if unknown:
+            return Response(
+                {'error': 'Students not found', 'student_ids': sorted(unknown)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # One upsert on (test, student), then ranks; emails go out after commit
+        email_task_id = str(uuid.uuid4()) if rows else None
+        with transaction.atomic():
+            existing = set(TestResult.objects.filter(
                 test=test,
-                student_id=item['student_id'],
-                defaults={
-                    'marks_obtained': item['marks'],
-                    'remarks': item.get('remarks', '')
-                }
+                student_id__in=rows.keys()
+            ).values_list('student_id', flat=True))
+            TestResult.objects.bulk_create(
+                [
+                    TestResult(
+                        test=test,
+                        student_id=student_id,
+                        marks_obtained=marks,
+                        remarks=remarks,
+                        percentage=TestResult.percentage_for(marks, test.total_marks)
+                    )
+                    for student_id, (marks, remarks) in rows.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['test', 'student'],
+                update_fields=['marks_obtained', 'remarks', 'percentage', 'updated_at']
             )
-            created_results.append({
-                'student_id': item['student_id'],
-                'marks': item['marks'],
-                'created': created
-            })
             
-            # Send email notification
-            send_test_result_email(result)
-        
-        # Calculate ranks
-        self._calculate_ranks(test)
-        
+            # Calculate ranks
+            self._calculate_ranks(test, tie_policy)
+            
+            if email_task_id:
+                transaction.on_commit(lambda: send_test_result_emails.apply_async(
+                    args=[test.id, list(rows.keys())],
+                    task_id=email_task_id
+                ))
+        
+        created_results = [
+            {'student_id': student_id, 'marks': marks, 'created': student_id not in existing}
+            for student_id, (marks, _) in rows.items()
+        ]
         return Response({
             'message': f'Marks submitted for {len(created_results)} students',
-            'results': created_results
+            'results': created_results,
+            'email_task_id': email_task_id
         })
     
-    def _calculate_ranks(self, test):
-        """Calculate ranks for all results of a test"""
-        results = TestResult.objects.filter(test=test).order_by('-marks_obtained')
-        for rank, result in enumerate(results, 1):
-            result.rank = rank
-            result.save(update_fields=['rank'])
+    @action(detail=True, methods=['get'])
+    def email_progress(self, request, pk=None):
+        """Progress of the result-email job queued by submit_marks"""
+        task_id = request.query_params.get('task_id')
+        progress = cache.get(result_email_progress_key(task_id)) if task_id else None
+        if progress is None:
+            return Response({'state': 'queued'})
+        return Response(progress)
+    
+    def _calculate_ranks(self, test, tie_policy=None):
+        """Calculate ranks for all results of a test (one UPDATE)"""
+        return rank_test_results(test, tie_policy)
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """API endpoint for managing payments"""
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = KeysetPagination
     
     def get_permissions(self):
         if self.action in ['create']:
@@ -398,9 +692,9 @@ class PaymentViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Payment.objects.all()
+            return Payment.objects.select_related('student__user')
         # Students can only see their own payments
-        return Payment.objects.filter(student__user=user)
+        return Payment.objects.filter(student__user=user).select_related('student__user')
     
     def perform_create(self, serializer):
         payment = serializer.save()
@@ -422,6 +716,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
             )
         
         payment.verify(request.user)
+        refresh_payment_rollup()
         
         # Send receipt email
         send_payment_receipt_email(payment)
@@ -431,6 +726,58 @@ class PaymentViewSet(viewsets.ModelViewSet):
             'receipt_number': payment.receipt_number
         })
     
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Stream payments.
+        
+        ?from=2025-01-01&to=2025-12-31   inclusive for_month range
+        ?status=                         optional filter
+        ?export=csv | ndjson   ?gzip=1
+        """
+        try:
+            export, compress, date_from, date_to = export_params(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = Payment.objects.filter(**date_range('for_month', date_from, date_to))
+        payment_status = request.query_params.get('status')
+        if payment_status:
+            queryset = queryset.filter(status=payment_status)
+        queryset = queryset.order_by('for_month', 'id')
+        return stream_export(queryset, PAYMENT_EXPORT_COLUMNS, 'payments', export, compress)
+    
+    @action(detail=False, methods=['post'])
+    def bulk_verify(self, request):
+        """Verify many payments at once (admin only)"""
+        payment_ids = request.data.get('payment_ids', [])
+        if not isinstance(payment_ids, list) or not payment_ids:
+            return Response(
+                {'error': 'payment_ids list required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            payment_ids = [int(payment_id) for payment_id in payment_ids]
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'payment_ids must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        outcome = verify_payments(payment_ids, request.user)
+        if outcome['verified_ids']:
+            refresh_payment_rollup()
+            transaction.on_commit(lambda: send_payment_verification_emails.delay(
+                outcome['verified_ids'], outcome['referrals_activated']
+            ))
+        
+        return Response({
+            'message': f"Verified {len(outcome['verified_ids'])} payments",
+            'results': outcome['results'],
+            'referrals_activated': len(outcome['referrals_activated']),
+            'referrers_updated': outcome['referrers_updated'],
+        })
+    
     @action(detail=False, methods=['get'])
     def pending(self, request):
         """Get all pending payments (admin only)"""
@@ -440,7 +787,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        pending = Payment.objects.filter(status='pending')
+        pending = Payment.objects.filter(status='pending').select_related('student__user')
         serializer = self.get_serializer(pending, many=True)
         return Response(serializer.data)
     
@@ -455,7 +802,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        payments = Payment.objects.filter(student=student).order_by('-payment_date')
+        payments = Payment.objects.filter(student=student).select_related('student__user').order_by('-payment_date')
         serializer = self.get_serializer(payments, many=True)
         return Response(serializer.data)
 
@@ -474,7 +821,9 @@ class ReferralViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        referrals = ReferralTracking.objects.filter(referrer=student)
+        referrals = ReferralTracking.objects.filter(referrer=student).select_related(
+            'referrer__user', 'referred_student__user'
+        )
         serializer = ReferralTrackingSerializer(referrals, many=True)
         return Response(serializer.data)
     
@@ -489,37 +838,8 @@ class ReferralViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        total_referrals = ReferralTracking.objects.filter(referrer=student).count()
-        active_referrals = ReferralTracking.objects.filter(
-            referrer=student, 
-            status='paid'
-        ).count()
-        pending_referrals = ReferralTracking.objects.filter(
-            referrer=student, 
-            status='pending'
-        ).count()
-        
-        # Calculate next milestone
-        if active_referrals < 5:
-            next_milestone = 5
-            referrals_to_next = 5 - active_referrals
-        elif active_referrals < 10:
-            next_milestone = 10
-            referrals_to_next = 10 - active_referrals
-        else:
-            next_milestone = active_referrals + 5
-            referrals_to_next = 5
-        
-        data = {
-            'total_referrals': total_referrals,
-            'active_referrals': active_referrals,
-            'pending_referrals': pending_referrals,
-            'current_fee': student.current_monthly_fee,
-            'total_discount': student.total_referral_discount,
-            'total_earnings': student.total_earnings,
-            'next_milestone': next_milestone,
-            'referrals_to_next_milestone': referrals_to_next,
-        }
+        # Counters live on the student row — no ReferralTracking scan
+        data = student.referral_stats()
         
         serializer = ReferralStatsSerializer(data)
         return Response(serializer.data)
@@ -564,171 +884,226 @@ class DashboardViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Get enrolled courses
-        enrollments = StudentEnrollment.objects.filter(
-            student=student,
-            is_active=True
-        )
-        courses = [e.course for e in enrollments]
-        
-        # Get upcoming classes
+        return Response(self._student_dashboard_data(student, request))
+    
+    def _student_dashboard_data(self, student, request):
+        """
+        Fixed number of queries regardless of how many courses, sessions,
+        payments or referrals the student has:
+        courses, upcoming sessions, attended sessions, payments,
+        attendance aggregate, test results (referral stats come from the student row).
+        """
         today = timezone.now().date()
-        upcoming = ClassSession.objects.filter(
-            course__in=courses,
-            date__gte=today
-        ).order_by('date', 'start_time')[:5]
         
-        # Get recent payments
+        # Enrolled courses with their active enrollment count in one query
+        courses = list(
+            Course.objects.filter(
+                id__in=StudentEnrollment.objects.filter(
+                    student=student,
+                    is_active=True
+                ).values('course_id')
+            ).annotate(
+                active_enrollment_count=Count(
+                    'enrolled_students',
+                    filter=Q(enrolled_students__is_active=True)
+                )
+            )
+        )
+        course_ids = {c.id for c in courses}
+        
+        # Upcoming classes + which of them the student attended
+        upcoming = list(
+            ClassSession.objects.filter(
+                course_id__in=course_ids,
+                date__gte=today
+            ).select_related('course').order_by('date', 'start_time')[:5]
+        )
+        attended_session_ids = set(
+            Attendance.objects.filter(
+                student=student,
+                status='present',
+                class_session_id__in=[s.id for s in upcoming]
+            ).values_list('class_session_id', flat=True)
+        ) if upcoming else set()
+        
+        # Recent payments / test results
         payments = Payment.objects.filter(
             student=student
-        ).order_by('-payment_date')[:5]
-        
-        # Get attendance stats
-        attendance_stats = {
-            'total_classes': Attendance.objects.filter(student=student).count(),
-            'present': Attendance.objects.filter(student=student, status='present').count(),
-            'absent': Attendance.objects.filter(student=student, status='absent').count(),
-            'leave': Attendance.objects.filter(student=student, status='leave').count(),
-        }
+        ).select_related('student__user').order_by('-payment_date')[:5]
         
-        # Get test results
         test_results = TestResult.objects.filter(
             student=student
-        ).order_by('-created_at')[:5]
-        
-        # Get referral stats
-        total_referrals = ReferralTracking.objects.filter(referrer=student).count()
-        active_referrals = ReferralTracking.objects.filter(
-            referrer=student, 
-            status='paid'
-        ).count()
-        
-        next_milestone = 5 if active_referrals < 5 else (10 if active_referrals < 10 else active_referrals + 5)
-        referrals_to_next = next_milestone - active_referrals
-        
-        referral_stats = {
-            'total_referrals': total_referrals,
-            'active_referrals': active_referrals,
-            'pending_referrals': total_referrals - active_referrals,
-            'current_fee': student.current_monthly_fee,
-            'total_discount': student.total_referral_discount,
-            'total_earnings': student.total_earnings,
-            'next_milestone': next_milestone,
-            'referrals_to_next_milestone': referrals_to_next,
+        ).select_related('student__user', 'test').order_by('-created_at')[:5]
+        
+        # Attendance stats — one conditional aggregate instead of four COUNTs
+        attendance_stats = Attendance.objects.filter(student=student).aggregate(
+            total_classes=Count('id'),
+            present=Count('id', filter=Q(status='present')),
+            absent=Count('id', filter=Q(status='absent')),
+            leave=Count('id', filter=Q(status='leave')),
+        )
+        
+        referral_stats = student.referral_stats()
+        
+        context = {
+            'request': request,
+            'enrolled_course_ids': course_ids,
+            'attended_session_ids': attended_session_ids,
         }
         
-        data = {
+        return {
             'student': StudentSerializer(student).data,
-            'enrolled_courses': CourseSerializer(courses, many=True, context={'request': request}).data,
-            'upcoming_classes': ClassSessionSerializer(upcoming, many=True, context={'request': request}).data,
+            'enrolled_courses': CourseSerializer(courses, many=True, context=context).data,
+            'upcoming_classes': ClassSessionSerializer(upcoming, many=True, context=context).data,
             'recent_payments': PaymentSerializer(payments, many=True).data,
             'attendance_stats': attendance_stats,
             'test_results': TestResultSerializer(test_results, many=True).data,
             'referral_stats': referral_stats,
         }
-        
-        return Response(data)
     
     @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
     def admin(self, request):
         """Admin dashboard data"""
-        today = timezone.now().date()
-        current_month = today.replace(day=1)
-        
-        # Statistics
-        total_students = Student.objects.count()
-        active_students = Student.objects.filter(is_active=True).count()
-        total_courses = Course.objects.filter(is_active=True).count()
-        
-        # Sessions this month
-        total_sessions_this_month = ClassSession.objects.filter(
-            date__year=today.year,
-            date__month=today.month
-        ).count()
-        
-        # Pending payments
-        pending_payments = Payment.objects.filter(status='pending').count()
-        
-        # Monthly revenue
-        monthly_revenue = Payment.objects.filter(
-            status='completed',
-            for_month=current_month
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        # Counts/sums come from the cached rollup (lms/dashboard.py) so this
+        # stays flat as Attendance and Payment grow; ?refresh=1 rebuilds it.
+        if request.query_params.get('refresh'):
+            rollup = refresh_admin_rollup()
+        else:
+            rollup = get_admin_rollup()
         
         # Recent enrollments
-        recent_enrollments = Student.objects.order_by('-enrollment_date')[:5]
+        recent_enrollments = Student.objects.select_related('user').order_by('-enrollment_date')[:5]
         
         # Recent payments
         recent_payments = Payment.objects.filter(
             status='completed'
-        ).order_by('-verified_at')[:5]
-        
-        # Attendance summary for this month
-        attendance_summary = {
-            'total_marked': Attendance.objects.filter(
-                date__year=today.year,
-                date__month=today.month
-            ).count(),
-            'present': Attendance.objects.filter(
-                date__year=today.year,
-                date__month=today.month,
-                status='present'
-            ).count(),
-            'absent': Attendance.objects.filter(
-                date__year=today.year,
-                date__month=today.month,
-                status='absent'
-            ).count(),
-        }
+        ).select_related('student__user').order_by('-verified_at')[:5]
         
         data = {
-            'total_students': total_students,
-            'active_students': active_students,
-            'total_courses': total_courses,
-            'total_sessions_this_month': total_sessions_this_month,
-            'pending_payments': pending_payments,
-            'monthly_revenue': monthly_revenue,
+            'total_students': rollup['total_students'],
+            'active_students': rollup['active_students'],
+            'total_courses': rollup['total_courses'],
+            'total_sessions_this_month': rollup['total_sessions_this_month'],
+            'pending_payments': rollup['pending_payments'],
+            'monthly_revenue': rollup['monthly_revenue'],
             'recent_enrollments': StudentSerializer(recent_enrollments, many=True).data,
             'recent_payments': PaymentSerializer(recent_payments, many=True).data,
-            'attendance_summary': attendance_summary,
+            'attendance_summary': rollup['attendance_summary'],
+            'computed_at': rollup['computed_at'],
         }
         
         return Response(data)
     
     @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
     def finance(self, request):
-        """Financial reports"""
-        year = int(request.query_params.get('year', timezone.now().year))
-        
-        monthly_data = []
-        for month in range(1, 13):
-            payments = Payment.objects.filter(
-                status='completed',
-                for_month__year=year,
-                for_month__month=month
+        """
+        Financial reports — one TruncMonth group-by over completed payments.
+        
+        ?year=2025                      single year (default: current year)
+        ?from_year=2021&to_year=2025    multi-year range (max 10 years)
+        ?export=csv | ndjson            stream month × payment type rows (?gzip=1 to compress)
+        """
+        current_year = timezone.now().year
+        try:
+            from_year = int(request.query_params.get('from_year', request.query_params.get('year', current_year)))
+            to_year = int(request.query_params.get('to_year', from_year))
+        except ValueError:
+            return Response(
+                {'error': 'year, from_year and to_year must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            monthly_data.append({
+        
+        if not all(FINANCE_MIN_YEAR <= year <= FINANCE_MAX_YEAR for year in (from_year, to_year)):
+            return Response(
+                {'error': f'Years must be between {FINANCE_MIN_YEAR} and {FINANCE_MAX_YEAR}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if to_year < from_year or to_year - from_year >= FINANCE_MAX_YEARS:
+            return Response(
+                {'error': f'Year range must be ascending and at most {FINANCE_MAX_YEARS} years'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        rows = Payment.objects.filter(
+            status='completed',
+            for_month__gte=datetime(from_year, 1, 1).date(),
+            for_month__lt=datetime(to_year + 1, 1, 1).date()
+        ).annotate(
+            month=TruncMonth('for_month')
+        ).values('month', 'payment_type').annotate(
+            total_collected=Sum('amount'),
+            number_of_payments=Count('id')
+        ).order_by('month', 'payment_type')
+        
+        # At most FINANCE_MAX_YEARS * 12 months x payment types rows, so they are
+        # read in one go rather than through a server-side cursor
+        export = request.query_params.get('export')
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        if export == 'csv':
+            return stream_csv(
+                ['month', 'payment_type', 'total_collected', 'number_of_payments'],
+                (
+                    (r['month'].strftime('%Y-%m'), r['payment_type'], r['total_collected'], r['number_of_payments'])
+                    for r in rows
+                ),
+                f'finance_{from_year}_{to_year}',
+                compress
+            )
+        if export == 'ndjson':
+            return stream_ndjson(
+                (dict(r, month=r['month'].strftime('%Y-%m')) for r in rows),
+                f'finance_{from_year}_{to_year}',
+                compress
+            )
+        
+        # Zero-filled month grid, then fold the grouped rows into it
+        months = {
+            (year, month): {
+                'year': year,
                 'month': month,
-                'total_collected': payments.aggregate(total=Sum('amount'))['total'] or 0,
-                'number_of_payments': payments.count(),
-            })
+                'total_collected': 0,
+                'number_of_payments': 0,
+                'by_type': {},
+            }
+            for year in range(from_year, to_year + 1)
+            for month in range(1, 13)
+        }
+        for r in rows:
+            entry = months[(r['month'].year, r['month'].month)]
+            entry['total_collected'] += r['total_collected']
+            entry['number_of_payments'] += r['number_of_payments']
+            entry['by_type'][r['payment_type']] = {
+                'total_collected': r['total_collected'],
+                'number_of_payments': r['number_of_payments'],
+            }
+        
+        monthly_data = list(months.values())
+        yearly_totals = {
+            year: sum(m['total_collected'] for m in monthly_data if m['year'] == year)
+            for year in range(from_year, to_year + 1)
+        }
         
         return Response({
-            'year': year,
+            'year': from_year,
+            'from_year': from_year,
+            'to_year': to_year,
             'monthly_data': monthly_data,
-            'total_yearly': sum(m['total_collected'] for m in monthly_data),
+            'yearly_totals': yearly_totals,
+            'total_yearly': yearly_totals[from_year],
+            'total': sum(yearly_totals.values()),
         })
 
 
-class EmailLogViewSet(viewsets.ReadOnlyModelViewSet):
+class EmailLogViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for viewing email logs (admin only)"""
     queryset = EmailLog.objects.all()
     serializer_class = EmailLogSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAdminUser]
     
     def get_queryset(self):
-        queryset = EmailLog.objects.all()
+        queryset = EmailLog.objects.select_related('student__user')
         
         # Filter by student
         student_id = self.request.query_params.get('student')
@@ -746,6 +1121,16 @@ class EmailLogViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(status=status)
         
         return queryset
+    
+    @action(detail=True, methods=['get'])
+    def preview(self, request, pk=None):
+        """HTML body of this email, re-rendered from its template when not stored"""
+        log = self.get_object()
+        return Response({
+            'subject': log.subject,
+            'template_name': log.template_name,
+            'html': log.render_content()
+        })
 
 
 class QuizViewSet(viewsets.ModelViewSet):
@@ -755,7 +1140,7 @@ class QuizViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy', 'add_question']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'add_question', 'regrade']:
             return [IsAdminUser()]
         return [permissions.IsAuthenticated()]
     
@@ -765,7 +1150,9 @@ class QuizViewSet(viewsets.ModelViewSet):
         return QuizSerializer
     
     def get_queryset(self):
-        queryset = Quiz.objects.filter(is_published=True, is_active=True)
+        queryset = Quiz.objects.filter(is_published=True, is_active=True).select_related(
+            'class_session'
+        ).prefetch_related('questions')
         
         # Filter by session
         session_id = self.request.query_params.get('session')
@@ -774,6 +1161,15 @@ class QuizViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        student = request_student(self.request)
+        if student and self.action in ['list', 'retrieve']:
+            context['attempted_quiz_ids'] = set(
+                QuizAttempt.objects.filter(student=student).values_list('quiz_id', flat=True)
+            )
+        return context
+    
     @action(detail=True, methods=['post'])
     def start_attempt(self, request, pk=None):
         """Start a new quiz attempt"""
@@ -843,19 +1239,17 @@ class QuizViewSet(viewsets.ModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # Save answers and calculate score
+        # Grade in memory against the cached answer key, then one save
         attempt.answers = serializer.validated_data['answers']
         attempt.time_taken_seconds = serializer.validated_data['time_taken_seconds']
         attempt.submitted_at = timezone.now()
-        attempt.save()
-        
-        # Calculate score
-        attempt.calculate_score()
+        grade_attempt(attempt)
+        attempt.save(update_fields=['answers', 'time_taken_seconds', 'submitted_at', *GRADED_FIELDS])
         
-        # Send result email
+        # Send result email (flags result_email_sent on success)
+        attempt.quiz = quiz
+        attempt.student = student
         send_quiz_result_email(attempt)
-        attempt.result_email_sent = True
-        attempt.save()
         
         return Response({
             'message': 'Quiz submitted successfully',
@@ -880,7 +1274,9 @@ class QuizViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            attempt = QuizAttempt.objects.get(quiz=quiz, student=student)
+            attempt = QuizAttempt.objects.select_related('student__user', 'quiz').annotate(
+                question_count=Count('quiz__questions')
+            ).get(quiz=quiz, student=student)
             serializer = QuizAttemptSerializer(attempt)
             return Response(serializer.data)
         except QuizAttempt.DoesNotExist:
@@ -902,6 +1298,12 @@ class QuizViewSet(viewsets.ModelViewSet):
                 'question_id': question.id
             })
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
+    def regrade(self, request, pk=None):
+        """Re-grade every submitted attempt after an answer-key fix (admin only)"""
+        quiz = self.get_object()
+        return Response(regrade_quiz(quiz.id))
 
 
 class EnrollmentViewSet(viewsets.ViewSet):
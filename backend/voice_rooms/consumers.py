@@ -12,7 +12,10 @@ Events handled:
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
+from django.contrib.auth import get_user_model
+from livevc.instrumentation import ws_metrics
+
+User = get_user_model()
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
@@ -38,6 +41,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         )
 
         await self.accept()
+        ws_metrics.incr('notification_connect')
 
         # Send connection confirmation
         await self.send(text_data=json.dumps({
@@ -48,6 +52,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         """Leave notification group on disconnect."""
+        ws_metrics.incr('notification_disconnect')
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name